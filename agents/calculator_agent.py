@@ -4,9 +4,9 @@ import re
 from typing import List, Dict, Any
 from agents.agent_clients import get_rules_for_city, log_geometry
 from utils.geometry_converter import json_to_glb
-import os
-import json
-from datetime import datetime
+from utils.rule_predicates import height_fsi_constraints
+from utils.geometry_jobs import submit_geometry_job
+from utils.calc_store import append_run
 
 logging.basicConfig(level=logging.INFO)
 
@@ -28,19 +28,21 @@ def _evaluate_height_condition(parsed_height, subject_height_m: float) -> bool:
         return subject_height_m == val
     return False
 
-def calculator_agent(city: str, subject: Dict[str, Any]) -> List[Dict[str,Any]]:
+def calculator_agent(city: str, subject: Dict[str, Any], async_geometry: bool = False) -> List[Dict[str,Any]]:
     """
     subject: dict with properties to check, e.g. {"height_m": 20, "fsi": 2.2}
     Returns outputs and logs geometry file references in MCP.
+    async_geometry: queue GLB export in the background pool (utils.geometry_jobs) and
+                    return immediately; each outcome then carries a "geometry_job" id to poll.
     """
     rules = get_rules_for_city(city)
     outputs = []
 
     for r in rules:
         rule_obj = r.get("rule", r)  # some endpoints return wrapped
-        parsed = rule_obj.get("parsed_fields") or rule_obj.get("parsed") or {}
-        height_rule = parsed.get("height")
-        fsi_rule = parsed.get("fsi") or parsed.get("fsi")
+        # parsed_fields when present, else compiled from the conditions / entitlements text
+        # (guarded limits only when the subject meets the guard, e.g. plot area / road width)
+        height_rule, fsi_rule = height_fsi_constraints(r, subject)
 
         outcome = {"id": r.get("id"), "clause_no": rule_obj.get("clause_no"), "checks": {}}
 
@@ -80,6 +82,10 @@ def calculator_agent(city: str, subject: Dict[str, Any]) -> List[Dict[str,Any]]:
             "status": "compliant" if all(c.get("ok") for c in outcome["checks"].values() if c.get("ok") is not None) else "non-compliant"
         }
         
+        if async_geometry:
+            outcome["geometry_job"] = submit_geometry_job(case_id, geometry_spec, output_dir="outputs/geometry")
+            continue
+
         # Generate GLB using improved converter
         try:
             geom_path = json_to_glb(
@@ -92,11 +98,11 @@ def calculator_agent(city: str, subject: Dict[str, Any]) -> List[Dict[str,Any]]:
         except Exception as e:
             logging.error(f"Failed to generate geometry for {case_id}: {e}")
 
-    # also write a local output summary
-    summary_path = f"outputs/{city}_calc_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.json"
-    os.makedirs(os.path.dirname(summary_path), exist_ok=True)
-    with open(summary_path, "w", encoding="utf-8") as f:
-        json.dump(outputs, f, indent=2)
+    # also append the run to the local result store (utils.calc_store)
+    try:
+        append_run(city, subject, outputs)
+    except OSError as e:
+        logging.error(f"Failed to store calculator results for {city}: {e}")
 
     logging.info("Calculator finished for %s -> %d outcomes", city, len(outputs))
     return outputs
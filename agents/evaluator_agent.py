@@ -10,87 +10,126 @@ Evaluator Agent (production-ready)
 
 Usage:
   # Evaluate a specific project by its project_id (string or ObjectId)
-  python agents/evaluator_agent.py --project-id <project_id>
+  python -m agents.evaluator_agent --project-id <project_id>
 
   # Evaluate all projects with status == "pending"
-  python agents/evaluator_agent.py --evaluate-pending
+  python -m agents.evaluator_agent --evaluate-pending
 
   # Evaluate projects for a specific city
-  python agents/evaluator_agent.py --evaluate-pending --city Mumbai
+  python -m agents.evaluator_agent --evaluate-pending --city Mumbai
+
+  # Stream all pending projects through 4 worker processes, 200 per batch
+  python -m agents.evaluator_agent --evaluate-pending --limit 0 --workers 4 --batch-size 200
+
+  # Re-evaluate only results affected by reclassified rules (patches evaluation docs in place)
+  python -m agents.evaluator_agent --reevaluate-affected --city Mumbai
+
+  # Daemon: evaluate new / changed pending projects within seconds (change streams or polling)
+  python -m agents.evaluator_agent --daemon
+
+  # Profile a streamed run in-process (phase timings + per-category comparison counts, optional trace file)
+  python -m agents.evaluator_agent --evaluate-pending --profile --trace outputs/eval_trace.json
+
+  # Compliance-rate report by city and category over all projects (vectorized, no writes)
+  python -m agents.evaluator_agent --report [--city Mumbai]
+
+  # Queue worker: claim pending projects under a lease (run one per node; add --forever to keep polling)
+  python -m agents.evaluator_agent --queue-worker --batch-size 50
 
 Notes:
-- Requires .env in project root with MONGO_URI and MONGO_DB
+- Requires .env in project root with MONGO_URI and MONGO_DB; the connection is shared
+  (utils.mongo) and opened on first use, so --help and imports never touch the network
 - Collections:
     projects           -> input proposals (real)
     classified_rules   -> parsed & classified rules (from classifier)
     evaluations        -> output evaluation documents
+    ruleset_versions   -> snapshot of each city's rule set per version (for re-evaluation diffs)
+    evaluation_cache   -> (optional, EVAL_CACHE_PERSIST=1) memoized outcomes by input fingerprint
+- Daemon polling fallback needs producers to set projects.updated_at on insert / update
+- Project status: pending -> evaluated; in queue mode pending -> evaluating (leased to
+  one worker via lease_owner / lease_expires) -> evaluated, or back to pending / failed
 """
 #evaluator_agent.py
 import os
 import json
+import time
+import hashlib
+import uuid
+import socket
 import logging
 import argparse
-from datetime import datetime
-from decimal import Decimal, InvalidOperation
-from typing import Any, Dict, List, Optional, Tuple
+import signal
+import threading
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
-from pymongo import MongoClient
-import certifi
-from bson import ObjectId
+from pymongo import UpdateOne, ReturnDocument, ASCENDING
+from pymongo.errors import BulkWriteError, OperationFailure, PyMongoError
+from bson import ObjectId, json_util
+
+if TYPE_CHECKING:
+    import pandas as pd  # imported where used: only the --report path needs it
+
+from utils.compliance_engine import (
+    PARTIAL_TOLERANCE,
+    CAT_OTHER,
+    SUBJECT_FIELDS,
+    CATEGORY_NAMES,
+    OVERALL_NAMES,
+    proposed_values,
+    classified_rule_fields,
+    compile_classified_rules,
+    subjects_matrix,
+    evaluate_matrix,
+    results_for_row,
+    subjects_from_columns,
+    category_status_counts,
+)
+from utils.evaluation_cache import EvaluationCache, evaluation_fingerprint
+from utils.profiling import NULL_PROFILER, make_profiler
+from utils.mongo import LazyCollection
 
 # ----------------- CONFIG & ENV -----------------
 # load .env from project root (one directory up from agents/)
 env_path = os.path.join(os.path.dirname(__file__), "..", ".env")
 load_dotenv(dotenv_path=env_path)
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB", "mcp_database")
-
-if not MONGO_URI:
-    raise EnvironmentError("MONGO_URI must be set in .env")
-
-# Partial tolerance multiplier: if proposed <= allowed * TOLERANCE => Partial
-PARTIAL_TOLERANCE = float(os.getenv("EVAL_PARTIAL_TOLERANCE", "1.10"))  # 10% default
+EVAL_CHUNK_SIZE = int(os.getenv("EVAL_CHUNK_SIZE", "100"))  # projects per bulk write
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "1"))
+EVAL_LEASE_SECONDS = int(os.getenv("EVAL_LEASE_SECONDS", "300"))  # queue mode: claim duration
+EVAL_MAX_ATTEMPTS = int(os.getenv("EVAL_MAX_ATTEMPTS", "3"))  # queue mode: claims before a project is marked failed
+EVAL_DAEMON_MAX_WAIT = float(os.getenv("EVAL_DAEMON_MAX_WAIT", "1.0"))  # daemon: max seconds a micro-batch waits to fill
+EVAL_DAEMON_POLL_INTERVAL = float(os.getenv("EVAL_DAEMON_POLL_INTERVAL", "2.0"))  # daemon: polling fallback interval
+EVAL_DAEMON_RULES_TTL = float(os.getenv("EVAL_DAEMON_RULES_TTL", "300"))  # daemon: reload city rules after this many seconds
+EVAL_DAEMON_CHECKPOINT_INTERVAL = float(os.getenv("EVAL_DAEMON_CHECKPOINT_INTERVAL", "10"))  # daemon: min seconds between idle checkpoint writes
+EVAL_CACHE_SIZE = int(os.getenv("EVAL_CACHE_SIZE", "4096"))  # memoized evaluations kept in-process (0 = off)
+EVAL_CACHE_MAX_BYTES = int(os.getenv("EVAL_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))  # approx. in-process cache size cap
+EVAL_CACHE_PERSIST = os.getenv("EVAL_CACHE_PERSIST", "").strip().lower() in ("1", "true", "yes")  # also use evaluation_cache collection
+EVAL_PROFILE = os.getenv("EVAL_PROFILE", "").strip().lower() in ("1", "true", "yes")  # phase timings for evaluate_pending_projects
+EVAL_TRACE_FILE = os.getenv("EVAL_TRACE_FILE")  # optional Chrome trace-event JSON output
+REPORT_DIR = os.getenv("EVAL_REPORT_DIR", "reports")
+EVAL_DAEMON_CHECKPOINT = os.getenv("EVAL_DAEMON_CHECKPOINT", os.path.join("outputs", "evaluator_daemon_checkpoint.json"))
 
 # ----------------- LOGGING -----------------
 logger = logging.getLogger("EvaluatorAgent")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s:%(name)s: %(message)s")
 
 # ----------------- MONGO CONNECTION -----------------
-_client = MongoClient(MONGO_URI, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=15000)
-_db = _client[MONGO_DB]
-
-PROJECTS_COL = _db.get_collection("projects")
-CLASSIFIED_COL = _db.get_collection("classified_rules")
-EVAL_COL = _db.get_collection("evaluations")
+# lazy handles on the shared client (utils.mongo): nothing connects until first use
+PROJECTS_COL = LazyCollection("projects")
+CLASSIFIED_COL = LazyCollection("classified_rules")
+EVAL_COL = LazyCollection("evaluations")
+RULESET_COL = LazyCollection("ruleset_versions")
 
-logger.info("Connected to MongoDB database: %s", MONGO_DB)
+# memoized outcomes keyed by (city, normalized proposed values, rule-set version, tolerance)
+EVAL_CACHE = EvaluationCache(EVAL_CACHE_SIZE, LazyCollection("evaluation_cache") if EVAL_CACHE_PERSIST else None,
+                             max_bytes=EVAL_CACHE_MAX_BYTES)
 
 # ----------------- UTILITIES -----------------
-def to_number(v: Any) -> Optional[float]:
-    """Try to coerce v into float, return None if impossible."""
-    if v is None:
-        return None
-    if isinstance(v, (int, float)):
-        return float(v)
-    try:
-        # protect against Decimal strings
-        if isinstance(v, Decimal):
-            return float(v)
-        return float(str(v).strip())
-    except (ValueError, TypeError, InvalidOperation):
-        return None
-
-def pick_best_value(parsed_fields: Dict[str, Any], keys: List[str]) -> Optional[float]:
-    """Given parsed_fields and list of candidate keys, return first numeric value found."""
-    for k in keys:
-        if k in parsed_fields:
-            val = to_number(parsed_fields[k])
-            if val is not None:
-                return val
-    return None
-
 def compare_numeric(proposed: Optional[float], allowed: Optional[float]) -> Tuple[str, float]:
     """
     Compare numeric proposed vs allowed.
@@ -119,78 +158,96 @@ def load_classified_rules_for_city(city: str) -> List[Dict[str, Any]]:
     logger.info("Loaded %d classified rules for city %s", len(docs), city)
     return docs
 
-def evaluate_project(project_doc: Dict[str, Any], rules: List[Dict[str, Any]]) -> Dict[str, Any]:
+class CompiledRule:
+    """One classified rule, resolved once: shape-agnostic fields + category code."""
+    __slots__ = ("rule_id", "category", "category_code", "allowed", "rule_text")
+
+    def __init__(self, rule_id: str, category: str, category_code: int,
+                 allowed: Optional[float], rule_text: str):
+        self.rule_id = rule_id
+        self.category = category            # original spelling, echoed in results
+        self.category_code = category_code  # CAT_* from utils.compliance_engine
+        self.allowed = allowed
+        self.rule_text = rule_text
+
+def compile_rules(rules: List[Dict[str, Any]]) -> List[CompiledRule]:
+    """Resolve classified rule docs (any of their shapes) into CompiledRule records."""
+    compiled = []
+    for rule in rules:
+        f = classified_rule_fields(rule)
+        compiled.append(CompiledRule(f["rule_id"], f["category"], f["category_code"], f["allowed"], f["rule_text"]))
+    return compiled
+
+def _numeric_handler(field: str) -> Callable[[CompiledRule, Dict[str, Optional[float]]], Tuple[Any, Any, str, float]]:
+    def handler(rule: CompiledRule, proposed: Dict[str, Optional[float]]) -> Tuple[Any, Any, str, float]:
+        proposed_val = proposed.get(field)
+        status, score_inc = compare_numeric(proposed_val, rule.allowed)
+        return rule.allowed, proposed_val, status, score_inc
+    return handler
+
+def _informational(rule: CompiledRule, proposed: Dict[str, Optional[float]]) -> Tuple[Any, Any, str, float]:
+    # Unhandled categories can be informational or require human review
+    return None, None, "INFORMATIONAL", 0.0
+
+# RULE CATEGORY HANDLERS, keyed by category code (the code indexes SUBJECT_FIELDS)
+RULE_HANDLERS = {code: _numeric_handler(field) for code, field in enumerate(SUBJECT_FIELDS)}
+RULE_HANDLERS[CAT_OTHER] = _informational
+
+STATUS_SCORES = {"COMPLIANT": 1.0, "PARTIAL": 0.5, "NON_COMPLIANT": 0.0}
+
+def overall_status_for(score: float) -> str:
+    # Derive simple textual overall_status
+    if score >= 0.9:
+        return "COMPLIANT"
+    elif score >= 0.5:
+        return "PARTIALLY_COMPLIANT"
+    return "NON_COMPLIANT"
+
+def rule_signature(rule: CompiledRule) -> Dict[str, Any]:
+    """Everything about a rule that can change its evaluation results."""
+    return {
+        "rule_id": rule.rule_id,
+        "category": rule.category,
+        "category_code": rule.category_code,
+        "allowed": rule.allowed,
+        "text_hash": hashlib.sha1(rule.rule_text.encode("utf-8")).hexdigest()[:12],
+    }
+
+def ruleset_version(compiled: List[CompiledRule]) -> str:
+    """Stable hash of a city's rule set (independent of rule order)."""
+    signatures = sorted((rule_signature(r) for r in compiled), key=lambda sig: sig["rule_id"])
+    payload = json.dumps(signatures, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def evaluate_project(project_doc: Dict[str, Any], rules: List[Dict[str, Any]],
+                     compiled: Optional[List[CompiledRule]] = None,
+                     version: Optional[str] = None, use_cache: bool = True) -> Dict[str, Any]:
     """
     Evaluate a single project (project_doc) against provided classified rules.
+    Pass compiled=compile_rules(rules) (and its ruleset_version) when evaluating many
+    projects against the same rules. Identical inputs are served from EVAL_CACHE.
     Returns an evaluation document (dict) ready to insert to evaluations collection.
     """
-    project_id = project_doc.get("_id")
-    project_key = str(project_id)
-    city = project_doc.get("city")
-    name = project_doc.get("project_name", project_key)
     params = project_doc.get("parameters", {})
 
     # normalise keys to expected numeric forms
-    proposed = {
-        "height_m": to_number(params.get("height_m")),
-        "fsi": to_number(params.get("fsi")),
-        "setback_m": to_number(params.get("setback_m")),
-        "floors": to_number(params.get("floors")),
-        "parking": to_number(params.get("parking_spaces") or params.get("parking")),
-        "coverage": to_number(params.get("coverage_percent") or params.get("coverage")),
-    }
+    proposed = proposed_values(params)
+    if compiled is None:
+        compiled = compile_rules(rules)
+    if version is None:
+        version = ruleset_version(compiled)
+
+    key = evaluation_fingerprint(project_doc.get("city"), proposed, version) if use_cache else None
+    cached = EVAL_CACHE.get(key) if use_cache else None
+    if cached is not None:
+        return _doc_from_outcome(project_doc, cached, version)
 
     results = []
     score_sum = 0.0
     applicable_rules = 0
 
-    for rule in rules:
-        # Each classified_rule doc can have multiple shapes — try commonly used fields
-        rule_id = str(rule.get("_id"))
-        category = rule.get("category") or rule.get("rule_type") or rule.get("type") or "other"
-        parsed = rule.get("details") or rule.get("parsed_fields") or rule.get("parsed") or {}
-        rule_text = rule.get("original_text") or rule.get("text") or rule.get("full_text") or rule.get("summary") or ""
-
-        allowed_val = None
-        proposed_val = None
-        status = "NOT_APPLICABLE"
-        score_inc = 0.0
-
-        # RULE CATEGORY HANDLERS
-        if category.lower() in ("height", "building_height", "max_height", "height_candidate"):
-            # check common parsed keys
-            allowed_val = pick_best_value(parsed, ["height_m", "value", "candidate_m", "max_height"])
-            proposed_val = proposed.get("height_m")
-            status, score_inc = compare_numeric(proposed_val, allowed_val)
-
-        elif category.lower() in ("fsi", "far", "floor_space_index"):
-            allowed_val = pick_best_value(parsed, ["fsi", "value", "allowed_fsi"])
-            proposed_val = proposed.get("fsi")
-            status, score_inc = compare_numeric(proposed_val, allowed_val)
-
-        elif category.lower() in ("setback", "setbacks"):
-            allowed_val = pick_best_value(parsed, ["setback_m", "value", "setback_candidate_m"])
-            proposed_val = proposed.get("setback_m")
-            status, score_inc = compare_numeric(proposed_val, allowed_val)
-
-        elif category.lower() in ("floors", "storeys", "floor_count"):
-            allowed_val = pick_best_value(parsed, ["floors", "value"])
-            proposed_val = proposed.get("floors")
-            status, score_inc = compare_numeric(proposed_val, allowed_val)
-
-        elif category.lower() in ("parking",):
-            allowed_val = pick_best_value(parsed, ["value", "parking_required", "parking_spaces"])
-            proposed_val = proposed.get("parking")
-            status, score_inc = compare_numeric(proposed_val, allowed_val)
-
-        elif category.lower() in ("coverage", "site_coverage", "ground_coverage"):
-            allowed_val = pick_best_value(parsed, ["value", "coverage_percent", "allowed_coverage"])
-            proposed_val = proposed.get("coverage")
-            status, score_inc = compare_numeric(proposed_val, allowed_val)
-
-        else:
-            # Unhandled categories can be informational or require human review
-            status = "INFORMATIONAL"
+    for rule in compiled:
+        allowed_val, proposed_val, status, score_inc = RULE_HANDLERS[rule.category_code](rule, proposed)
 
         # Count only rules where we had a numeric allowed value to evaluate
         if status not in ("NOT_APPLICABLE", "INFORMATIONAL", "INVALID"):
@@ -199,37 +256,198 @@ def evaluate_project(project_doc: Dict[str, Any], rules: List[Dict[str, Any]]) -
 
         # Build per-rule result
         results.append({
-            "rule_id": rule_id,
-            "category": category,
-            "rule_text": rule_text,
+            "rule_id": rule.rule_id,
+            "category": rule.category,
+            "rule_text": rule.rule_text,
             "allowed": allowed_val,
             "proposed": proposed_val,
             "status": status
         })
 
     overall_score = round((score_sum / applicable_rules) if applicable_rules else 0.0, 2)
-    # Derive simple textual overall_status
-    if overall_score >= 0.9:
-        overall_status = "COMPLIANT"
-    elif overall_score >= 0.5:
-        overall_status = "PARTIALLY_COMPLIANT"
-    else:
-        overall_status = "NON_COMPLIANT"
+    overall_status = overall_status_for(overall_score)
+
+    if use_cache:
+        _cache_outcome(key, project_doc.get("city"), version, results, applicable_rules, overall_score, overall_status)
+    return build_evaluation_doc(project_doc, results, applicable_rules, overall_score, overall_status, version)
 
-    evaluation_doc = {
+def _outcome(results: List[Dict[str, Any]], applicable_rules: int, overall_score: float,
+             overall_status: str) -> Dict[str, Any]:
+    return {
+        "results": [dict(r) for r in results],
+        "applicable_rules_count": applicable_rules,
+        "overall_score": overall_score,
+        "overall_status": overall_status,
+    }
+
+def _cache_outcome(key: str, city: Any, version: str, results: List[Dict[str, Any]], applicable_rules: int,
+                   overall_score: float, overall_status: str) -> Dict[str, Any]:
+    outcome = _outcome(results, applicable_rules, overall_score, overall_status)
+    EVAL_CACHE.put(key, outcome, city=city, ruleset_version=version)
+    return outcome
+
+def _doc_from_outcome(project_doc: Dict[str, Any], outcome: Dict[str, Any], version: str) -> Dict[str, Any]:
+    """New evaluation doc for project_doc from a memoized outcome (results copied, no rule iteration)."""
+    return build_evaluation_doc(project_doc, [dict(r) for r in outcome["results"]], outcome["applicable_rules_count"],
+                                outcome["overall_score"], outcome["overall_status"], version)
+
+def build_evaluation_doc(project_doc: Dict[str, Any], results: List[Dict[str, Any]], applicable_rules: int,
+                         overall_score: float, overall_status: str,
+                         version: Optional[str] = None) -> Dict[str, Any]:
+    """Assemble the evaluations collection document for one project (incl. the rule set it used)."""
+    project_id = project_doc.get("_id")
+    return {
         "project_id": project_id,
         "project_key": str(project_id),
         "city": project_doc.get("city"),
-        "project_name": name,
-        "parameters": params,
+        "project_name": project_doc.get("project_name", str(project_id)),
+        "parameters": project_doc.get("parameters", {}),
         "evaluated_at": datetime.utcnow().isoformat() + "Z",
         "applicable_rules_count": applicable_rules,
         "results": results,
         "overall_score": overall_score,
-        "overall_status": overall_status
+        "overall_status": overall_status,
+        "rule_ids": [r["rule_id"] for r in results],
+        "ruleset_version": version,
     }
 
-    return evaluation_doc
+def _count_comparisons(profiler, compiled: List[CompiledRule], n_projects: int) -> None:
+    """Record rule comparisons per category (only called when profiling is enabled)."""
+    per_category: Dict[str, int] = {}
+    for rule in compiled:
+        name = CATEGORY_NAMES[rule.category_code] if rule.category_code != CAT_OTHER else "other"
+        per_category[name] = per_category.get(name, 0) + 1
+    for name, n_rules in per_category.items():
+        profiler.count(f"comparisons.{name}", n_rules * n_projects)
+
+def evaluate_projects_batch(projects: List[Dict[str, Any]], rules: List[Dict[str, Any]],
+                            ruleset=None, compiled: Optional[List[CompiledRule]] = None,
+                            profiler=NULL_PROFILER, version: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Evaluate many projects of the same city in one matrix pass (utils.compliance_engine).
+    Output matches evaluate_project per project. Cached inputs are served from EVAL_CACHE (one
+    get_many / put_many per batch) and only distinct uncached inputs go through the matrix.
+    If the batch cannot be evaluated as a
+    whole, falls back to evaluate_project per project so one bad document only drops itself.
+    Callers evaluating many chunks pass compiled and version from _rules_for_city.
+    """
+    if not projects:
+        return []
+    compiled = compiled if compiled is not None else compile_rules(rules)
+    version = version or ruleset_version(compiled)
+    try:
+        docs: List[Optional[Dict[str, Any]]] = [None] * len(projects)
+        keys = [evaluation_fingerprint(p.get("city"), proposed_values(p.get("parameters") or {}), version)
+                for p in projects]
+        cached = EVAL_CACHE.get_many(keys)
+        misses: Dict[str, List[int]] = {}
+        for i, (p, key) in enumerate(zip(projects, keys)):
+            if key in cached:
+                docs[i] = _doc_from_outcome(p, cached[key], version)
+            else:
+                misses.setdefault(key, []).append(i)
+
+        if profiler.enabled:
+            profiler.count("cache_hits", len(projects) - sum(len(ids) for ids in misses.values()))
+            _count_comparisons(profiler, compiled, len(misses))
+        if misses:
+            miss_keys = list(misses)
+            unique = [projects[misses[k][0]] for k in miss_keys]
+            ruleset = ruleset or compile_classified_rules(rules)
+            subjects = subjects_matrix([p.get("parameters", {}) for p in unique])
+            result = evaluate_matrix(subjects, ruleset)
+            fresh = []
+            for row, key in enumerate(miss_keys):
+                outcome = _outcome(
+                    results_for_row(ruleset, subjects, result, row),
+                    int(result.applicable_count[row]),
+                    float(result.overall_score[row]),
+                    OVERALL_NAMES[result.overall_status[row]],
+                )
+                fresh.append((key, outcome, {"city": unique[row].get("city"), "ruleset_version": version}))
+                for i in misses[key]:
+                    docs[i] = _doc_from_outcome(projects[i], outcome, version)
+            EVAL_CACHE.put_many(fresh)
+        return docs
+    except Exception as e:
+        logger.warning("Batch evaluation failed (%s); evaluating %d projects one by one", e, len(projects))
+
+    out = []
+    if profiler.enabled:
+        _count_comparisons(profiler, compiled, len(projects))
+    for p in projects:
+        try:
+            out.append(evaluate_project(p, rules, compiled, version))
+        except Exception as e:
+            logger.exception("Failed to evaluate project %s: %s", str(p.get("_id")), e)
+    return out
+
+def _lease_filter(project_id: Any, lease_owner: Optional[str]) -> Dict[str, Any]:
+    if not lease_owner:
+        return {"_id": project_id}
+    return {"_id": project_id, "status": "evaluating", "lease_owner": lease_owner}
+
+def store_evaluations(eval_docs: List[Dict[str, Any]], lease_owner: Optional[str] = None,
+                      lease_seconds: int = EVAL_LEASE_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Bulk-insert evaluation docs (unordered) and mark their projects evaluated.
+    Only projects whose evaluation was stored get a status update; returns the stored docs.
+    lease_owner: queue mode — the write is fenced by the lease. Leases are renewed just
+    before the insert and docs for projects no longer leased by this worker are dropped;
+    an evaluation whose status update still misses its lease (lost after the renewal) is
+    deleted again, so a reclaimed project never ends up with two evaluations.
+    """
+    if not eval_docs:
+        return []
+    if lease_owner:
+        held = held_leases(lease_owner, [d["project_id"] for d in eval_docs], lease_seconds)
+        if len(held) < len(eval_docs):
+            logger.warning("Dropping %d evaluations whose lease was reclaimed (owner=%s)",
+                           len(eval_docs) - len(held), lease_owner)
+        eval_docs = [d for d in eval_docs if d["project_id"] in held]
+        if not eval_docs:
+            return []
+    failed = set()
+    try:
+        EVAL_COL.insert_many(eval_docs, ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+        failed = {err["index"] for err in write_errors}
+        for err in write_errors:
+            logger.error("Failed to store evaluation for project %s: %s",
+                         str(eval_docs[err["index"]].get("project_id")), err.get("errmsg"))
+    stored = [d for i, d in enumerate(eval_docs) if i not in failed]
+
+    if stored:
+        now = datetime.utcnow().isoformat() + "Z"
+        # a later re-queue starts a fresh attempt count (the poison limit is per evaluation round)
+        update: Dict[str, Any] = {"$set": {"status": "evaluated", "last_evaluated": now},
+                                  "$unset": {"evaluation_attempts": ""}}
+        if lease_owner:
+            update["$unset"].update({"lease_owner": "", "lease_expires": ""})
+        ops = [UpdateOne(_lease_filter(d["project_id"], lease_owner), update) for d in stored]
+        try:
+            res = PROJECTS_COL.bulk_write(ops, ordered=False)
+            if lease_owner and res.matched_count < len(ops):
+                stored = _discard_unfenced(stored, now, lease_owner)
+        except BulkWriteError as e:
+            # evaluation is stored; the project stays pending and is picked up again next run
+            for err in e.details.get("writeErrors", []):
+                logger.error("Failed to update status for project %s: %s",
+                             str(stored[err["index"]].get("project_id")), err.get("errmsg"))
+    return stored
+
+def _discard_unfenced(stored: List[Dict[str, Any]], completed_at: str, lease_owner: str) -> List[Dict[str, Any]]:
+    """Delete evaluations whose project was reclaimed between the insert and the fenced status update."""
+    ids = [d["project_id"] for d in stored]
+    completed = {p["_id"] for p in PROJECTS_COL.find(
+        {"_id": {"$in": ids}, "status": "evaluated", "last_evaluated": completed_at}, {"_id": 1})}
+    lost = [d for d in stored if d["project_id"] not in completed]
+    if lost:
+        logger.warning("%d projects were reclaimed by another worker before completion (owner=%s); "
+                       "discarding their evaluations", len(lost), lease_owner)
+        EVAL_COL.delete_many({"_id": {"$in": [d["_id"] for d in lost if "_id" in d]}})
+    return [d for d in stored if d["project_id"] in completed]
 
 # ----------------- ENTRYPOINTS -----------------
 def evaluate_single_project(project_id: str) -> Dict[str, Any]:
@@ -246,43 +464,837 @@ def evaluate_single_project(project_id: str) -> Dict[str, Any]:
 
     city = proj.get("city")
     rules = load_classified_rules_for_city(city)
-    evaluation = evaluate_project(proj, rules)
+    compiled = compile_rules(rules)
+    version = ruleset_version(compiled)
+    record_ruleset_snapshot(city, compiled, version)
+    evaluation = evaluate_project(proj, rules, compiled, version)
     # insert evaluation
     EVAL_COL.insert_one(evaluation)
     # Optionally update project status
-    PROJECTS_COL.update_one({"_id": proj["_id"]}, {"$set": {"status": "evaluated", "last_evaluated": datetime.utcnow().isoformat() + "Z"}})
+    PROJECTS_COL.update_one({"_id": proj["_id"]}, {"$set": {"status": "evaluated", "last_evaluated": datetime.utcnow().isoformat() + "Z"},
+                                                   "$unset": {"evaluation_attempts": ""}})
     logger.info("Stored evaluation for project %s (city=%s)", project_id, city)
     return evaluation
 
-def evaluate_pending_projects(city: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+LAST_PROFILE: Dict[str, Any] = {}  # summary of the last profiled pending run (in-process or streaming)
+
+def _finish_profile(profiler, trace_path: Optional[str], **extra: Any) -> None:
+    """Publish a profiled run's summary in LAST_PROFILE, log it and write the trace file."""
+    summary = profiler.summary()
+    summary.update(extra)
+    LAST_PROFILE.clear()
+    LAST_PROFILE.update(summary)
+    logger.info("Evaluation profile: %s", json.dumps(summary, default=str))
+    if trace_path:
+        profiler.write_trace(trace_path)
+        logger.info("Wrote evaluation trace to %s", trace_path)
+
+def evaluate_pending_projects(city: Optional[str] = None, limit: int = 200,
+                              chunk_size: int = EVAL_CHUNK_SIZE, profile: Optional[bool] = None,
+                              trace_path: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Evaluate projects with status == 'pending' (or all if no status) optionally filtered by city.
+    Projects are grouped by city so each city's rules are loaded and compiled once, then
+    evaluated and written in chunks of chunk_size (a failing chunk does not affect the others).
+    profile (default EVAL_PROFILE) logs phase timings and per-category comparison counts at the
+    end (also kept in LAST_PROFILE); trace_path (default EVAL_TRACE_FILE) writes a trace file.
     Returns list of evaluation docs inserted.
     """
+    trace_path = trace_path or EVAL_TRACE_FILE
+    profiler = make_profiler(enabled=EVAL_PROFILE if profile is None else profile, trace=bool(trace_path))
+
     query = {"status": "pending"} if city is None else {"status": "pending", "city": city}
-    projects = list(PROJECTS_COL.find(query).limit(limit))
+    with profiler.phase("load_projects"):
+        projects = list(PROJECTS_COL.find(query).limit(limit))
     logger.info("Found %d pending projects to evaluate (city=%s)", len(projects), city)
-    out_evals = []
+
+    by_city: Dict[Any, List[Dict[str, Any]]] = {}
     for p in projects:
+        by_city.setdefault(p.get("city"), []).append(p)
+
+    out_evals = []
+    _rules_cache.clear()
+    for project_city, city_projects in by_city.items():
         try:
-            rules = load_classified_rules_for_city(p.get("city"))
-            eval_doc = evaluate_project(p, rules)
-            EVAL_COL.insert_one(eval_doc)
-            PROJECTS_COL.update_one({"_id": p["_id"]}, {"$set": {"status": "evaluated", "last_evaluated": datetime.utcnow().isoformat() + "Z"}})
-            out_evals.append(eval_doc)
-            logger.info("Evaluated and stored project %s", str(p.get("_id")))
+            with profiler.phase("load_rules", city=project_city):
+                rules, ruleset, compiled, version = _rules_for_city(project_city)
         except Exception as e:
-            logger.exception("Failed to evaluate project %s: %s", str(p.get("_id")), e)
+            logger.exception("Failed to load rules for city %s (%d projects skipped): %s",
+                             project_city, len(city_projects), e)
+            continue
+
+        for start in range(0, len(city_projects), max(1, chunk_size)):
+            chunk = city_projects[start:start + max(1, chunk_size)]
+            try:
+                with profiler.phase("evaluate", city=project_city, projects=len(chunk)):
+                    docs = evaluate_projects_batch(chunk, rules, ruleset, compiled, profiler=profiler,
+                                                   version=version)
+                with profiler.phase("write", city=project_city, projects=len(docs)):
+                    stored = store_evaluations(docs)
+            except PyMongoError as e:
+                logger.exception("Failed to store chunk of %d projects for city %s: %s",
+                                 len(chunk), project_city, e)
+                continue
+            out_evals.extend(stored)
+            logger.info("Evaluated and stored %d/%d projects (city=%s)", len(stored), len(chunk), project_city)
+
+    if profiler.enabled:
+        _finish_profile(profiler, trace_path, projects=len(projects), stored=len(out_evals), city_filter=city)
     return out_evals
 
+# ----------------- RULE CACHE -----------------
+_rules_cache: Dict[Any, Tuple[List[Dict[str, Any]], Any, List[CompiledRule], str]] = {}
+
+def _rules_for_city(city: Any) -> Tuple[List[Dict[str, Any]], Any, List[CompiledRule], str]:
+    """
+    Classified rules, the engine ruleset, CompiledRule records and the rule-set version for
+    a city, loaded once per process per run. The version is snapshotted on first load.
+    """
+    if city not in _rules_cache:
+        rules = load_classified_rules_for_city(city)
+        compiled = compile_rules(rules)
+        version = ruleset_version(compiled)
+        record_ruleset_snapshot(city, compiled, version)
+        _rules_cache[city] = (rules, compile_classified_rules(rules), compiled, version)
+    return _rules_cache[city]
+
+def record_ruleset_snapshot(city: Any, compiled: List[CompiledRule], version: str) -> None:
+    """Store the rule signatures of this version once, so later rule changes can be diffed."""
+    try:
+        RULESET_COL.update_one(
+            {"city": city, "version": version},
+            {"$setOnInsert": {
+                "city": city,
+                "version": version,
+                "rules": [rule_signature(r) for r in compiled],
+                "created_at": datetime.utcnow().isoformat() + "Z",
+            }},
+            upsert=True,
+        )
+    except PyMongoError as e:
+        logger.warning("Could not record rule-set snapshot %s for %s: %s", version, city, e)
+
+# ----------------- STREAMING / PARALLEL -----------------
+def _init_worker() -> None:
+    """Pool initializer: start each worker with an empty rule cache (utils.mongo gives it its own client)."""
+    _rules_cache.clear()
+
+def _evaluate_and_store(projects: List[Dict[str, Any]], profiler=NULL_PROFILER) -> List[Dict[str, Any]]:
+    """Evaluate one batch (any mix of cities) and write it back. Returns the stored evaluation docs."""
+    by_city: Dict[Any, List[Dict[str, Any]]] = {}
+    for p in projects:
+        by_city.setdefault(p.get("city"), []).append(p)
+
+    stored: List[Dict[str, Any]] = []
+    for project_city, city_projects in by_city.items():
+        try:
+            if project_city in _rules_cache:
+                rules, ruleset, compiled, version = _rules_cache[project_city]
+            else:
+                with profiler.phase("load_rules", city=project_city):
+                    rules, ruleset, compiled, version = _rules_for_city(project_city)
+            with profiler.phase("evaluate", city=project_city, projects=len(city_projects)):
+                docs = evaluate_projects_batch(city_projects, rules, ruleset, compiled, profiler=profiler,
+                                               version=version)
+            with profiler.phase("write", city=project_city, projects=len(docs)):
+                stored.extend(store_evaluations(docs))
+        except Exception as e:
+            logger.exception("Failed to evaluate batch of %d projects for city %s: %s",
+                             len(city_projects), project_city, e)
+    return stored
+
+def _evaluate_and_store_batch(projects: List[Dict[str, Any]]) -> Tuple[int, int]:
+    """Pool task around _evaluate_and_store. Returns (stored, failed)."""
+    stored = len(_evaluate_and_store(projects))
+    return stored, len(projects) - stored
+
+def evaluate_pending_streaming(city: Optional[str] = None, limit: int = 0, workers: int = EVAL_WORKERS,
+                               batch_size: int = EVAL_CHUNK_SIZE, profile: Optional[bool] = None,
+                               trace_path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Stream pending projects from a cursor in batches and evaluate them across `workers`
+    processes (each with its own Mongo client); workers write results as they finish.
+    At most 2 * workers batches are in flight, so memory stays bounded for any backlog.
+    limit=0 evaluates every pending project. Returns run statistics incl. throughput.
+    profile / trace_path as in evaluate_pending_projects; a profiled run evaluates its
+    batches in-process (workers=1) so every phase lands in one profiler.
+    """
+    trace_path = trace_path or EVAL_TRACE_FILE
+    profiler = make_profiler(enabled=EVAL_PROFILE if profile is None else profile, trace=bool(trace_path))
+    if profiler.enabled and workers > 1:
+        logger.info("Profiling evaluates in-process; ignoring workers=%d", workers)
+        workers = 1
+
+    query = {"status": "pending"} if city is None else {"status": "pending", "city": city}
+    batch_size = max(1, batch_size)
+    cursor = PROJECTS_COL.find(query, batch_size=batch_size)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    def _next_batch() -> List[Dict[str, Any]]:
+        with profiler.phase("load_projects"):
+            return list(islice(cursor, batch_size))
+
+    batches = iter(_next_batch, [])
+
+    stats = {"evaluated_count": 0, "failed_count": 0, "batches": 0, "workers": max(1, workers)}
+    started = time.perf_counter()
+
+    def _collect(result: Tuple[int, int]) -> None:
+        stats["evaluated_count"] += result[0]
+        stats["failed_count"] += result[1]
+        stats["batches"] += 1
+
+    _rules_cache.clear()
+    if workers <= 1:
+        for batch in batches:
+            stored = len(_evaluate_and_store(batch, profiler))
+            _collect((stored, len(batch) - stored))
+    else:
+        max_in_flight = 2 * workers
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            in_flight = set()
+            for batch in batches:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        _collect(f.result())
+                in_flight.add(pool.submit(_evaluate_and_store_batch, batch))
+            for f in wait(in_flight).done:
+                _collect(f.result())
+
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["projects_per_s"] = round(stats["evaluated_count"] / elapsed, 2) if elapsed > 0 else None
+    logger.info("Streaming evaluation finished: %d stored, %d failed in %.2fs (%s projects/s, %d workers)",
+                stats["evaluated_count"], stats["failed_count"], elapsed, stats["projects_per_s"], stats["workers"])
+    if profiler.enabled:
+        _finish_profile(profiler, trace_path, projects=stats["evaluated_count"] + stats["failed_count"],
+                        stored=stats["evaluated_count"], city_filter=city)
+    return stats
+
+# ----------------- INCREMENTAL RE-EVALUATION -----------------
+def diff_rulesets(old_signatures: Optional[List[Dict[str, Any]]], compiled: List[CompiledRule]) -> Dict[str, Any]:
+    """
+    Compare a stored rule-set snapshot with the current rules.
+    Returns added / removed / changed rule ids and the categories they touch.
+    old_signatures=None (no snapshot) marks every current rule as changed.
+    """
+    current = {r.rule_id: rule_signature(r) for r in compiled}
+    old = {sig["rule_id"]: sig for sig in (old_signatures or [])}
+    if old_signatures is None:
+        changed = list(current)
+        added, removed = [], []
+    else:
+        added = [rid for rid in current if rid not in old]
+        removed = [rid for rid in old if rid not in current]
+        changed = [rid for rid in current if rid in old and old[rid] != current[rid]]
+    categories = {current[rid]["category"] for rid in added + changed}
+    categories.update(old[rid]["category"] for rid in removed + changed if rid in old)
+    return {"added": added, "removed": removed, "changed": changed, "categories": sorted(categories)}
+
+def patch_evaluation(eval_doc: Dict[str, Any], compiled: List[CompiledRule], stale_ids: set,
+                     version: str) -> Dict[str, Any]:
+    """
+    Recompute only the results of stale (added / changed) rules, drop removed ones and keep
+    the rest. Returns the $set fields for the evaluation doc.
+    """
+    previous = {r.get("rule_id"): r for r in eval_doc.get("results") or []}
+    proposed = proposed_values(eval_doc.get("parameters") or {})
+
+    results = []
+    applicable_rules = 0
+    score_sum = 0.0
+    for rule in compiled:
+        result = previous.get(rule.rule_id)
+        if result is None or rule.rule_id in stale_ids:
+            allowed_val, proposed_val, status, _ = RULE_HANDLERS[rule.category_code](rule, proposed)
+            result = {
+                "rule_id": rule.rule_id,
+                "category": rule.category,
+                "rule_text": rule.rule_text,
+                "allowed": allowed_val,
+                "proposed": proposed_val,
+                "status": status
+            }
+        if result["status"] in STATUS_SCORES:
+            applicable_rules += 1
+            score_sum += STATUS_SCORES[result["status"]]
+        results.append(result)
+
+    overall_score = round((score_sum / applicable_rules) if applicable_rules else 0.0, 2)
+    return {
+        "results": results,
+        "applicable_rules_count": applicable_rules,
+        "overall_score": overall_score,
+        "overall_status": overall_status_for(overall_score),
+        "rule_ids": [r["rule_id"] for r in results],
+        "ruleset_version": version,
+        "reevaluated_at": datetime.utcnow().isoformat() + "Z",
+    }
+
+def reevaluate_affected(city: Optional[str] = None, batch_size: int = EVAL_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Bring evaluations made against an older rule set up to date. For each city, every
+    evaluation whose ruleset_version differs from the current one is diffed against its
+    stored snapshot and only the affected rule results are recomputed and patched in place.
+    """
+    cities = [city] if city is not None else [c for c in EVAL_COL.distinct("city") if c is not None]
+    stats = {"cities": {}, "patched_count": 0, "failed_count": 0}
+
+    for c in cities:
+        rules = load_classified_rules_for_city(c)
+        compiled = compile_rules(rules)
+        version = ruleset_version(compiled)
+        record_ruleset_snapshot(c, compiled, version)
+
+        diffs: Dict[Any, Dict[str, Any]] = {}
+        city_stats = {"ruleset_version": version, "patched": 0, "categories": set()}
+        ops: List[UpdateOne] = []
+
+        def flush() -> None:
+            if not ops:
+                return
+            try:
+                res = EVAL_COL.bulk_write(list(ops), ordered=False)
+                city_stats["patched"] += res.modified_count
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                city_stats["patched"] += e.details.get("nModified", 0)
+                stats["failed_count"] += len(errors)
+                logger.error("Failed to patch %d evaluations for city %s", len(errors), c)
+            ops.clear()
+
+        cursor = EVAL_COL.find({"city": c, "ruleset_version": {"$ne": version}},
+                               {"results": 1, "parameters": 1, "ruleset_version": 1})
+        for doc in cursor:
+            old_version = doc.get("ruleset_version")
+            if old_version not in diffs:
+                snapshot = RULESET_COL.find_one({"city": c, "version": old_version}) if old_version else None
+                diffs[old_version] = diff_rulesets(snapshot.get("rules") if snapshot else None, compiled)
+                logger.info("City %s: rule set %s -> %s changes %s", c, old_version, version, diffs[old_version])
+            diff = diffs[old_version]
+            city_stats["categories"].update(diff["categories"])
+            stale_ids = set(diff["added"]) | set(diff["changed"])
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": patch_evaluation(doc, compiled, stale_ids, version)}))
+            if len(ops) >= max(1, batch_size):
+                flush()
+        flush()
+
+        city_stats["categories"] = sorted(city_stats["categories"])
+        stats["cities"][c] = city_stats
+        stats["patched_count"] += city_stats["patched"]
+        logger.info("Re-evaluated %d evaluations for city %s (categories: %s)",
+                    city_stats["patched"], c, ", ".join(city_stats["categories"]) or "-")
+    return stats
+
+# ----------------- ANALYTICS REPORT -----------------
+def _numeric_column(col: "pd.Series") -> "pd.Series":
+    """Vectorized to_number: numbers pass through, numeric strings are parsed, the rest is NaN."""
+    import pandas as pd
+    if pd.api.types.is_numeric_dtype(col):
+        return col.astype("float64")
+    stripped = col.map(lambda v: v.strip() if isinstance(v, str) else v)
+    return pd.to_numeric(stripped, errors="coerce").astype("float64")
+
+def load_projects_frame(city: Optional[str] = None, query: Optional[Dict[str, Any]] = None) -> "pd.DataFrame":
+    """
+    Load project parameters into a columnar frame: city + SUBJECT_FIELDS (float64, NaN = missing),
+    normalised the same way as proposed_values.
+    """
+    import pandas as pd
+    query = dict(query or {})
+    if city is not None:
+        query["city"] = city
+    records = []
+    for doc in PROJECTS_COL.find(query, {"city": 1, "parameters": 1}, batch_size=10000):
+        params = doc.get("parameters")
+        if not isinstance(params, dict):
+            params = {}
+        records.append((
+            doc.get("city"),
+            params.get("height_m"),
+            params.get("fsi"),
+            params.get("setback_m"),
+            params.get("floors"),
+            params.get("parking_spaces") or params.get("parking"),
+            params.get("coverage_percent") or params.get("coverage"),
+        ))
+    frame = pd.DataFrame.from_records(records, columns=("city",) + SUBJECT_FIELDS)
+    for field in SUBJECT_FIELDS:
+        frame[field] = _numeric_column(frame[field])
+    return frame
+
+def _with_rates(counts: Dict[str, int]) -> Dict[str, Any]:
+    checked = counts["COMPLIANT"] + counts["PARTIAL"] + counts["NON_COMPLIANT"]
+    rate = (lambda n: round(n / checked, 4) if checked else None)
+    return {
+        **counts,
+        "checked": checked,
+        "pass_rate": rate(counts["COMPLIANT"]),
+        "partial_rate": rate(counts["PARTIAL"]),
+        "fail_rate": rate(counts["NON_COMPLIANT"]),
+    }
+
+def build_compliance_report(city: Optional[str] = None, frame: Optional["pd.DataFrame"] = None,
+                            chunk_rows: int = 50000) -> Dict[str, Any]:
+    """
+    Compliance rates by city and category across all projects, computed with the vectorized
+    engine over a columnar frame (nothing is written to evaluations). Rule-check cells are
+    counted per category; projects are counted per overall status.
+    """
+    import pandas as pd
+    started = time.perf_counter()
+    if frame is None:
+        frame = load_projects_frame(city)
+    report: Dict[str, Any] = {
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+        "city_filter": city,
+        "projects": int(len(frame)),
+        "cities": {},
+    }
+    for project_city, group in frame.groupby("city", sort=True, dropna=False):
+        project_city = None if pd.isna(project_city) else project_city
+        ruleset = compile_classified_rules(load_classified_rules_for_city(project_city))
+        overall = np.zeros(len(OVERALL_NAMES), dtype=np.int64)
+        categories: Dict[str, Dict[str, int]] = {}
+        for start in range(0, len(group), max(1, chunk_rows)):
+            part = group.iloc[start:start + max(1, chunk_rows)]
+            result = evaluate_matrix(subjects_from_columns(part, len(part)), ruleset)
+            overall += np.bincount(result.overall_status, minlength=len(OVERALL_NAMES))
+            for name, counts in category_status_counts(result, ruleset).items():
+                total = categories.setdefault(name, dict.fromkeys(counts, 0))
+                for status, n in counts.items():
+                    total[status] += n
+        report["cities"][project_city] = {
+            "projects": int(len(group)),
+            "rules": len(ruleset),
+            "overall": {OVERALL_NAMES[i]: int(n) for i, n in enumerate(overall)},
+            "categories": {name: _with_rates(counts) for name, counts in sorted(categories.items())},
+        }
+    report["elapsed_s"] = round(time.perf_counter() - started, 3)
+    logger.info("Compliance report over %d projects in %d cities took %.2fs",
+                report["projects"], len(report["cities"]), report["elapsed_s"])
+    return report
+
+def report_table(report: Dict[str, Any]) -> "pd.DataFrame":
+    """Flatten a compliance report into one row per (city, category)."""
+    import pandas as pd
+    rows = []
+    for project_city, city_report in report["cities"].items():
+        for category, stats in city_report["categories"].items():
+            rows.append({"city": project_city, "category": category, **stats})
+    return pd.DataFrame(rows)
+
+def write_compliance_report(report: Dict[str, Any], out_dir: str = REPORT_DIR) -> Tuple[str, str]:
+    """Write the report as JSON plus a flat CSV table; returns both paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
+    json_path = os.path.join(out_dir, f"compliance_report_{stamp}.json")
+    csv_path = os.path.join(out_dir, f"compliance_report_{stamp}.csv")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    report_table(report).to_csv(csv_path, index=False)
+    return json_path, csv_path
+
+# ----------------- LEASE QUEUE -----------------
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+def ensure_queue_indexes() -> None:
+    """Index backing the claim query (status + lease expiry)."""
+    PROJECTS_COL.create_index([("status", ASCENDING), ("lease_expires", ASCENDING)])
+
+def claim_projects(owner: str, batch_size: int, city: Optional[str] = None,
+                   lease_seconds: int = EVAL_LEASE_SECONDS) -> List[Dict[str, Any]]:
+    """
+    Atomically claim up to batch_size projects: pending ones, or ones whose lease expired
+    (their worker died). Each claim is a find_one_and_update, so no project is handed to
+    two workers at once.
+    """
+    claimed = []
+    for _ in range(max(1, batch_size)):
+        now = datetime.utcnow()
+        query: Dict[str, Any] = {"$or": [
+            {"status": "pending"},
+            {"status": "evaluating", "lease_expires": {"$lt": now}},
+        ]}
+        if city is not None:
+            query["city"] = city
+        doc = PROJECTS_COL.find_one_and_update(
+            query,
+            {"$set": {"status": "evaluating", "lease_owner": owner,
+                      "lease_expires": now + timedelta(seconds=lease_seconds)},
+             "$inc": {"evaluation_attempts": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc is None:
+            break
+        claimed.append(doc)
+    return claimed
+
+def renew_leases(owner: str, project_ids: List[Any], lease_seconds: int = EVAL_LEASE_SECONDS) -> int:
+    """Extend this worker's leases; returns how many are still held."""
+    if not project_ids:
+        return 0
+    res = PROJECTS_COL.update_many(
+        {"_id": {"$in": project_ids}, "status": "evaluating", "lease_owner": owner},
+        {"$set": {"lease_expires": datetime.utcnow() + timedelta(seconds=lease_seconds)}},
+    )
+    return res.matched_count
+
+def held_leases(owner: str, project_ids: List[Any], lease_seconds: int = EVAL_LEASE_SECONDS) -> set:
+    """Renew this worker's leases and return the ids it still holds (the fence before a write)."""
+    if not project_ids:
+        return set()
+    renew_leases(owner, project_ids, lease_seconds)
+    return {p["_id"] for p in PROJECTS_COL.find(
+        {"_id": {"$in": project_ids}, "status": "evaluating", "lease_owner": owner}, {"_id": 1})}
+
+def release_projects(owner: str, projects: List[Dict[str, Any]], max_attempts: int = EVAL_MAX_ATTEMPTS) -> None:
+    """Hand unevaluated projects back to the queue, or mark them failed after max_attempts claims."""
+    for p in projects:
+        status = "failed" if p.get("evaluation_attempts", 1) >= max_attempts else "pending"
+        try:
+            PROJECTS_COL.update_one(_lease_filter(p["_id"], owner),
+                                    {"$set": {"status": status}, "$unset": {"lease_owner": "", "lease_expires": ""}})
+        except PyMongoError as e:
+            logger.error("Failed to release project %s: %s", str(p.get("_id")), e)
+
+class LeaseHeartbeat:
+    """Background thread renewing a worker's leases every lease_seconds / 3 while it evaluates."""
+
+    def __init__(self, owner: str, project_ids: List[Any], lease_seconds: int = EVAL_LEASE_SECONDS):
+        self.owner = owner
+        self.project_ids = project_ids
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-heartbeat-{owner}", daemon=True)
+
+    def _run(self) -> None:
+        interval = max(1.0, self.lease_seconds / 3.0)
+        while not self._stop.wait(interval):
+            try:
+                held = renew_leases(self.owner, self.project_ids, self.lease_seconds)
+                if held < len(self.project_ids):
+                    logger.warning("Lost %d of %d leases (owner=%s)", len(self.project_ids) - held,
+                                   len(self.project_ids), self.owner)
+            except PyMongoError as e:
+                logger.error("Lease renewal failed (owner=%s): %s", self.owner, e)
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+def run_queue_worker(city: Optional[str] = None, batch_size: int = EVAL_CHUNK_SIZE,
+                     lease_seconds: int = EVAL_LEASE_SECONDS, forever: bool = False,
+                     poll_interval: float = 5.0, owner: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Claim-evaluate-complete loop; run one per node to scale evaluation horizontally.
+    Exits when the queue is empty unless forever=True (then polls every poll_interval s).
+    """
+    owner = owner or new_worker_id()
+    try:
+        ensure_queue_indexes()
+    except PyMongoError as e:
+        logger.warning("Could not ensure queue indexes: %s", e)
+
+    stats = {"worker_id": owner, "evaluated_count": 0, "failed_count": 0, "batches": 0}
+    started = time.perf_counter()
+    _rules_cache.clear()
+    while True:
+        batch = claim_projects(owner, batch_size, city=city, lease_seconds=lease_seconds)
+        if not batch:
+            if not forever:
+                break
+            _rules_cache.clear()  # pick up reclassified rules between idle polls
+            time.sleep(poll_interval)
+            continue
+
+        stored_ids = set()
+        with LeaseHeartbeat(owner, [p["_id"] for p in batch], lease_seconds):
+            by_city: Dict[Any, List[Dict[str, Any]]] = {}
+            for p in batch:
+                by_city.setdefault(p.get("city"), []).append(p)
+            for project_city, city_projects in by_city.items():
+                try:
+                    rules, ruleset, compiled, version = _rules_for_city(project_city)
+                    docs = evaluate_projects_batch(city_projects, rules, ruleset, compiled, version=version)
+                    stored = store_evaluations(docs, lease_owner=owner, lease_seconds=lease_seconds)
+                    stored_ids.update(d["project_id"] for d in stored)
+                except Exception as e:
+                    logger.exception("Queue batch failed for city %s: %s", project_city, e)
+
+        failed = [p for p in batch if p["_id"] not in stored_ids]
+        release_projects(owner, failed)
+        stats["evaluated_count"] += len(batch) - len(failed)
+        stats["failed_count"] += len(failed)
+        stats["batches"] += 1
+
+    stats["elapsed_s"] = round(time.perf_counter() - started, 3)
+    logger.info("Queue worker %s finished: %d stored, %d released/failed in %d batches",
+                owner, stats["evaluated_count"], stats["failed_count"], stats["batches"])
+    return stats
+
+# ----------------- DAEMON -----------------
+class DaemonCheckpoint:
+    """
+    Resumable daemon position: change-stream resume token + polling high-water mark, plus
+    the ids of streamed projects whose evaluation failed (the token has moved past them).
+    """
+
+    def __init__(self, path: str = EVAL_DAEMON_CHECKPOINT):
+        self.path = path
+        self.resume_token: Optional[Dict[str, Any]] = None
+        self.high_water: Optional[Tuple[Any, Any]] = None  # (updated_at, _id) of the last polled project
+        self.retry_ids: List[Any] = []
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json_util.loads(f.read())
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable daemon checkpoint %s: %s", self.path, e)
+            return
+        self.resume_token = data.get("resume_token")
+        self.high_water = tuple(data["high_water"]) if data.get("high_water") else None
+        self.retry_ids = list(data.get("retry_ids") or [])
+
+    def save(self) -> None:
+        """Write atomically (temp file + rename) so a crash never leaves a torn checkpoint."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            # json_util keeps datetime / ObjectId types of the high-water mark intact
+            f.write(json_util.dumps({
+                "resume_token": self.resume_token,
+                "high_water": list(self.high_water) if self.high_water else None,
+                "retry_ids": self.retry_ids,
+                "saved_at": datetime.utcnow().isoformat() + "Z",
+            }))
+        os.replace(tmp_path, self.path)
+
+class EvaluatorDaemon:
+    """
+    Long-running evaluator: watches projects for new / changed pending documents and
+    evaluates them in micro-batches (flushed at batch_size or after max_wait seconds).
+    Uses a change stream when the deployment supports one (replica set / Atlas), else
+    polls on the (updated_at, _id) high-water mark. Progress is checkpointed after every
+    flush, so a restart resumes where it stopped without a full scan; while the stream is
+    idle the resume token is written at most every checkpoint_interval seconds. Streamed
+    projects that fail are saved with the token and re-queried (while still pending) with
+    the next flush, or after checkpoint_interval seconds when no new change arrives.
+    """
+
+    def __init__(self, city: Optional[str] = None, batch_size: int = EVAL_CHUNK_SIZE,
+                 max_wait: float = EVAL_DAEMON_MAX_WAIT, poll_interval: float = EVAL_DAEMON_POLL_INTERVAL,
+                 checkpoint_path: str = EVAL_DAEMON_CHECKPOINT, use_change_streams: bool = True,
+                 checkpoint_interval: float = EVAL_DAEMON_CHECKPOINT_INTERVAL):
+        self.city = city
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.poll_interval = poll_interval
+        self.use_change_streams = use_change_streams
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint = DaemonCheckpoint(checkpoint_path)
+        self.stop_event = threading.Event()
+        self.stats = {"mode": None, "evaluated_count": 0, "failed_count": 0, "batches": 0}
+        self._rules_loaded_at = time.monotonic()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+
+    # -- evaluation --
+    def _flush(self, projects: List[Dict[str, Any]]) -> set:
+        """Evaluate and store a micro-batch; returns the ids of the projects that were stored."""
+        if time.monotonic() - self._rules_loaded_at > EVAL_DAEMON_RULES_TTL:
+            _rules_cache.clear()  # pick up reclassified rules
+            self._rules_loaded_at = time.monotonic()
+        stored_ids = {d["project_id"] for d in _evaluate_and_store(projects)}
+        failed = len(projects) - len(stored_ids)
+        self.stats["evaluated_count"] += len(stored_ids)
+        self.stats["failed_count"] += failed
+        self.stats["batches"] += 1
+        logger.info("Daemon evaluated %d projects (%d failed)", len(stored_ids), failed)
+        return stored_ids
+
+    # -- polling --
+    def _poll_query(self) -> Dict[str, Any]:
+        query: Dict[str, Any] = {"status": "pending"}
+        if self.city is not None:
+            query["city"] = self.city
+        if self.checkpoint.high_water:
+            ts, last_id = self.checkpoint.high_water
+            if ts is None:
+                # documents without updated_at sort first; continue after them by _id
+                query["$or"] = [{"updated_at": None, "_id": {"$gt": last_id}}, {"updated_at": {"$ne": None}}]
+            else:
+                query["$or"] = [{"updated_at": {"$gt": ts}}, {"updated_at": ts, "_id": {"$gt": last_id}}]
+        return query
+
+    def poll_once(self) -> int:
+        """
+        Evaluate the next batch past the high-water mark. The mark only moves past the leading
+        run of stored projects, so a project whose evaluation failed is read again on the next
+        poll (projects stored after it are no longer pending). Returns how many it moved past.
+        """
+        docs = list(PROJECTS_COL.find(self._poll_query())
+                    .sort([("updated_at", ASCENDING), ("_id", ASCENDING)])
+                    .limit(self.batch_size))
+        if not docs:
+            return 0
+        stored_ids = self._flush(docs)
+        passed = 0
+        for doc in docs:
+            if doc["_id"] not in stored_ids:
+                break
+            passed += 1
+        if passed:
+            last = docs[passed - 1]
+            self.checkpoint.high_water = (last.get("updated_at"), last["_id"])
+            self.checkpoint.save()
+        return passed
+
+    def catch_up(self) -> None:
+        """Drain everything already pending past the high-water mark."""
+        while not self.stop_event.is_set() and self.poll_once() >= self.batch_size:
+            pass
+
+    def _run_polling(self) -> None:
+        self.stats["mode"] = "polling"
+        while not self.stop_event.is_set():
+            if self.poll_once() < self.batch_size:
+                self.stop_event.wait(self.poll_interval)
+
+    # -- change streams --
+    def _open_stream(self):
+        match: Dict[str, Any] = {
+            "operationType": {"$in": ["insert", "update", "replace"]},
+            "fullDocument.status": "pending",
+        }
+        if self.city is not None:
+            match["fullDocument.city"] = self.city
+        return PROJECTS_COL.watch(
+            [{"$match": match}],
+            full_document="updateLookup",
+            resume_after=self.checkpoint.resume_token,
+            max_await_time_ms=max(1, int(self.max_wait * 1000)),
+        )
+
+    def _flush_with_retries(self, buffer: Dict[Any, Dict[str, Any]]) -> None:
+        """Flush buffered changes together with earlier failures that are still pending; record what failed."""
+        projects = list(buffer.values())
+        retry = [pid for pid in self.checkpoint.retry_ids if pid not in buffer]
+        if retry:
+            projects += list(PROJECTS_COL.find({"_id": {"$in": retry}, "status": "pending"}))
+        if not projects:
+            self.checkpoint.retry_ids = []
+            return
+        stored_ids = self._flush(projects)
+        self.checkpoint.retry_ids = [p["_id"] for p in projects if p["_id"] not in stored_ids]
+        if self.checkpoint.retry_ids:
+            logger.warning("%d streamed projects failed; retrying them with the next flush",
+                           len(self.checkpoint.retry_ids))
+
+    def _run_change_stream(self, stream) -> None:
+        self.stats["mode"] = "change_stream"
+        buffer: Dict[Any, Dict[str, Any]] = {}
+        first_at = 0.0
+        saved_at = retried_at = time.monotonic()
+        with stream:
+            while not self.stop_event.is_set():
+                flushed = False
+                change = stream.try_next()
+                if change is not None and change.get("fullDocument"):
+                    if not buffer:
+                        first_at = time.monotonic()
+                    doc = change["fullDocument"]
+                    buffer[doc["_id"]] = doc  # repeated updates of one project collapse into one evaluation
+                due = buffer and (len(buffer) >= self.batch_size or time.monotonic() - first_at >= self.max_wait)
+                retry_due = (not buffer and self.checkpoint.retry_ids
+                             and time.monotonic() - retried_at >= self.checkpoint_interval)
+                if due or retry_due:
+                    self._flush_with_retries(buffer)
+                    buffer.clear()
+                    flushed = True
+                    retried_at = time.monotonic()
+                # the token only moves past evaluated events (failures are saved with it as
+                # retry_ids); idle getMores move it too, so those are written at most every
+                # checkpoint_interval seconds
+                if not buffer and (flushed or (stream.resume_token != self.checkpoint.resume_token
+                                               and time.monotonic() - saved_at >= self.checkpoint_interval)):
+                    self.checkpoint.resume_token = stream.resume_token
+                    self.checkpoint.save()
+                    saved_at = time.monotonic()
+            pending = bool(buffer)
+            if pending:
+                self._flush_with_retries(buffer)
+            if pending or stream.resume_token != self.checkpoint.resume_token:
+                self.checkpoint.resume_token = stream.resume_token
+                self.checkpoint.save()
+
+    def run(self) -> Dict[str, Any]:
+        try:
+            ensure_daemon_indexes()
+        except PyMongoError as e:
+            logger.warning("Could not ensure daemon indexes: %s", e)
+
+        stream = None
+        if self.use_change_streams:
+            try:
+                # open before catching up so no change made meanwhile is missed
+                stream = self._open_stream()
+            except OperationFailure as e:
+                if self.checkpoint.resume_token is not None:
+                    logger.warning("Cannot resume change stream (%s); starting a new one", e)
+                    self.checkpoint.resume_token = None
+                    try:
+                        stream = self._open_stream()
+                    except OperationFailure as e2:
+                        logger.warning("Change streams unavailable (%s); falling back to polling", e2)
+                else:
+                    logger.warning("Change streams unavailable (%s); falling back to polling", e)
+
+        self.catch_up()
+        if stream is not None:
+            self._run_change_stream(stream)
+        else:
+            self._run_polling()
+        logger.info("Evaluator daemon stopped: %s", self.stats)
+        return self.stats
+
+def ensure_daemon_indexes() -> None:
+    """Index backing the daemon's polling query."""
+    PROJECTS_COL.create_index([("status", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)])
+
 # ----------------- CLI -----------------
 def cli():
     parser = argparse.ArgumentParser(description="Evaluator Agent CLI")
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument("--project-id", help="Evaluate a single project by _id (string)", default=None)
     group.add_argument("--evaluate-pending", help="Evaluate all pending projects", action="store_true")
+    group.add_argument("--reevaluate-affected", help="Patch evaluations made against an older rule set", action="store_true")
+    group.add_argument("--queue-worker", help="Claim and evaluate pending projects under a lease", action="store_true")
+    group.add_argument("--report", help="Compliance rates by city and category over all projects", action="store_true")
+    group.add_argument("--daemon", help="Keep running and evaluate new / changed pending projects", action="store_true")
     parser.add_argument("--city", help="(Optional) city filter for pending evaluation", default=None)
-    parser.add_argument("--limit", help="Limit number of pending projects to evaluate", type=int, default=200)
+    parser.add_argument("--limit", help="Limit number of pending projects to evaluate (0 = no limit)", type=int, default=200)
+    parser.add_argument("--workers", help="Worker processes for pending evaluation", type=int, default=EVAL_WORKERS)
+    parser.add_argument("--batch-size", help="Projects per streamed batch / bulk write", type=int, default=EVAL_CHUNK_SIZE)
+    parser.add_argument("--lease-seconds", help="Queue mode: lease duration per claim", type=int, default=EVAL_LEASE_SECONDS)
+    parser.add_argument("--forever", help="Queue mode: keep polling when the queue is empty", action="store_true")
+    parser.add_argument("--profile", help="Pending mode: log phase timings (batches run in-process, --workers is ignored)",
+                        action="store_true")
+    parser.add_argument("--trace", help="Pending mode: write a Chrome trace-event file (implies --profile)", default=None)
+    parser.add_argument("--checkpoint", help="Daemon mode: checkpoint file", default=EVAL_DAEMON_CHECKPOINT)
+    parser.add_argument("--no-change-streams", help="Daemon mode: always poll", action="store_true")
     args = parser.parse_args()
 
     if args.project_id:
@@ -296,9 +1308,44 @@ def cli():
             "evaluated_at": evaluation["evaluated_at"]
         }, indent=2))
     elif args.evaluate_pending:
-        evals = evaluate_pending_projects(city=args.city, limit=args.limit)
+        profile = bool(args.profile or args.trace)
+        stats = evaluate_pending_streaming(city=args.city, limit=args.limit, workers=args.workers,
+                                           batch_size=args.batch_size, profile=profile or None,
+                                           trace_path=args.trace)
+        output = {**stats, "city_filter": args.city}
+        if profile:
+            output["profile"] = LAST_PROFILE
+        print(json.dumps(output, indent=2, default=str))
+    elif args.reevaluate_affected:
+        stats = reevaluate_affected(city=args.city, batch_size=args.batch_size)
+        print(json.dumps(stats, indent=2, default=str))
+    elif args.report:
+        report = build_compliance_report(city=args.city)
+        json_path, csv_path = write_compliance_report(report)
+        table = report_table(report)
+        if not table.empty:
+            print(table[["city", "category", "checked", "pass_rate", "partial_rate", "fail_rate"]].to_string(index=False))
+        print(json.dumps({
+            "projects": report["projects"],
+            "cities": len(report["cities"]),
+            "elapsed_s": report["elapsed_s"],
+            "report_json": json_path,
+            "report_csv": csv_path,
+        }, indent=2))
+    elif args.daemon:
+        daemon = EvaluatorDaemon(city=args.city, batch_size=args.batch_size, checkpoint_path=args.checkpoint,
+                                 use_change_streams=not args.no_change_streams)
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+        try:
+            stats = daemon.run()
+        except KeyboardInterrupt:
+            stats = daemon.stats
+        print(json.dumps(stats, indent=2))
+    elif args.queue_worker:
+        stats = run_queue_worker(city=args.city, batch_size=args.batch_size,
+                                 lease_seconds=args.lease_seconds, forever=args.forever)
         print(json.dumps({
-            "evaluated_count": len(evals),
+            **stats,
             "city_filter": args.city,
         }, indent=2))
 
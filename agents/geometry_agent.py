@@ -12,31 +12,23 @@ import os
 import json
 import logging
 from datetime import datetime
-from pymongo import MongoClient
-import certifi
 from dotenv import load_dotenv
 import trimesh
 from pathlib import Path
 from bson import ObjectId
 from utils.geometry_converter import json_to_glb, create_building_geometry
+from utils.mongo import LazyCollection
 
 # ---------- Load environment ----------
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("GeometryAgent")
 
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise EnvironmentError("MONGO_URI must be set in .env")
-
-MONGO_DB = os.getenv("MONGO_DB", "mcp_database")
-
-_client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-_db = _client[MONGO_DB]
-_projects_col = _db.get_collection("projects")
-_rules_col = _db.get_collection("rules")
-_geom_out_col = _db.get_collection("geometry_outputs")
-_feedback_col = _db.get_collection("feedback")  # ✅ RL feedback collection
+# collections resolve on the shared client (utils.mongo) at first use
+_projects_col = LazyCollection("projects")
+_rules_col = LazyCollection("rules")
+_geom_out_col = LazyCollection("geometry_outputs")
+_feedback_col = LazyCollection("feedback")  # ✅ RL feedback collection
 
 OUTPUT_DIR = Path("outputs/geometry")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,279 @@
+# agents/ingestion_agent.py
+"""
+Ingestion Agent (bulk)
+----------------------
+- Ingests many (city, PDF) pairs in one run: a directory tree or a manifest file
+- Files run concurrently through the staged pipeline (utils/ingest_pipeline.py):
+  --workers files extracted at once (default: half the CPUs), each over its share of
+  the page-range process pool, with Mongo writes overlapping extraction
+- Skips files already ingested for the same city, by SHA-256 of the PDF content
+  (documents.content_sha256 of records with status "complete", i.e. written after all
+  of the file's rules), so re-running over a folder only picks up new, changed or
+  previously failed files; --force re-ingests, --diff pushes only changed clauses
+- Logs aggregate progress and throughput as files finish and writes a run summary
+  to reports/ingestion_run_<timestamp>.json
+
+Inputs:
+- directory : <dir>/<City>/*.pdf, or PDFs directly in <dir> named "<City>_<anything>.pdf"
+              (--city assigns one city to every PDF found)
+- manifest  : CSV with columns city,pdf (header required) or a JSON list of
+              {"city": ..., "pdf": ...}; relative paths are relative to the manifest
+
+Environment variables:
+- MONGO_URI / MONGO_DB : see utils/mongo.py
+- INGEST_FILE_WORKERS  : default --workers (default: CPU count / 2)
+- INGEST_HASH_WORKERS  : threads hashing PDFs while planning the run (default: 8)
+- INGEST_PUSH_WORKERS / INGEST_QUEUE_SIZE / INGEST_BATCH_SIZE : see utils/ingest_pipeline.py
+- INGEST_REPORT_DIR    : run summary folder (default: reports)
+
+Usage (CLI):
+  python -m agents.ingestion_agent data/maharashtra/ --workers 8
+  python -m agents.ingestion_agent --manifest data/onboarding.csv --dry-run
+"""
+
+import os
+import csv
+import sys
+import json
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+
+from utils.mongo import LazyCollection
+from utils.pdf_extract import file_sha256
+from utils.ingest_pipeline import INGEST_PUSH_WORKERS, ingest
+
+# ----------------- CONFIG -----------------
+REPORT_DIR = os.getenv("INGEST_REPORT_DIR", "reports")
+# files in flight; each gets PDF_EXTRACT_WORKERS // workers extraction processes
+FILE_WORKERS = int(os.getenv("INGEST_FILE_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+# hashing is I/O-bound and hashlib releases the GIL on large reads
+HASH_WORKERS = int(os.getenv("INGEST_HASH_WORKERS", "8"))
+
+logger = logging.getLogger("IngestionAgent")
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s:%(name)s: %(message)s")
+
+_docs_col = LazyCollection("documents")
+_indexes_ready = False
+
+FileEntry = Tuple[str, str]  # (city, pdf_path)
+
+
+# ----------------- INPUTS -----------------
+def city_from_path(pdf_path: str, root: str) -> str:
+    """<root>/<City>/x.pdf -> City; <root>/City_DCR.pdf -> City."""
+    rel_dir = os.path.relpath(os.path.dirname(os.path.abspath(pdf_path)), os.path.abspath(root))
+    if rel_dir != ".":
+        return rel_dir.split(os.sep)[0]
+    return os.path.splitext(os.path.basename(pdf_path))[0].split("_")[0]
+
+
+def scan_directory(root: str, city: Optional[str] = None) -> List[FileEntry]:
+    if not os.path.isdir(root):
+        raise FileNotFoundError(root)
+    entries = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(".pdf"):
+                path = os.path.join(dirpath, name)
+                entries.append((city or city_from_path(path, root), path))
+    return entries
+
+
+def read_manifest(path: str) -> List[FileEntry]:
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+    entries = []
+    for n, row in enumerate(rows, start=1):
+        city = (row.get("city") or "").strip()
+        pdf = (row.get("pdf") or row.get("pdf_path") or "").strip()
+        if not city or not pdf:
+            raise ValueError(f"{path}: entry {n} needs both city and pdf")
+        entries.append((city, pdf if os.path.isabs(pdf) else os.path.join(base, pdf)))
+    return entries
+
+
+# ----------------- SKIP BY CONTENT HASH -----------------
+def ensure_ingest_indexes() -> None:
+    """documents indexes for the skip-by-hash check and the diff baseline lookup. Once per process."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    try:
+        _docs_col.create_index([("content_sha256", ASCENDING), ("city", ASCENDING)])
+        _docs_col.create_index([("city", ASCENDING), ("status", ASCENDING), ("parsed_at", DESCENDING)])
+        _indexes_ready = True
+    except PyMongoError as e:
+        logger.warning("Could not create documents indexes: %s", e)
+
+
+def already_ingested(shas: List[str]) -> Set[Tuple[str, str]]:
+    """(city, content_sha256) pairs with a complete documents record (all rules written)."""
+    if not shas:
+        return set()
+    cursor = _docs_col.find({"content_sha256": {"$in": sorted(set(shas))}, "status": "complete"},
+                            {"city": 1, "content_sha256": 1})
+    return {(d.get("city"), d.get("content_sha256")) for d in cursor}
+
+
+def _hash_all(paths: List[str], workers: int) -> List[str]:
+    if workers <= 1 or len(paths) <= 1:
+        return [file_sha256(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(paths)), thread_name_prefix="ingest-hash") as pool:
+        return list(pool.map(file_sha256, paths))
+
+
+def plan_files(entries: List[FileEntry], force: bool = False, check_ingested: bool = True,
+               hash_workers: int = HASH_WORKERS) -> Tuple[List[Tuple[str, str, str]], List[Dict[str, Any]]]:
+    """
+    Hash every file once (hash_workers threads); returns (to ingest as (city, path, sha256),
+    skipped records). Duplicates within the run and files already ingested for the city are skipped.
+    """
+    hashed, skipped = [], []
+    seen = set()
+    present = []
+    for city, path in entries:
+        if os.path.exists(path):
+            present.append((city, path))
+        else:
+            skipped.append({"city": city, "pdf_path": path, "status": "missing"})
+    shas = _hash_all([path for _, path in present], hash_workers)
+    for (city, path), sha in zip(present, shas):
+        if (city, sha) in seen:
+            skipped.append({"city": city, "pdf_path": path, "sha256": sha, "status": "duplicate"})
+            continue
+        seen.add((city, sha))
+        hashed.append((city, path, sha))
+
+    done = already_ingested([sha for _, _, sha in hashed]) if check_ingested and not force else set()
+    todo = []
+    for city, path, sha in hashed:
+        if (city, sha) in done:
+            skipped.append({"city": city, "pdf_path": path, "sha256": sha, "status": "already_ingested"})
+        else:
+            todo.append((city, path, sha))
+    return todo, skipped
+
+
+# ----------------- RUN -----------------
+def _log_progress(done: int, total: int, file_info: Dict[str, Any], stats: Dict[str, Any]) -> None:
+    stages = stats["stages"]
+    elapsed = stats["elapsed_s"] or 0.0
+    pages = stages["extract"].get("pages", 0)
+    logger.info("[%d/%d] %s %s: %s | %.2f files/s, %.1f pages/s, %d rules pushed",
+                done, total, file_info["city"], os.path.basename(file_info["pdf_path"]),
+                f"{file_info['rules']} rules" if file_info["ok"] else "FAILED",
+                done / elapsed if elapsed else 0.0, pages / elapsed if elapsed else 0.0,
+                stages["push"].get("rules", 0))
+
+
+def write_run_summary(summary: Dict[str, Any], out_dir: str = REPORT_DIR) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"ingestion_run_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False, default=str)
+    return path
+
+
+def run_ingestion(entries: List[FileEntry], workers: Optional[int] = None, push_workers: Optional[int] = None,
+                  diff: bool = False, force: bool = False, dry_run: bool = False,
+                  push: bool = True, report_dir: Optional[str] = REPORT_DIR) -> Dict[str, Any]:
+    """Skip already-ingested files, ingest the rest concurrently and summarise the run."""
+    started_at = datetime.utcnow().isoformat() + "Z"
+    if push:
+        ensure_ingest_indexes()
+    todo, skipped = plan_files(entries, force=force, check_ingested=push)
+    logger.info("%d files found: %d to ingest, %d skipped", len(entries), len(todo), len(skipped))
+
+    summary: Dict[str, Any] = {
+        "started_at": started_at,
+        "options": {"workers": workers or FILE_WORKERS, "push_workers": push_workers or INGEST_PUSH_WORKERS,
+                    "diff": diff, "force": force, "dry_run": dry_run, "push": push},
+        "totals": {"files": len(entries), "ingested": 0, "failed": 0, "skipped": len(skipped), "rules": 0, "pages": 0},
+        "files": [],
+        "skipped": skipped,
+    }
+    if dry_run:
+        summary["files"] = [{"city": c, "pdf_path": p, "sha256": s, "status": "planned"} for c, p, s in todo]
+    elif todo:
+        run = ingest(todo, diff=diff, push=push, file_workers=workers or FILE_WORKERS, push_workers=push_workers,
+                     progress=_log_progress)
+        for res in run["results"]:
+            record = {"city": res["city"], "pdf_path": res["pdf_path"], "sha256": res["sha256"]}
+            if res["errors"]:
+                record["status"] = "failed"
+                record["errors"] = [{"stage": e["stage"], "error": str(e["error"])} for e in res["errors"]]
+                summary["totals"]["failed"] += 1
+            else:
+                record["status"] = "ingested"
+                record["rules"] = res["parsed"]["rule_count"]
+                if res["push_result"]:
+                    record["document_id"] = res["push_result"].get("document_id")
+                    if "changes" in res["push_result"]:
+                        record["changes"] = res["push_result"]["changes"]
+                summary["totals"]["ingested"] += 1
+                summary["totals"]["rules"] += record["rules"]
+            summary["files"].append(record)
+        stats = run["stats"]
+        elapsed = stats["elapsed_s"]
+        summary["totals"]["pages"] = stats["stages"]["extract"].get("pages", 0)
+        summary["throughput"] = {
+            "elapsed_s": elapsed,
+            "files_per_s": round(len(todo) / elapsed, 3) if elapsed else None,
+            "pages_per_s": round(summary["totals"]["pages"] / elapsed, 2) if elapsed else None,
+            "rules_per_s": round(summary["totals"]["rules"] / elapsed, 2) if elapsed else None,
+        }
+        summary["stages"] = stats["stages"]
+
+    summary["finished_at"] = datetime.utcnow().isoformat() + "Z"
+    if report_dir:
+        summary["report_path"] = write_run_summary(summary, report_dir)
+        logger.info("Run summary written to %s", summary["report_path"])
+    return summary
+
+
+# ----------------- CLI ENTRY -----------------
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk DCR PDF ingestion")
+    parser.add_argument("directory", nargs="?", help="Folder of PDFs (<dir>/<City>/*.pdf or <City>_*.pdf)")
+    parser.add_argument("--manifest", help="CSV (city,pdf) or JSON list of {city, pdf}")
+    parser.add_argument("--city", help="Assign this city to every PDF in the directory")
+    parser.add_argument("--workers", type=int, default=FILE_WORKERS,
+                        help="Files extracted concurrently (default: INGEST_FILE_WORKERS or CPU count / 2)")
+    parser.add_argument("--push-workers", type=int, default=INGEST_PUSH_WORKERS,
+                        help="MongoDB writer threads (default: INGEST_PUSH_WORKERS or 4)")
+    parser.add_argument("--diff", action="store_true", help="Push only changed clauses for cities already ingested")
+    parser.add_argument("--force", action="store_true", help="Re-ingest files even if their content hash is known")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be ingested")
+    parser.add_argument("--no-push", action="store_true", help="Parse and save JSON locally without MongoDB")
+    parser.add_argument("--report-dir", default=REPORT_DIR, help="Where to write the run summary")
+    args = parser.parse_args(argv)
+
+    if not args.directory and not args.manifest:
+        parser.print_help()
+        return 1
+    entries: List[FileEntry] = []
+    if args.manifest:
+        entries.extend(read_manifest(args.manifest))
+    if args.directory:
+        entries.extend(scan_directory(args.directory, args.city))
+
+    summary = run_ingestion(entries, workers=args.workers, push_workers=args.push_workers, diff=args.diff,
+                            force=args.force, dry_run=args.dry_run, push=not args.no_push,
+                            report_dir=args.report_dir)
+    print(json.dumps({k: summary.get(k) for k in ("totals", "throughput", "report_path")}, indent=2))
+    return 1 if summary["totals"]["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,35 @@
 """
 Parsing Agent (production-ready)
 --------------------------------
-- Extracts text from PDFs using fitz/pdfplumber
-- Detects clauses, classifies rules, and extracts numeric info
-- Pushes data to MongoDB Atlas (MCP)
+- Extracts text from PDFs using fitz/pdfplumber, page ranges in parallel (utils/pdf_extract.py)
+- Detects clauses page by page (utils/clause_stream.py, with page provenance),
+  classifies rules, and extracts numeric info
+- Extraction, segmentation and the Mongo push run as concurrent pipeline stages
+  joined by bounded queues (utils/ingest_pipeline.py)
+- Pushes data to MongoDB Atlas (MCP); with --diff, a new edition of a city's DCR is
+  matched against the rules of its previous edition (utils/clause_diff.py) and only
+  inserted, modified and removed clauses are written, in one bulk operation. The
+  previous edition is the one named by --previous (documents _id or file name), else
+  the last complete document ingested for the city under the same file name, else the
+  city's last complete document (an amendment published under a new file name); the
+  diff covers it plus the editions chained to it through documents.lineage, and rules
+  of other documents of the city are never diffed against or deleted
 - Saves parsed JSON locally
 
 Environment variables:
 - MONGO_URI : MongoDB Atlas connection string (required)
 - MONGO_DB  : MongoDB database name (default: mcp_database)
+- MONGO_MAX_POOL_SIZE / MONGO_MIN_POOL_SIZE : connection pool bounds (see utils/mongo.py)
 - PARSED_OUTPUT_DIR : optional local folder to save json outputs (default: data/parsed)
+- CLASSIFICATION_CACHE_PATH : SQLite classification cache (see utils/classification_cache.py)
+- PDF_EXTRACT_CACHE_DIR : extracted page text cache; an unchanged PDF is not re-extracted
+                          (see utils/pdf_extract.py)
+- CLAUSE_DIFF_SIMILARITY : similarity threshold for --diff matching (default: 0.8)
 
 Usage (CLI):
 python agents/parsing_agent.py "path/to/file.pdf" "Mumbai"
+python agents/parsing_agent.py "path/to/amended.pdf" "Mumbai" --diff
+python agents/parsing_agent.py "path/to/amended_2025.pdf" "Mumbai" --diff --previous DCPR_2034.pdf
 """
 #parsing_agent.py
 import os
@@ -20,9 +37,10 @@ import re
 import json
 import logging
 from datetime import datetime
-from typing import List, Dict, Any, Tuple
-from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
+from bson import ObjectId
+from pymongo import DESCENDING, DeleteOne, InsertOne, UpdateOne
 
 # ---------------- ENV LOADING ----------------
 # Load from project root
@@ -34,78 +52,42 @@ print(f"🔍 Loading .env from: {env_path}")
 print("✅ .env exists:", os.path.exists(env_path))
 
 # ---------------- CONFIG ----------------
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB", "mcp_database")
 PARSED_OUTPUT_DIR = os.getenv("PARSED_OUTPUT_DIR", "data/parsed")
 os.makedirs(PARSED_OUTPUT_DIR, exist_ok=True)
 
-if not MONGO_URI:
-    raise EnvironmentError("❌ MONGO_URI environment variable must be set to your MongoDB Atlas URI.")
-
 # ---------------- IMPORTS ----------------
-try:
-    import fitz  # PyMuPDF
-except Exception:
-    fitz = None
-try:
-    import pdfplumber
-except Exception:
-    pdfplumber = None
-
-from pymongo import MongoClient
-import certifi
+from utils.pdf_extract import extract_pages, join_pages
+from utils.mongo import LazyCollection
+from utils.classification_cache import classify_cached
+from utils.clause_diff import diff_clauses, summarize
+from utils.ingest_pipeline import ingest_pdf
 
 # ---------------- LOGGING ----------------
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("ParsingAgent")
 
 # ---------------- MONGO CONNECTION ----------------
-try:
-    _client = MongoClient(MONGO_URI, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=15000)
-    _client.server_info()  # test connection
-    _db = _client[MONGO_DB]
-    _docs_col = _db.get_collection("documents")
-    _rules_col = _db.get_collection("rules")
-    logger.info(f"✅ Connected to MongoDB database: {MONGO_DB}")
-except Exception as e:
-    raise ConnectionError(f"❌ Failed to connect to MongoDB Atlas: {e}")
+# shared client (utils.mongo), connected on first use rather than at import
+_docs_col = LazyCollection("documents")
+_rules_col = LazyCollection("rules")
 
 # ---------------- TEXT EXTRACTION ----------------
-def extract_text_from_pdf(pdf_path: str) -> str:
+def extract_text_from_pdf(pdf_path: str, workers: Optional[int] = None) -> str:
+    """
+    Page text joined with '--- PAGE n ---' markers. Page ranges are extracted in
+    parallel (utils.pdf_extract), fitz first and pdfplumber as the per-range fallback.
+    """
     if not os.path.exists(pdf_path):
         raise FileNotFoundError(pdf_path)
 
-    text_parts: List[str] = []
-
-    if fitz:
-        try:
-            doc = fitz.open(pdf_path)
-            for pno in range(len(doc)):
-                page = doc.load_page(pno)
-                txt = page.get_text("text") or ""
-                if txt.strip():
-                    text_parts.append(f"--- PAGE {pno+1} ---\n" + txt)
-            if text_parts:
-                logger.info("Extracted text using PyMuPDF (fitz).")
-                return "\n\n".join(text_parts)
-        except Exception as e:
-            logger.warning("fitz extraction failed: %s", e)
-
-    if pdfplumber:
-        try:
-            with pdfplumber.open(pdf_path) as pdf:
-                for idx, p in enumerate(pdf.pages):
-                    txt = p.extract_text() or ""
-                    if txt.strip():
-                        text_parts.append(f"--- PAGE {idx+1} ---\n" + txt)
-            if text_parts:
-                logger.info("Extracted text using pdfplumber.")
-                return "\n\n".join(text_parts)
-        except Exception as e:
-            logger.warning("pdfplumber extraction failed: %s", e)
-
-    logger.warning("⚠️ No text extracted — possibly scanned PDF (image only).")
-    return ""
+    try:
+        text = join_pages(extract_pages(pdf_path, workers=workers), markers=True)
+    except RuntimeError as e:
+        logger.warning("PDF extraction failed: %s", e)
+        text = ""
+    if not text:
+        logger.warning("⚠️ No text extracted — possibly scanned PDF (image only).")
+    return text
 
 # ---------------- CLAUSE DETECTION ----------------
 CLAUSE_RE = re.compile(
@@ -172,75 +154,199 @@ def classify_rule_text(text: str) -> Tuple[str, Dict[str, Any]]:
         return "entitlement", {"note": text[:200]}
     return "other", {}
 
+# bump when classify_rule_text output changes (namespaces the classification cache)
+PARSING_CLASSIFIER_VERSION = "1"
+
+def classify_rule_text_cached(text: str) -> Tuple[str, Dict[str, Any]]:
+    """classify_rule_text on whitespace-normalized text, memoized in the classification cache."""
+    rtype, fields = classify_cached("parsing_agent", PARSING_CLASSIFIER_VERSION, text, classify_rule_text)
+    return rtype, fields
+
 # ---------------- MONGO PUSH ----------------
-def push_parsed_document_to_mcp(parsed_doc: Dict[str, Any]) -> Dict[str, Any]:
-    doc_record = {
+RULE_FIELDS = ("clause_no", "text", "page_start", "page_end", "parsed_fields", "rule_type")
+
+def _text_fields(text: Optional[str]) -> Dict[str, Any]:
+    """summary / full_text as read by rule_classification_agent and mcp_server."""
+    summary = (text[:300] + "...") if text and len(text) > 300 else text
+    return {"summary": summary, "full_text": text}
+
+def _rule_record(rule: Dict[str, Any], city: Optional[str], doc_id: str) -> Dict[str, Any]:
+    rr = {"city": city}
+    rr.update({k: rule.get(k) for k in RULE_FIELDS})
+    rr.update(_text_fields(rule.get("text")))
+    rr["source_doc_id"] = doc_id
+    rr["inserted_at"] = datetime.utcnow().isoformat() + "Z"
+    return rr
+
+def _document_record(parsed_doc: Dict[str, Any], status: str = "complete") -> Dict[str, Any]:
+    """documents record; written once the document's rules are in, hence status "complete" by default."""
+    return {
         "filename": parsed_doc.get("source_file"),
         "city": parsed_doc.get("city"),
+        "content_sha256": parsed_doc.get("content_sha256"),
         "parsed_at": parsed_doc.get("parsed_at"),
         "rule_count": len(parsed_doc.get("rules", [])),
+        "status": status,
         "raw": parsed_doc,
     }
-    dres = _docs_col.insert_one(doc_record)
-    doc_id = str(dres.inserted_id)
+
+def push_parsed_document_to_mcp(parsed_doc: Dict[str, Any]) -> Dict[str, Any]:
+    doc_oid = ObjectId()
+    doc_id = str(doc_oid)
     inserted_rule_ids = []
     for r in parsed_doc.get("rules", []):
-        rr = {
-            "city": parsed_doc.get("city"),
-            "clause_no": r.get("clause_no"),
-            "text": r.get("text"),
-            "parsed_fields": r.get("parsed_fields"),
-            "rule_type": r.get("rule_type"),
-            "source_doc_id": doc_id,
-            "inserted_at": datetime.utcnow().isoformat() + "Z",
-        }
-        ins = _rules_col.insert_one(rr)
+        ins = _rules_col.insert_one(_rule_record(r, parsed_doc.get("city"), doc_id))
         inserted_rule_ids.append(str(ins.inserted_id))
+    _docs_col.insert_one({"_id": doc_oid, **_document_record(parsed_doc)})
     return {"document_id": doc_id, "inserted_rules": inserted_rule_ids}
 
+# ---------------- DIFF INGESTION ----------------
+def previous_edition(city: str, filename: Optional[str], previous: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Complete documents record of the city to diff a new edition against: the one named by
+    previous (a documents _id or a file name; ValueError if there is none), else the latest
+    one with the same file name, else the city's latest one. The choice is logged.
+    """
+    complete = {"city": city, "status": "complete"}
+    latest = [("parsed_at", DESCENDING)]
+    if previous:
+        key = {"_id": ObjectId(previous)} if ObjectId.is_valid(previous) else {"filename": previous}
+        doc = _docs_col.find_one({**complete, **key}, sort=latest)
+        if doc is None:
+            raise ValueError(f"No complete edition '{previous}' ingested for {city}")
+        chosen_by = "--previous"
+    else:
+        doc = _docs_col.find_one({**complete, "filename": filename}, sort=latest)
+        chosen_by = "same file name"
+        if doc is None:
+            doc = _docs_col.find_one(complete, sort=latest)
+            chosen_by = "latest edition of the city"
+    if doc is None:
+        logger.info("No previous edition of %s for %s; full push", filename, city)
+    else:
+        logger.info("Diffing %s against %s (document %s, parsed %s; chosen by %s)",
+                    filename, doc.get("filename"), doc["_id"], doc.get("parsed_at"), chosen_by)
+    return doc
+
+def edition_lineage(doc: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Id of the first edition a document descends from (its own id for a full ingest)."""
+    if doc is None:
+        return None
+    return doc.get("lineage") or str(doc["_id"])
+
+def load_ingested_rules(city: str, previous: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Rules of the previous edition (a documents record) to diff against. Unchanged clauses
+    keep the source_doc_id of the edition that last wrote them, so this is every rule
+    written by a document of the same lineage — never rules of other documents.
+    """
+    lineage = edition_lineage(previous)
+    if lineage is None:
+        return []
+    editions = _docs_col.find({"city": city, "$or": [{"_id": ObjectId(lineage)}, {"lineage": lineage}]}, {"_id": 1})
+    doc_ids = [str(d["_id"]) for d in editions]
+    projection = {k: 1 for k in RULE_FIELDS + ("source_doc_id",)}
+    return list(_rules_col.find({"city": city, "source_doc_id": {"$in": doc_ids}}, projection))
+
+def diff_ops(changes: Dict[str, Any], city: Optional[str], doc_id: str) -> Tuple[List[Any], List[str]]:
+    """
+    Bulk ops for a change set, plus the ids given to inserted rules. Modified rules are updated in place (keeping their _id,
+    so references stay valid) and the replaced version is pushed onto `history`.
+    """
+    now = datetime.utcnow().isoformat() + "Z"
+    ops: List[Any] = []
+    inserted_ids: List[str] = []
+    for r in changes["inserted"]:
+        rule_id = ObjectId()
+        inserted_ids.append(str(rule_id))
+        ops.append(InsertOne({"_id": rule_id, **_rule_record(r, city, doc_id)}))
+    for m in changes["modified"]:
+        old, new = m["old"], m["new"]
+        previous = {k: old.get(k) for k in RULE_FIELDS + ("source_doc_id",)}
+        previous.update({"replaced_at": now, "replaced_by_doc_id": doc_id,
+                         "similarity": m["similarity"], "matched_by": m["matched_by"]})
+        update = {k: new.get(k) for k in RULE_FIELDS}
+        update.update(_text_fields(new.get("text")))
+        update.update({"source_doc_id": doc_id, "updated_at": now})
+        ops.append(UpdateOne({"_id": old["_id"]}, {"$set": update, "$push": {"history": previous}}))
+    # guarded by source_doc_id: only the edition's own copy of a removed clause is deleted
+    ops.extend(DeleteOne({"_id": r["_id"], "source_doc_id": r.get("source_doc_id")}) for r in changes["removed"])
+    return ops, inserted_ids
+
+def push_clause_diff(parsed_doc: Dict[str, Any], existing: List[Dict[str, Any]],
+                     lineage: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write only what changed since the previous edition (existing: its rules, see
+    load_ingested_rules): one bulk_write, then one documents record carrying the change
+    set (removed clauses are kept there for lineage). lineage is recorded on the new
+    documents record so the next edition finds every rule of this one. Updates cannot be
+    rolled back, so a failed bulk_write still records the document, with status "failed".
+    """
+    changes = diff_clauses(existing, parsed_doc.get("rules", []))
+    summary = summarize(changes)
+    doc_oid = ObjectId()
+    doc_id = str(doc_oid)
+    doc_record = {"_id": doc_oid, **_document_record(parsed_doc)}
+    doc_record["ingest_mode"] = "diff"
+    if lineage:
+        doc_record["lineage"] = lineage
+    doc_record["changes"] = summary
+    doc_record["removed_rules"] = [
+        {"rule_id": str(r["_id"]), **{k: r.get(k) for k in ("clause_no", "text", "source_doc_id")}}
+        for r in changes["removed"]
+    ]
+
+    ops, inserted_ids = diff_ops(changes, parsed_doc.get("city"), doc_id)
+    if ops:
+        try:
+            _rules_col.bulk_write(ops, ordered=False)
+        except Exception:
+            doc_record["status"] = "failed"
+            _docs_col.insert_one(doc_record)
+            raise
+    _docs_col.insert_one(doc_record)
+    logger.info("Diff ingestion for %s: %d inserted, %d modified, %d removed, %d unchanged (%d writes)",
+                parsed_doc.get("city"), summary["inserted"], summary["modified"],
+                summary["removed"], summary["unchanged"], len(ops))
+    return {"document_id": doc_id, "mode": "diff", "changes": summary,
+            "inserted_rules": inserted_ids,
+            "writes": len(ops)}
+
 # ---------------- MAIN PARSER ----------------
-def parse_pdf_to_json(pdf_path: str, city: str) -> Dict[str, Any]:
+def parse_pdf_to_json(pdf_path: str, city: str, diff: bool = False,
+                      previous: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse, save locally and push through the staged ingestion pipeline. With diff=True the clauses are diffed against the
+    rules of the previous edition (see previous_edition; previous names it explicitly and
+    implies diff) and only the change set is written; a city with no previous edition gets
+    a full push either way.
+    """
     logger.info("Parsing PDF: %s for city=%s", pdf_path, city)
-    text = extract_text_from_pdf(pdf_path)
-    clauses = find_clauses(text)
-    parsed = {
-        "city": city,
-        "source_file": os.path.basename(pdf_path),
-        "parsed_at": datetime.utcnow().isoformat() + "Z",
-        "rule_count": len(clauses),
-        "rules": [],
-    }
-
-    for idx, c in enumerate(clauses, start=1):
-        rtype, fields = classify_rule_text(c.get("text", ""))
-        parsed["rules"].append({
-            "id": f"{city.lower()}_r_{idx}",
-            "clause_no": c.get("clause_no"),
-            "text": c.get("text"),
-            "parsed_fields": fields,
-            "rule_type": rtype,
-        })
-
-    out_name = f"{Path(pdf_path).stem}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
-    out_path = os.path.join(PARSED_OUTPUT_DIR, out_name)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(parsed, f, indent=2, ensure_ascii=False)
-    logger.info(f"✅ Saved parsed JSON locally: {out_path}")
-
-    push_info = push_parsed_document_to_mcp(parsed)
-    parsed["push_result"] = push_info
-    logger.info(f"✅ Uploaded {len(parsed['rules'])} rules to MongoDB.")
-    return parsed
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(pdf_path)
+    # extract -> segment/classify -> push run as concurrent stages (utils/ingest_pipeline.py):
+    # rule batches are written while later pages are still being extracted
+    return ingest_pdf(pdf_path, city, diff=diff or bool(previous), previous=previous)
 
 # ---------------- CLI ENTRY ----------------
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) < 3:
-        print("Usage: python agents/parsing_agent.py <pdf_path> <city>")
+    argv = sys.argv[1:]
+    previous = None
+    if "--previous" in argv:
+        i = argv.index("--previous")
+        if i + 1 >= len(argv):
+            print("--previous needs a documents id or file name")
+            sys.exit(1)
+        previous = argv[i + 1]
+        del argv[i:i + 2]
+    args = [a for a in argv if a != "--diff"]
+    if len(args) < 2:
+        print("Usage: python agents/parsing_agent.py <pdf_path> <city> [--diff] [--previous <document_id|filename>]")
         sys.exit(1)
-    path = sys.argv[1]
-    city = sys.argv[2]
-    result = parse_pdf_to_json(path, city)
+    path = args[0]
+    city = args[1]
+    result = parse_pdf_to_json(path, city, diff="--diff" in argv, previous=previous)
     print(json.dumps({
         "file": result.get("source_file"),
         "rules": result.get("rule_count"),
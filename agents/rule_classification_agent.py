@@ -5,21 +5,38 @@ Rule Classification Agent (Production-Ready)
 - Reads parsed rules from MongoDB (collection: rules)
 - Applies NLP + regex-based classification and normalization
 - Detects rule categories like FSI, Height, Setback, Parking, LandUse, etc.
+  in one keyword scan per rule (benchmark: python -m benchmarks.bench_rule_classifier)
 - Outputs cleaned, structured rule data into MongoDB (collection: classified_rules)
+- Incremental: each classified doc keeps source_hash + classifier_version; re-runs only
+  reclassify new / changed rules and bulk-upsert them by source_rule_id
+- Results are memoized on normalized clause text in the SQLite classification cache
+  (utils/classification_cache.py), shared with parsing_agent
 
 Usage (CLI):
   python -m agents.rule_classification_agent "Mumbai"
+
+  # Batch mode: stream every city's rules in chunks through 4 classifier processes
+  python -m agents.rule_classification_agent --all-cities --workers 4 --batch-size 500
 """
 
 import os
 import re
+import sys
 import json
+import time
+import hashlib
 import logging
+import argparse
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient
-import certifi
 from bson import ObjectId
+from pymongo import ASCENDING, DeleteOne, UpdateOne
+from pymongo.errors import PyMongoError
+
+from utils.mongo import LazyCollection
+from utils.classification_cache import classify_cached, get_cache
 
 # ---------- Setup ----------
 logger = logging.getLogger("RuleClassifier")
@@ -29,19 +46,13 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message
 env_path = os.path.join(os.path.dirname(__file__), '..', '.env')
 load_dotenv(env_path)
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB = os.getenv("MONGO_DB", "mcp_database")
-
-if not MONGO_URI:
-    raise EnvironmentError("❌ MONGO_URI missing. Please set it in .env.")
-
-# Mongo Connection
-_client = MongoClient(MONGO_URI, tlsCAFile=certifi.where())
-_db = _client[MONGO_DB]
-_rules = _db.get_collection("rules")
-_classified = _db.get_collection("classified_rules")
+CLASSIFY_WORKERS = int(os.getenv("CLASSIFY_WORKERS", "1"))  # batch mode: classifier processes
+CLASSIFY_BATCH_SIZE = int(os.getenv("CLASSIFY_BATCH_SIZE", "500"))  # batch mode: rules per chunk / bulk write
+RULE_PROJECTION = {"city": 1, "full_text": 1, "summary": 1, "clause_no": 1}
 
-logger.info("✅ Connected to MongoDB database: %s", MONGO_DB)
+# Mongo collections (shared client from utils.mongo, connected on first use)
+_rules = LazyCollection("rules")
+_classified = LazyCollection("classified_rules")
 
 # ---------- Classification Patterns ----------
 patterns = {
@@ -54,73 +65,339 @@ patterns = {
     "coverage": re.compile(r"\b(site coverage|ground coverage|building coverage)\b", re.IGNORECASE),
 }
 
+# Single-pass classifier: one scan over all category keywords (same priority order as
+# `patterns`, which stays as the per-category reference). The numeric tail of height /
+# setback is matched only where a keyword was found and cannot cross a line, so long
+# clause text no longer backtracks through `.*?` once per pattern.
+CATEGORY_PRIORITY = {cat: i for i, cat in enumerate(patterns)}
+_KEYWORD_SOURCE = (
+    r"\b(?:"
+    r"(?P<fsi>fsi|floor space index|f\.s\.i)"
+    r"|(?P<height>height|storey|storeys|floor height|maximum height)"
+    r"|(?P<setback>setback|set back|distance from boundary)"
+    r"|(?P<parking>parking|car park|vehicle space|parking area|stilt)"
+    r"|(?P<land_use>residential|commercial|industrial|institutional|mixed use|green zone)"
+    r"|(?P<density>population density|tenements|units per hectare|plinth area)"
+    r"|(?P<coverage>site coverage|ground coverage|building coverage)"
+    r")\b"
+)
+# text is lowercased once and scanned case-sensitively (about twice as fast); text where
+# lower() would disagree with re.IGNORECASE (length-changing or dotless-i / long-s) keeps it
+_KEYWORDS_FOLDED = re.compile(_KEYWORD_SOURCE)
+_KEYWORDS = re.compile(_KEYWORD_SOURCE, re.IGNORECASE)
+_TAILS = {
+    "fsi": re.compile(r"[:\s]*([\d\.]+)?", re.IGNORECASE),
+    "height": re.compile(r"[^\d\n]*(\d+(?:\.\d+)?)(?:\s*m|meter|metre)?", re.IGNORECASE),
+    "setback": re.compile(r"[^\d\n]*(\d+(?:\.\d+)?)(?:\s*m|meter|metre)?", re.IGNORECASE),
+}
+_NUMBER = re.compile(r"[\d\.]+")
+
+
+def match_category(text: str):
+    """(category, matched text) for the highest-priority category found, or (None, None)."""
+    best_rank, best_cat, best_matched = len(CATEGORY_PRIORITY), None, None
+    folded = text.lower()
+    if len(folded) == len(text) and "\u0131" not in text and "\u017f" not in text:
+        matches = _KEYWORDS_FOLDED.finditer(folded)
+    else:
+        matches = _KEYWORDS.finditer(text)
+    for m in matches:
+        cat = m.lastgroup
+        rank = CATEGORY_PRIORITY[cat]
+        if rank >= best_rank:
+            continue
+        end = m.end()
+        tail = _TAILS.get(cat)
+        if tail is not None:
+            t = tail.match(text, end)
+            if t is None:
+                continue  # keyword without a number on its line: try the next occurrence
+            end = t.end()
+        best_rank, best_cat, best_matched = rank, cat, text[m.start():end]
+        if rank == 0:
+            break
+    return best_cat, best_matched
+
+
 def classify_rule_text(text: str) -> dict:
     """
     Classify rule text into a category with structured info.
     """
-    text_lower = text.lower()
     rule_info = {"category": "other", "details": {}}
 
-    for cat, pattern in patterns.items():
-        m = pattern.search(text)
-        if m:
-            rule_info["category"] = cat
-            # Try to extract numeric value if present
-            nums = re.findall(r"[\d\.]+", text)
-            if nums:
-                try:
-                    rule_info["details"]["value"] = float(nums[0])
-                except ValueError:
-                    pass
-            rule_info["details"]["matched"] = m.group(0)
-            break
+    cat, matched = match_category(text)
+    if cat is not None:
+        rule_info["category"] = cat
+        # Try to extract numeric value if present
+        num = _NUMBER.search(text)
+        if num:
+            try:
+                rule_info["details"]["value"] = float(num.group(0))
+            except ValueError:
+                pass
+        rule_info["details"]["matched"] = matched
 
     return rule_info
 
+# ---------- Incremental Sync ----------
+# Bump whenever classify_rule_text output changes, so every rule is reclassified once
+# (it also namespaces the classification cache). 3: classifies whitespace-normalized text.
+CLASSIFIER_VERSION = "3"
+
+_indexes_ready = False
+
+
+def source_hash(clause_no, rule_text: str) -> str:
+    """Fingerprint of everything a classified doc is derived from."""
+    payload = json.dumps([clause_no, rule_text], ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def ensure_classified_indexes() -> None:
+    """Unique source_rule_id (the upsert key) plus city. Idempotent."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    try:
+        _classified.create_index([("source_rule_id", ASCENDING)], unique=True, name="source_rule_id_unique")
+        _classified.create_index([("city", ASCENDING)], name="city")
+        _indexes_ready = True
+    except PyMongoError as e:
+        logger.warning("Could not create classified_rules indexes (duplicate source_rule_id left?): %s", e)
+
+
+def build_classified_doc(rule: dict, city: str, digest: str) -> dict:
+    rule_text = rule.get("full_text") or rule.get("summary") or ""
+    parsed = classify_cached("rule_classifier", CLASSIFIER_VERSION, rule_text, classify_rule_text)
+    return {
+        "source_rule_id": str(rule.get("_id")),
+        "city": city,
+        "clause_no": rule.get("clause_no"),
+        "category": parsed["category"],
+        "details": parsed["details"],
+        "original_text": rule_text,
+        "source_hash": digest,
+        "classifier_version": CLASSIFIER_VERSION,
+    }
+
+
+def index_existing(existing):
+    """
+    Map source_rule_id -> classified doc (source_hash, classifier_version, _id).
+    Also returns DeleteOne ops for duplicates left by older insert-only runs, so
+    source_rule_id can stay unique.
+    """
+    current = {}
+    deletes = []
+    for doc in existing:
+        key = doc.get("source_rule_id")
+        if key in current:
+            deletes.append(DeleteOne({"_id": doc["_id"]}))
+        else:
+            current[key] = doc
+    return current, deletes
+
+
+def orphan_deletes(current, rule_ids) -> list:
+    """DeleteOne ops for classified docs whose source rule is gone (e.g. removed by an edition diff)."""
+    return [DeleteOne({"_id": doc["_id"]}) for key, doc in current.items() if key not in rule_ids]
+
+
+def select_changed(rules, current):
+    """(rule, source_hash) pairs for new / changed rules, plus how many were unchanged."""
+    changed = []
+    unchanged = 0
+    for r in rules:
+        digest = source_hash(r.get("clause_no"), r.get("full_text") or r.get("summary") or "")
+        prev = current.get(str(r.get("_id")))
+        if prev and prev.get("source_hash") == digest and prev.get("classifier_version") == CLASSIFIER_VERSION:
+            unchanged += 1
+        else:
+            changed.append((r, digest))
+    return changed, unchanged
+
+
+def classify_chunk(city: str, items) -> list:
+    """Classify (rule, source_hash) pairs. CPU work only, safe to run in a pool process."""
+    docs = [build_classified_doc(r, city, digest) for r, digest in items]
+    cache = get_cache()
+    if cache is not None:
+        cache.flush_stats()  # pool workers never run atexit
+    return docs
+
+
+def upsert_ops(docs) -> list:
+    now = datetime.utcnow().isoformat() + "Z"
+    return [
+        UpdateOne(
+            {"source_rule_id": doc["source_rule_id"]},
+            {"$set": {**doc, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True,
+        )
+        for doc in docs
+    ]
+
+
+def remove_duplicates(deletes) -> None:
+    """
+    Drop duplicate classified docs as their own ordered step, before any upsert runs,
+    so an upsert never races a delete of the same source_rule_id in one unordered batch.
+    """
+    if deletes:
+        _classified.bulk_write(deletes, ordered=True)
+
+
+def _load_existing(city: str):
+    return index_existing(_classified.find(
+        {"city": city}, {"source_rule_id": 1, "source_hash": 1, "classifier_version": 1}
+    ))
+
+
+def plan_classification(rules, existing, city: str):
+    """
+    Classify only rules that are new or whose source text / classifier version changed.
+    existing: classified_rules docs (source_rule_id, source_hash, classifier_version, _id).
+    Returns (docs to upsert, duplicate + orphan deletes, upsert ops, unchanged count).
+    """
+    current, deletes = index_existing(existing)
+    deletes += orphan_deletes(current, {str(r.get("_id")) for r in rules})
+    changed, unchanged = select_changed(rules, current)
+    docs = classify_chunk(city, changed)
+    return docs, deletes, upsert_ops(docs), unchanged
+
+
 # ---------- Main Processor ----------
 def classify_rules_for_city(city: str):
     """
-    Reads all rules for a given city, classifies them,
-    and pushes structured results to `classified_rules`.
+    Reads all rules for a given city, classifies the new / changed ones,
+    and upserts structured results into `classified_rules` (keyed by source_rule_id).
+    Classified docs whose source rule no longer exists are deleted.
+    Returns the docs written this run; an unchanged city returns [] without writing.
     """
     query = {"city": city}
-    city_rules = list(_rules.find(query))
+    city_rules = list(_rules.find(query, RULE_PROJECTION))
     logger.info("Found %d rules for city '%s'", len(city_rules), city)
 
-    if not city_rules:
-        return []
-
-    output_docs = []
-    for r in city_rules:
-        rule_text = r.get("full_text") or r.get("summary") or ""
-        rule_id = str(r.get("_id"))
-        parsed = classify_rule_text(rule_text)
-        result_doc = {
-            "source_rule_id": rule_id,
-            "city": city,
-            "clause_no": r.get("clause_no"),
-            "category": parsed["category"],
-            "details": parsed["details"],
-            "original_text": rule_text,
-            "created_at": datetime.utcnow().isoformat() + "Z"
-        }
-        _classified.insert_one(result_doc)
-        output_docs.append(result_doc)
-
-    logger.info("✅ Classified and stored %d rules for city '%s'", len(output_docs), city)
+    existing = _classified.find(
+        {"city": city}, {"source_rule_id": 1, "source_hash": 1, "classifier_version": 1}
+    )
+    output_docs, deletes, upserts, unchanged = plan_classification(city_rules, existing, city)
+    remove_duplicates(deletes)
+    if upserts:
+        _classified.bulk_write(upserts, ordered=False)
+    if deletes or upserts:
+        ensure_classified_indexes()
+
+    logger.info("✅ Classified and stored %d rules for city '%s' (%d unchanged)",
+                len(output_docs), city, unchanged)
     return output_docs
 
 
+# ---------- Batch Mode ----------
+def classify_cities_streaming(cities=None, workers: int = CLASSIFY_WORKERS,
+                              batch_size: int = CLASSIFY_BATCH_SIZE) -> dict:
+    """
+    Stream rules for each city (all cities when None) from a cursor in batch_size chunks,
+    classify new / changed chunks across `workers` processes and write each chunk's
+    results with one bulk write. At most 2 * workers chunks are in flight. Once a city's
+    cursor is exhausted, classified docs whose source rule was not seen are deleted.
+    Returns per-city counts plus overall throughput (rules per second).
+    """
+    if cities is None:
+        cities = sorted(c for c in _rules.distinct("city") if c)
+    batch_size = max(1, batch_size)
+    workers = max(1, workers)
+    stats = {"cities": {}, "rules": 0, "classified": 0, "unchanged": 0, "removed": 0, "batches": 0,
+             "workers": workers}
+    started = time.perf_counter()
+
+    def _write(city: str, docs: list) -> None:
+        if docs:
+            _classified.bulk_write(upsert_ops(docs), ordered=False)
+        stats["cities"][city]["classified"] += len(docs)
+        stats["classified"] += len(docs)
+        stats["batches"] += 1
+
+    def _chunks():
+        """(city, changed items) per cursor batch; counts rules and skips unchanged ones."""
+        for city in cities:
+            city_stats = stats["cities"][city] = {"rules": 0, "classified": 0, "unchanged": 0, "removed": 0}
+            current, deletes = _load_existing(city)
+            remove_duplicates(deletes)
+            seen = set()
+            cursor = _rules.find({"city": city}, RULE_PROJECTION, batch_size=batch_size)
+            for batch in iter(lambda: list(islice(cursor, batch_size)), []):
+                seen.update(str(r.get("_id")) for r in batch)
+                changed, unchanged = select_changed(batch, current)
+                city_stats["rules"] += len(batch)
+                city_stats["unchanged"] += unchanged
+                stats["rules"] += len(batch)
+                stats["unchanged"] += unchanged
+                if changed:
+                    yield city, changed
+            # orphans never share a source_rule_id with this city's upserts, so no ordering is needed
+            orphans = orphan_deletes(current, seen)
+            if orphans:
+                _classified.bulk_write(orphans, ordered=False)
+            city_stats["removed"] = len(orphans)
+            stats["removed"] += len(orphans)
+
+    if workers == 1:
+        for city, items in _chunks():
+            _write(city, classify_chunk(city, items))
+    else:
+        max_in_flight = 2 * workers
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = {}
+            for city, items in _chunks():
+                if len(in_flight) >= max_in_flight:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        _write(in_flight.pop(f), f.result())
+                in_flight[pool.submit(classify_chunk, city, items)] = city
+            for f in wait(in_flight).done:
+                _write(in_flight[f], f.result())
+
+    if stats["classified"] or stats["removed"]:
+        ensure_classified_indexes()
+    elapsed = time.perf_counter() - started
+    stats["elapsed_s"] = round(elapsed, 3)
+    stats["rules_per_s"] = round(stats["rules"] / elapsed, 2) if elapsed > 0 else None
+    cache = get_cache()
+    if cache is not None:
+        stats["classification_cache"] = cache.stats(persisted=True).get("rule_classifier")
+    logger.info("✅ Batch classification: %d rules in %d cities (%d classified, %d unchanged, %d removed) "
+                "in %.2fs (%s rules/s, %d workers)",
+                stats["rules"], len(stats["cities"]), stats["classified"], stats["unchanged"], stats["removed"],
+                elapsed, stats["rules_per_s"], workers)
+    return stats
+
+
 # ---------- CLI Entry ----------
-if __name__ == "__main__":
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: python -m agents.rule_classification_agent <CityName>")
+def main():
+    parser = argparse.ArgumentParser(description="Rule Classification Agent")
+    parser.add_argument("city", nargs="?", help="City to classify")
+    parser.add_argument("--all-cities", action="store_true", help="Classify every city in the rules collection")
+    parser.add_argument("--workers", type=int, default=CLASSIFY_WORKERS,
+                        help="Classifier processes for batch mode (default: CLASSIFY_WORKERS or 1)")
+    parser.add_argument("--batch-size", type=int, default=CLASSIFY_BATCH_SIZE,
+                        help="Rules per cursor chunk / bulk write in batch mode")
+    args = parser.parse_args()
+
+    if args.all_cities:
+        print(json.dumps(classify_cities_streaming(None, args.workers, args.batch_size), indent=2, ensure_ascii=False))
+    elif args.city and args.workers > 1:
+        print(json.dumps(classify_cities_streaming([args.city], args.workers, args.batch_size), indent=2, ensure_ascii=False))
+    elif args.city:
+        results = classify_rules_for_city(args.city)
+        print(json.dumps(
+            {"city": args.city, "classified_rules": len(results)},
+            indent=2, ensure_ascii=False
+        ))
+    else:
+        parser.print_help()
         sys.exit(1)
 
-    city = sys.argv[1]
-    results = classify_rules_for_city(city)
-    print(json.dumps(
-        {"city": city, "classified_rules": len(results)},
-        indent=2, ensure_ascii=False
-    ))
+
+if __name__ == "__main__":
+    main()
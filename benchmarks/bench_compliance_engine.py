@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Benchmark: vectorized compliance engine vs evaluator_agent.evaluate_project loop
+
+Usage:
+  python -m benchmarks.bench_compliance_engine                 # 10k subjects x 500 rules
+  python -m benchmarks.bench_compliance_engine --subjects 2000 --rules 100
+  python -m benchmarks.bench_compliance_engine --reference-sample 500
+
+The reference loop is timed on --reference-sample subjects and extrapolated to the
+full N, so the default 10k x 500 run stays quick.
+"""
+import os
+import time
+import random
+import argparse
+
+# evaluator_agent builds its Mongo client at import time; no connection is made until first use
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+from agents.evaluator_agent import evaluate_project
+from utils.compliance_engine import (
+    compile_classified_rules,
+    subjects_matrix,
+    evaluate_matrix,
+    results_for_row,
+    OVERALL_NAMES,
+)
+
+CATEGORIES = ["height", "fsi", "setback", "floors", "parking", "coverage", "land_use", "other"]
+
+
+def make_rules(n: int, rng: random.Random):
+    rules = []
+    for i in range(n):
+        cat = rng.choice(CATEGORIES)
+        rules.append({
+            "_id": f"rule_{i}",
+            "category": cat,
+            "details": {"value": round(rng.uniform(1, 40), 2)} if rng.random() < 0.9 else {},
+            "original_text": f"Synthetic clause {i} ({cat})",
+        })
+    return rules
+
+
+def make_projects(n: int, rng: random.Random):
+    projects = []
+    for i in range(n):
+        params = {
+            "height_m": round(rng.uniform(5, 45), 1),
+            "fsi": round(rng.uniform(0.5, 4), 2),
+            "setback_m": round(rng.uniform(1, 8), 1),
+            "floors": rng.randint(1, 15),
+            "parking_spaces": rng.randint(0, 40),
+            "coverage_percent": round(rng.uniform(20, 80), 1),
+        }
+        projects.append({"_id": f"proj_{i}", "city": "Bench", "parameters": params})
+    return projects
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compliance engine benchmark")
+    parser.add_argument("--subjects", type=int, default=10_000)
+    parser.add_argument("--rules", type=int, default=500)
+    parser.add_argument("--reference-sample", type=int, default=200,
+                        help="Subjects to run through the scalar evaluator (timing is extrapolated)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = make_rules(args.rules, rng)
+    projects = make_projects(args.subjects, rng)
+    sample = projects[:min(args.reference_sample, len(projects))]
+
+    t0 = time.perf_counter()
+    reference = [evaluate_project(p, rules) for p in sample]
+    ref_elapsed = time.perf_counter() - t0
+    ref_full = ref_elapsed * len(projects) / max(len(sample), 1)
+
+    t0 = time.perf_counter()
+    ruleset = compile_classified_rules(rules)
+    t_compile = time.perf_counter() - t0
+    subjects = subjects_matrix([p["parameters"] for p in projects])
+    t_subjects = time.perf_counter() - t0 - t_compile
+    result = evaluate_matrix(subjects, ruleset)
+    vec_elapsed = time.perf_counter() - t0
+
+    # parity check on the reference sample
+    for i, expected in enumerate(reference):
+        assert result.overall_score[i] == expected["overall_score"], i
+        assert OVERALL_NAMES[result.overall_status[i]] == expected["overall_status"], i
+        assert results_for_row(ruleset, subjects, result, i) == expected["results"], i
+
+    cells = len(projects) * len(rules)
+    print(f"subjects x rules       : {len(projects)} x {len(rules)} ({cells:,} cells)")
+    print(f"scalar evaluate_project: {ref_elapsed:.3f}s for {len(sample)} subjects "
+          f"-> ~{ref_full:.2f}s extrapolated")
+    print(f"vectorized engine      : {vec_elapsed:.3f}s total "
+          f"(compile {t_compile:.3f}s, subjects {t_subjects:.3f}s, "
+          f"matrix {vec_elapsed - t_compile - t_subjects:.3f}s)")
+    print(f"speedup                : ~{ref_full / vec_elapsed:.0f}x")
+    print(f"parity                 : OK on {len(reference)} subjects")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Benchmark: single-pass rule classifier vs the per-category regex loop
+
+Usage:
+  python -m benchmarks.bench_rule_classifier                      # data/parsed corpus x 50
+  python -m benchmarks.bench_rule_classifier --repeat 200
+  python -m benchmarks.bench_rule_classifier --parsed-dir data/parsed --long-lines 2000
+
+The corpus is every rule text in the parsed JSON files (data/parsed/*.json), repeated
+--repeat times. --long-lines adds one synthetic clause of that many keyword lines with
+no numbers, the case where the old `.*?` patterns backtrack the most.
+"""
+import os
+import re
+import glob
+import json
+import time
+import argparse
+
+from agents.rule_classification_agent import classify_rule_text, patterns
+
+
+def classify_rule_text_reference(text: str) -> dict:
+    """The previous implementation: one regex search per category, then findall for the value."""
+    rule_info = {"category": "other", "details": {}}
+    for cat, pattern in patterns.items():
+        m = pattern.search(text)
+        if m:
+            rule_info["category"] = cat
+            nums = re.findall(r"[\d\.]+", text)
+            if nums:
+                try:
+                    rule_info["details"]["value"] = float(nums[0])
+                except ValueError:
+                    pass
+            rule_info["details"]["matched"] = m.group(0)
+            break
+    return rule_info
+
+
+def load_corpus(parsed_dir: str):
+    texts = []
+    for path in sorted(glob.glob(os.path.join(parsed_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for rule in data.get("rules", []):
+            text = rule.get("full_text") or rule.get("text") or rule.get("summary") or ""
+            if text:
+                texts.append(text)
+    return texts
+
+
+def timed(fn, texts):
+    t0 = time.perf_counter()
+    out = [fn(t) for t in texts]
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule classifier benchmark")
+    parser.add_argument("--parsed-dir", default=os.path.join("data", "parsed"))
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--long-lines", type=int, default=500,
+                        help="Lines in the synthetic number-free clause (0 to skip)")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.parsed_dir)
+    if args.long_lines:
+        corpus.append("\n".join("maximum height of the storey above the setback line" for _ in range(args.long_lines))
+                      + "\nsite coverage 40 percent")
+    if not corpus:
+        raise SystemExit(f"No rule text found under {args.parsed_dir}")
+    texts = corpus * args.repeat
+    chars = sum(len(t) for t in texts)
+
+    reference, ref_elapsed = timed(classify_rule_text_reference, texts)
+    single, new_elapsed = timed(classify_rule_text, texts)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(reference, single)) if a != b]
+    if mismatches:
+        raise SystemExit(f"parity FAILED on {len(mismatches)} texts, first: {texts[mismatches[0]][:200]!r}")
+
+    print(f"corpus                 : {len(corpus)} texts x {args.repeat} = {len(texts):,} ({chars / 1e6:.1f} MB)")
+    print(f"per-category regexes   : {ref_elapsed:.3f}s ({len(texts) / ref_elapsed:,.0f} rules/s)")
+    print(f"single-pass classifier : {new_elapsed:.3f}s ({len(texts) / new_elapsed:,.0f} rules/s)")
+    print(f"speedup                : {ref_elapsed / new_elapsed:.1f}x")
+    print(f"parity                 : OK on {len(texts):,} texts")
+
+
+if __name__ == "__main__":
+    main()
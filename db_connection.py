@@ -1,31 +1,19 @@
 # db_connection.py
-import os
-import certifi
-from pymongo import MongoClient
-from dotenv import load_dotenv
+from utils.mongo import get_db as _shared_db, ping
 
-load_dotenv()
 
 def get_db():
+    """Database handle on the shared pooled client (utils.mongo), or None if unreachable."""
     try:
-        MONGO_URI = os.getenv("MONGO_URI")
-        MONGO_DB = os.getenv("MONGO_DB", "mcp_database")
-
-        client = MongoClient(
-            MONGO_URI,
-            tls=True,
-            tlsCAFile=certifi.where(),  # ✅ Trusted CA certificates
-            serverSelectionTimeoutMS=20000
-        )
-
-        db = client[MONGO_DB]
-        client.admin.command('ping')  # ✅ Forces handshake test
-        print(f"✅ Connected to MongoDB: {db.name}")
-        return db
-
+        db = _shared_db()
     except Exception as e:
         print(f"❌ MongoDB connection failed: {e}")
         return None
+    if not ping():  # ✅ Forces handshake test
+        print("❌ MongoDB connection failed: server unreachable")
+        return None
+    print(f"✅ Connected to MongoDB: {db.name}")
+    return db
 
 # Test
 if __name__ == "__main__":
@@ -14,6 +14,8 @@ from agents.design_agent import prompt_to_spec
 from agents.calculator_agent import calculator_agent
 from utils.geometry_converter import json_to_glb, create_building_geometry
 from utils import mcp_store
+from utils.geometry_jobs import forget_jobs, job_status
+from utils.envelope_solver import solve_envelope
 
 st.set_page_config(page_title="Prompt Runner", layout="wide")
 st.title("📝 Streamlit Prompt Runner")
@@ -96,8 +98,10 @@ with comp_col1:
     check_depth = st.number_input("Depth (m)", min_value=5.0, value=20.0, step=1.0)
     check_setback = st.number_input("Setback (m)", min_value=0.0, value=3.0, step=0.5)
     check_fsi = st.number_input("FSI", min_value=0.1, value=2.0, step=0.1)
+    check_type = st.selectbox("Building Type", ["Residential", "Commercial", "Mixed-Use", "Industrial"])
     
     check_compliance = st.button("Check Compliance", type="primary")
+    check_envelope = st.button("📐 Buildable Envelope")
 
 with comp_col2:
     if check_compliance:
@@ -109,36 +113,64 @@ with comp_col2:
                     "depth_m": check_depth,
                     "setback_m": check_setback,
                     "fsi": check_fsi,
-                    "type": "residential"
+                    "type": check_type.lower()
                 }
                 
-                results = calculator_agent(selected_city, subject)
-                
-                st.success(f"✅ Found {len(results)} applicable rules")
-                
-                for idx, result in enumerate(results):
-                    with st.expander(f"Rule: {result.get('clause_no', 'N/A')}"):
-                        checks = result.get('checks', {})
-                        
-                        if 'height' in checks:
-                            h = checks['height']
-                            if h.get('ok') is True:
-                                st.success(f"✅ Height: Compliant")
-                            elif h.get('ok') is False:
-                                st.error(f"❌ Height: Non-compliant")
-                        
-                        if 'fsi' in checks:
-                            f = checks['fsi']
-                            if f.get('ok') is True:
-                                st.success(f"✅ FSI: Compliant")
-                            elif f.get('ok') is False:
-                                st.error(f"❌ FSI: Non-compliant")
-                        
-                        st.json(result)
+                # Geometry is exported in the background; results come back right away
+                results = calculator_agent(selected_city, subject, async_geometry=True)
+                st.session_state["compliance_results"] = results
+                # the previous check's jobs are no longer shown: release their records
+                forget_jobs(st.session_state.get("geometry_jobs") or [])
+                st.session_state["geometry_jobs"] = [
+                    r["geometry_job"] for r in results if r.get("geometry_job")
+                ]
                         
             except Exception as e:
                 st.error(f"Error: {str(e)}")
 
+    if check_envelope:
+        try:
+            # One analytic pass over the compiled rules instead of trial-and-error re-runs
+            envelope = solve_envelope(selected_city, check_width, check_depth, check_type,
+                                      setback_m=check_setback)
+            st.markdown(f"**Buildable envelope — {selected_city}, {check_type}, "
+                        f"{check_width:g} m × {check_depth:g} m plot**")
+            env_cols = st.columns(4)
+            env_cols[0].metric("Max Height (m)", envelope["max_height_m"] if envelope["max_height_m"] is not None else "—")
+            env_cols[1].metric("Max Floors", envelope["max_floors"] if envelope["max_floors"] is not None else "—")
+            env_cols[2].metric("Max FSI", envelope["max_fsi"] if envelope["max_fsi"] is not None else "—")
+            env_cols[3].metric("Max Built-up (m²)", envelope["max_built_up_sqm"] if envelope["max_built_up_sqm"] is not None else "—")
+            if envelope["conflicts"]:
+                st.warning(f"⚠️ Conflicting rules: {envelope['conflicts']}")
+            with st.expander("Envelope details"):
+                st.json(envelope)
+        except Exception as e:
+            st.error(f"Error: {str(e)}")
+
+    results = st.session_state.get("compliance_results")
+    if results is not None:
+        st.success(f"✅ Found {len(results)} applicable rules")
+        
+        for idx, result in enumerate(results):
+            with st.expander(f"Rule: {result.get('clause_no', 'N/A')}"):
+                checks = result.get('checks', {})
+                
+                if 'height' in checks:
+                    h = checks['height']
+                    if h.get('ok') is True:
+                        st.success(f"✅ Height: Compliant")
+                    elif h.get('ok') is False:
+                        st.error(f"❌ Height: Non-compliant")
+                
+                if 'fsi' in checks:
+                    f = checks['fsi']
+                    if f.get('ok') is True:
+                        st.success(f"✅ FSI: Compliant")
+                    elif f.get('ok') is False:
+                        st.error(f"❌ FSI: Non-compliant")
+                
+                st.json(result)
+
 # --- 3D Geometry Viewer Section ---
 st.markdown("---")
 st.markdown("### 🏗️ 3D Geometry Viewer")
@@ -146,6 +178,7 @@ st.markdown("### 🏗️ 3D Geometry Viewer")
 tab1, tab2 = st.tabs(["📊 Current Model", "🗂️ Gallery View"])
 
 with tab1:
+    geometry_jobs = st.session_state.get("geometry_jobs") or []
     if case_id:
         geometry_path = os.path.join("outputs", "geometry", f"{case_id}.glb")
         if os.path.exists(geometry_path):
@@ -153,7 +186,25 @@ with tab1:
             render_glb_viewer(geometry_path, height=500)
         else:
             st.info("No 3D geometry generated yet for this case.")
-    else:
+    if geometry_jobs:
+        statuses = [job_status(j) for j in geometry_jobs]
+        finished = [s for s in statuses if s["state"] == "done"]
+        in_flight = [s for s in statuses if s["state"] in ("pending", "running")]
+        failed = [s for s in statuses if s["state"] == "failed"]
+        
+        if in_flight:
+            st.info(f"⏳ Generating 3D geometry: {len(finished)}/{len(statuses)} models ready")
+            st.button("🔄 Refresh", key="refresh_geometry_jobs")
+        for s in failed:
+            st.error(f"Geometry job {s['job_id']} for {s['case_id']} failed: {s['error']}")
+        if finished:
+            choice = st.selectbox(
+                "Compliance check model:",
+                options=[s["path"] for s in finished],
+                format_func=lambda p: os.path.splitext(os.path.basename(p))[0]
+            )
+            render_glb_viewer(choice, height=500)
+    if not case_id and not geometry_jobs:
         st.info("Submit a prompt to generate and view 3D geometry.")
 
 with tab2:
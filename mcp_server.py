@@ -1,7 +1,6 @@
 #mcp_server.py
 from flask import Flask, request, jsonify
 from datetime import datetime
-from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
 import logging
@@ -20,23 +19,18 @@ MONGO_URI = os.environ.get(
 )
 MONGO_DB = os.environ.get("MONGO_DB", os.environ.get("MCP_DB", "mcp_database"))
 
-# Create client with reasonable timeout
-try:
-    client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=10000)
-    client.admin.command("ping")
-    logger.info("Connected to MongoDB (URI from env or default).")
-except Exception as e:
-    logger.exception("Cannot connect to MongoDB. Check MONGO_URI and network: %s", e)
-    raise SystemExit(1)
+# utils.mongo reads these; keep the server's historical localhost / MCP_DB defaults
+os.environ.setdefault("MONGO_URI", MONGO_URI)
+os.environ.setdefault("MONGO_DB", MONGO_DB)
 
-db = client[MONGO_DB]
+from utils.mongo import LazyCollection, ping  # noqa: E402
 
-# --- Collections ---
-rules_col = db.get_collection("rules")
-feedback_col = db.get_collection("feedback")
-geometry_col = db.get_collection("geometry_outputs")
-documents_col = db.get_collection("documents")
-rl_logs_col = db.get_collection("rl_logs")
+# --- Collections (shared pooled client, connected on first request) ---
+rules_col = LazyCollection("rules")
+feedback_col = LazyCollection("feedback")
+geometry_col = LazyCollection("geometry_outputs")
+documents_col = LazyCollection("documents")
+rl_logs_col = LazyCollection("rl_logs")
 
 
 # === API: Save Rule (POST) ===
@@ -211,5 +205,8 @@ def index():
 
 
 if __name__ == "__main__":
+    if not ping():
+        logger.error("Cannot connect to MongoDB. Check MONGO_URI and network.")
+        raise SystemExit(1)
     app.run(host="0.0.0.0", port=5001, debug=True)
 # ...existing code...
\ No newline at end of file
@@ -90,6 +90,24 @@ class TestCalculatorAgent:
         assert results[0]["checks"]["height"]["ok"] is False
 
 
+    @patch('agents.calculator_agent.get_rules_for_city')
+    @patch('agents.calculator_agent.submit_geometry_job')
+    @patch('agents.calculator_agent.json_to_glb')
+    def test_calculator_agent_async_geometry(self, mock_glb, mock_submit, mock_get_rules, sample_subject):
+        """Test calculator agent returns immediately and queues geometry jobs"""
+        mock_get_rules.return_value = [
+            {"id": "rule_789", "rule": {"clause_no": "DCPR-9.1", "parsed_fields": {"height": {"op": "<=", "value_m": 24.0}}}}
+        ]
+        mock_submit.return_value = "job_abc"
+        
+        results = calculator_agent("Mumbai", sample_subject, async_geometry=True)
+        
+        assert results[0]["checks"]["height"]["ok"] is True
+        assert results[0]["geometry_job"] == "job_abc"
+        mock_glb.assert_not_called()
+        assert mock_submit.call_args[0][0] == "rule_789"
+
+
 class TestRLAgent:
     """Test Reinforcement Learning agent"""
     
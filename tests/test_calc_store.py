@@ -0,0 +1,148 @@
+# tests/test_calc_store.py
+"""
+Tests for the partitioned calculator result store
+"""
+import os
+import gzip
+import json
+import multiprocessing
+import pytest
+from unittest.mock import patch
+
+from utils.calc_store import append_run, iter_segments, iter_history, pass_rates, list_cities
+
+
+def _outcomes(height_ok, fsi_ok):
+    return [{"id": "r1", "clause_no": "C-1", "checks": {
+        "height": {"ok": height_ok, "rule": {"op": "<=", "value_m": 24}, "subject": 20},
+        "fsi": {"ok": fsi_ok, "rule": 2.0, "subject": 1.8},
+    }}]
+
+
+class TestAppendAndRead:
+    """Test appending runs and streaming them back"""
+    
+    def test_one_line_per_run(self, tmp_path):
+        root = str(tmp_path)
+        path = append_run("Pune", {"height_m": 20}, _outcomes(True, True), root=root)
+        append_run("Pune", {"height_m": 30}, _outcomes(False, True), root=root)
+        
+        assert path.endswith("part-00000.ndjson")
+        with open(path, encoding="utf-8") as f:
+            assert len(f.readlines()) == 2
+        history = list(iter_history("Pune", root=root))
+        assert [h["subject"]["height_m"] for h in history] == [20, 30]
+        assert list_cities(root) == ["Pune"]
+    
+    def test_rotation_by_size(self, tmp_path):
+        root = str(tmp_path)
+        for i in range(3):
+            append_run("Nashik", {"height_m": i}, _outcomes(True, None), root=root, max_bytes=1)
+        segments = list(iter_segments("Nashik", root=root))
+        assert [os.path.basename(s) for s in segments] == ["part-00000.ndjson", "part-00001.ndjson", "part-00002.ndjson"]
+        assert [h["subject"]["height_m"] for h in iter_history("Nashik", root=root)] == [0, 1, 2]
+    
+    def test_compressed_segments(self, tmp_path):
+        root = str(tmp_path)
+        paths = [append_run("Mumbai", {"height_m": i}, _outcomes(True, True), root=root, compress=True, max_bytes=1)
+                 for i in range(3)]
+        assert all(p.endswith(".ndjson") for p in paths)
+        segments = [os.path.basename(s) for s in iter_segments("Mumbai", root=root)]
+        assert segments == ["part-00000.ndjson.gz", "part-00001.ndjson.gz", "part-00002.ndjson"]
+        with gzip.open(os.path.join(os.path.dirname(paths[0]), segments[0]), "rt", encoding="utf-8") as f:
+            assert len(f.readlines()) == 1
+        assert [h["subject"]["height_m"] for h in iter_history("Mumbai", root=root)] == [0, 1, 2]
+    
+    def test_whole_segment_compression_shrinks_storage(self, tmp_path):
+        root = str(tmp_path)
+        for i in range(300):
+            append_run("Thane", {"height_m": i}, _outcomes(True, False), root=root, compress=True, max_bytes=20_000)
+        segments = list(iter_segments("Thane", root=root))
+        sealed = [s for s in segments if s.endswith(".gz")]
+        assert sealed
+        with gzip.open(sealed[0], "rb") as f:
+            raw = len(f.read())
+        assert os.path.getsize(sealed[0]) * 5 < raw
+        assert len(list(iter_history("Thane", root=root))) == 300
+    
+    def test_previous_days_sealed_on_new_day(self, tmp_path):
+        root = str(tmp_path)
+        old = tmp_path / "Pune" / "2025-01-01"
+        old.mkdir(parents=True)
+        (old / "part-00000.ndjson").write_text(json.dumps({"subject": {"height_m": 1}}) + "\n", encoding="utf-8")
+        append_run("Pune", {"height_m": 2}, [], root=root, compress=True)
+        assert os.listdir(old) == ["part-00000.ndjson.gz"]
+        assert [h["subject"]["height_m"] for h in iter_history("Pune", root=root)] == [1, 2]
+    
+    def test_day_filter_and_corrupt_lines(self, tmp_path):
+        root = str(tmp_path)
+        old = tmp_path / "Pune" / "2025-01-01"
+        old.mkdir(parents=True)
+        (old / "part-00000.ndjson").write_text(
+            json.dumps({"subject": {"height_m": 1}, "outcomes": []}) + "\n{not json\n", encoding="utf-8")
+        append_run("Pune", {"height_m": 2}, [], root=root)
+        
+        assert len(list(iter_history("Pune", root=root))) == 2
+        assert [h["subject"]["height_m"] for h in iter_history("Pune", since="2025-06-01", root=root)] == [2]
+        assert list(iter_history("Unknown City", root=root)) == []
+    
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+    def test_concurrent_processes_rotate_and_compress_safely(self, tmp_path):
+        root = str(tmp_path)
+        
+        def writer(worker):
+            for i in range(40):
+                append_run("Pune", {"worker": worker, "i": i}, _outcomes(True, True),
+                           root=root, compress=True, max_bytes=600)
+        
+        ctx = multiprocessing.get_context("fork")
+        procs = [ctx.Process(target=writer, args=(w,)) for w in range(4)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join(60)
+            assert p.exitcode == 0
+        
+        runs = [(h["subject"]["worker"], h["subject"]["i"]) for h in iter_history("Pune", root=root)]
+        assert sorted(runs) == [(w, i) for w in range(4) for i in range(40)]
+        names = [os.path.basename(s) for s in iter_segments("Pune", root=root)]
+        assert all(n.endswith(".gz") for n in names[:-1])
+        assert list_cities(root) == ["Pune"]
+
+
+class TestPassRates:
+    """Test streaming aggregation"""
+    
+    def test_pass_rates(self, tmp_path):
+        root = str(tmp_path)
+        append_run("Pune", {}, _outcomes(True, True), root=root)
+        append_run("Pune", {}, _outcomes(False, None), root=root)
+        append_run("Pune", {}, _outcomes(True, False), root=root)
+        
+        stats = pass_rates("Pune", root=root)
+        assert stats["runs"] == 3
+        assert stats["checks"]["height"] == {"passed": 2, "failed": 1, "unknown": 0, "rate": 0.6667}
+        assert stats["checks"]["fsi"] == {"passed": 1, "failed": 1, "unknown": 1, "rate": 0.5}
+
+
+class TestCalculatorIntegration:
+    """Calculator agent appends to the store instead of writing a file per run"""
+    
+    @patch('agents.calculator_agent.get_rules_for_city')
+    @patch('agents.calculator_agent.log_geometry')
+    @patch('agents.calculator_agent.json_to_glb')
+    def test_calculator_appends_run(self, mock_glb, mock_log, mock_get_rules, sample_subject, tmp_path, monkeypatch):
+        from agents.calculator_agent import calculator_agent
+        monkeypatch.setattr("utils.calc_store.CALC_STORE_DIR", str(tmp_path / "store"))
+        monkeypatch.chdir(tmp_path)
+        mock_glb.return_value = "outputs/geometry/rule_1.glb"
+        mock_get_rules.return_value = [{"id": "rule_1", "rule": {"clause_no": "C-1",
+                                        "parsed_fields": {"height": {"op": "<=", "value_m": 24}}}}]
+        
+        calculator_agent("Pune", sample_subject)
+        calculator_agent("Pune", sample_subject)
+        
+        runs = list(iter_history("Pune", root=str(tmp_path / "store")))
+        assert len(runs) == 2
+        assert runs[0]["outcomes"][0]["checks"]["height"]["ok"] is True
+        assert not list(tmp_path.glob("outputs/*_calc_*.json"))
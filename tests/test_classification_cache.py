@@ -0,0 +1,95 @@
+"""
+Tests for the SQLite classification cache (utils/classification_cache.py)
+"""
+import os
+import sys
+import pytest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import classification_cache
+from utils.classification_cache import ClassificationCache, normalize_clause_text, classify_cached
+
+
+@pytest.fixture
+def cache(tmp_path):
+    c = ClassificationCache(str(tmp_path / "cache.sqlite"))
+    yield c
+    c.close()
+
+
+def _classifier(calls):
+    def classify(text):
+        calls.append(text)
+        return ("height", {"height_m": float(text.split()[-1])})
+    return classify
+
+
+class TestNormalizeClauseText:
+    """Whitespace-only differences share a key; line structure is kept"""
+
+    def test_collapses_spaces_and_blank_lines(self):
+        assert normalize_clause_text("  Max\theight   24 \r\n\r\n\n next  line ") == "Max height 24\nnext line"
+
+    def test_keeps_line_breaks(self):
+        assert normalize_clause_text("height\n24") == "height\n24"
+
+
+class TestClassificationCache:
+    """Lookups, versioning and hit-rate statistics"""
+
+    def test_whitespace_variants_hit(self, cache):
+        calls = []
+        first = cache.classify("parsing_agent", "1", "Max height  24", _classifier(calls))
+        second = cache.classify("parsing_agent", "1", "  Max height 24\n", _classifier(calls))
+        assert calls == ["Max height 24"]
+        assert first == second == ["height", {"height_m": 24.0}]
+        assert cache.stats()["parsing_agent"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+    def test_version_and_namespace_isolate_entries(self, cache):
+        calls = []
+        for namespace, version in [("a", "1"), ("a", "2"), ("b", "1")]:
+            cache.classify(namespace, version, "height 10", _classifier(calls))
+        assert len(calls) == 3
+
+    def test_persists_across_instances_and_runs(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite")
+        first = ClassificationCache(path)
+        first.classify("ns", "1", "height 12", _classifier([]))
+        first.close()
+
+        calls = []
+        second = ClassificationCache(path)
+        assert second.classify("ns", "1", "height 12", _classifier(calls)) == ["height", {"height_m": 12.0}]
+        assert calls == []
+        persisted = second.stats(persisted=True)["ns"]
+        assert persisted == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+        second.close()
+
+    def test_disabled_cache_classifies_normalized_text(self):
+        calls = []
+        with patch.object(classification_cache, "CLASSIFICATION_CACHE_PATH", "off"):
+            assert classify_cached("ns", "1", " height   5 ", _classifier(calls)) == ("height", {"height_m": 5.0})
+        assert calls == ["height 5"]
+
+
+class TestAgentsUseCache:
+    """Both classifiers consult the shared cache"""
+
+    def test_parsing_agent_classifier(self, cache):
+        from agents import parsing_agent
+        with patch.object(classification_cache, "_cache", cache):
+            assert parsing_agent.classify_rule_text_cached("FSI 2.5") == ("fsi", {"fsi": 2.5})
+            assert parsing_agent.classify_rule_text_cached("FSI   2.5") == ("fsi", {"fsi": 2.5})
+        assert cache.stats()["parsing_agent"]["hits"] == 1
+
+    def test_rule_classifier_build_doc(self, cache):
+        from agents import rule_classification_agent as classifier
+        rule = {"_id": "r1", "clause_no": "1", "full_text": "floor  space index 3"}
+        with patch.object(classification_cache, "_cache", cache):
+            doc = classifier.build_classified_doc(rule, "Pune", "h")
+            classifier.build_classified_doc(dict(rule, _id="r2"), "Mumbai", "h")
+        assert doc["category"] == "fsi" and doc["details"]["value"] == 3.0
+        assert doc["original_text"] == "floor  space index 3"
+        assert cache.stats()["rule_classifier"] == {"hits": 1, "misses": 1, "hit_rate": 0.5}
@@ -0,0 +1,154 @@
+"""
+Tests for clause-level diff ingestion (utils/clause_diff.py, parsing_agent --diff)
+"""
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+
+from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, UpdateOne
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import classification_cache
+from utils.clause_diff import diff_clauses, summarize
+
+
+def _stored(clause_no, text):
+    return {"_id": ObjectId(), "clause_no": clause_no, "text": text, "source_doc_id": "doc-1"}
+
+
+OLD = [
+    _stored("1", "Max height 24 m for residential buildings"),
+    _stored("2", "FSI 2.5 in zone A"),
+    _stored("3", "Setback 3 m from the road"),
+    _stored(None, "Parking shall be provided at one space per dwelling unit in all zones"),
+]
+
+
+class TestDiffClauses:
+    """Matching by clause number, then by text similarity"""
+
+    def test_identical_edition_has_no_changes(self):
+        new = [{"clause_no": c["clause_no"], "text": "  " + c["text"].replace(" ", "  ")} for c in OLD]
+        changes = diff_clauses(OLD, new)
+        assert changes["unchanged"] == 4
+        assert changes["inserted"] == changes["modified"] == changes["removed"] == []
+
+    def test_insert_modify_remove(self):
+        new = [
+            {"clause_no": "1", "text": "Max height 30 m for residential buildings"},
+            {"clause_no": "2", "text": "FSI 2.5 in zone A"},
+            {"clause_no": "4", "text": "Ground coverage 40 percent"},
+            {"clause_no": None, "text": "Parking shall be provided at one space per dwelling unit in most zones"},
+        ]
+        changes = diff_clauses(OLD, new)
+        assert changes["unchanged"] == 1
+        assert [c["clause_no"] for c in changes["inserted"]] == ["4"]
+        assert [(m["old"]["_id"], m["matched_by"]) for m in changes["modified"]] == [
+            (OLD[0]["_id"], "clause_no"), (OLD[3]["_id"], "similarity")]
+        assert changes["removed"] == [OLD[2]]
+        assert summarize(changes)["removed_clauses"] == ["3"]
+
+    def test_renumbered_clause_is_matched_by_text(self):
+        new = [{"clause_no": "5", "text": "Setback 3 m from the road"}]
+        changes = diff_clauses(OLD[2:3], new)
+        assert changes["modified"][0]["matched_by"] == "text"
+        assert changes["inserted"] == changes["removed"] == []
+
+    def test_dissimilar_text_is_insert_plus_remove(self):
+        changes = diff_clauses(OLD[3:], [{"clause_no": None, "text": "Entirely different provision on signage"}])
+        assert len(changes["inserted"]) == 1 and changes["removed"] == OLD[3:]
+
+
+class TestPushClauseDiff:
+    """Only the change set is written, in one bulk operation"""
+
+    def test_bulk_write_holds_only_changes(self):
+        from agents import parsing_agent
+        docs, rules = MagicMock(), MagicMock()
+        docs.insert_one.return_value.inserted_id = "doc-2"
+        parsed = {"city": "Mumbai", "source_file": "dcpr_v2.pdf", "parsed_at": "now", "rules": [
+            {"clause_no": "1", "text": "Max height 30 m for residential buildings", "rule_type": "height"},
+            {"clause_no": "2", "text": "FSI 2.5 in zone A", "rule_type": "fsi"},
+            {"clause_no": "4", "text": "Ground coverage 40 percent", "rule_type": "other"},
+        ]}
+        with patch.object(parsing_agent, "_docs_col", docs), patch.object(parsing_agent, "_rules_col", rules):
+            result = parsing_agent.push_clause_diff(parsed, OLD[:3])
+
+        ops = rules.bulk_write.call_args[0][0]
+        assert rules.bulk_write.call_count == 1 and not rules.insert_one.called
+        assert [type(op) for op in ops] == [InsertOne, UpdateOne, DeleteOne]
+        assert result["changes"]["unchanged"] == 1 and result["writes"] == 3
+        assert len(result["inserted_rules"]) == 1
+
+        update = ops[1]._doc
+        assert update["$set"]["text"] == "Max height 30 m for residential buildings"
+        assert update["$push"]["history"]["text"] == "Max height 24 m for residential buildings"
+        record = docs.insert_one.call_args[0][0]
+        assert record["ingest_mode"] == "diff"
+        assert record["removed_rules"][0]["clause_no"] == "3"
+
+    def test_parse_without_existing_rules_does_full_push(self, tmp_path):
+        from agents import parsing_agent
+        from utils import ingest_pipeline
+        pdf = tmp_path / "dcpr.pdf"
+        pdf.write_bytes(b"%PDF")
+        docs, rules = MagicMock(), MagicMock()
+        docs.find_one.return_value = None  # no earlier edition of dcpr.pdf
+        with patch.object(ingest_pipeline, "iter_pages", return_value=iter([(1, "Clause 1: FSI 2.5")])), \
+             patch.object(parsing_agent, "PARSED_OUTPUT_DIR", str(tmp_path)), \
+             patch.object(classification_cache, "CLASSIFICATION_CACHE_PATH", "off"), \
+             patch.object(parsing_agent, "_docs_col", docs), \
+             patch.object(parsing_agent, "_rules_col", rules), \
+             patch.object(parsing_agent, "push_clause_diff") as diff:
+            parsed = parsing_agent.parse_pdf_to_json(str(pdf), "Mumbai", diff=True)
+        assert not diff.called and not rules.find.called
+        # same file name first, then any complete edition of the city
+        assert [c[0][0] for c in docs.find_one.call_args_list] == [
+            {"city": "Mumbai", "status": "complete", "filename": "dcpr.pdf"},
+            {"city": "Mumbai", "status": "complete"},
+        ]
+        assert rules.insert_many.call_count == 1 and docs.insert_one.call_count == 1
+        assert len(parsed["push_result"]["inserted_rules"]) == 1
+
+    def test_amendment_under_new_file_name_diffs_against_city_edition(self):
+        from agents import parsing_agent
+        baseline = {"_id": ObjectId(), "filename": "dcpr.pdf", "status": "complete"}
+        docs = MagicMock()
+        docs.find_one.side_effect = [None, baseline]
+        with patch.object(parsing_agent, "_docs_col", docs):
+            assert parsing_agent.previous_edition("Mumbai", "dcpr_amendment_2025.pdf") is baseline
+
+    def test_explicit_previous_by_id_or_file_name(self):
+        from agents import parsing_agent
+        oid = ObjectId()
+        docs = MagicMock()
+        docs.find_one.return_value = {"_id": oid, "filename": "dcpr.pdf"}
+        with patch.object(parsing_agent, "_docs_col", docs):
+            parsing_agent.previous_edition("Mumbai", "new.pdf", str(oid))
+            assert docs.find_one.call_args[0][0] == {"city": "Mumbai", "status": "complete", "_id": oid}
+            parsing_agent.previous_edition("Mumbai", "new.pdf", "dcpr.pdf")
+            assert docs.find_one.call_args[0][0] == {"city": "Mumbai", "status": "complete", "filename": "dcpr.pdf"}
+            docs.find_one.return_value = None
+            with pytest.raises(ValueError):
+                parsing_agent.previous_edition("Mumbai", "new.pdf", "missing.pdf")
+
+    def test_removed_rules_stay_within_the_edition(self):
+        from agents import parsing_agent
+        root, second = ObjectId(), ObjectId()
+        docs, rules = MagicMock(), MagicMock()
+        docs.find.return_value = [{"_id": root}, {"_id": second}]
+        rules.find.return_value = OLD[:1]
+        previous = {"_id": second, "lineage": str(root)}
+        with patch.object(parsing_agent, "_docs_col", docs), patch.object(parsing_agent, "_rules_col", rules):
+            existing = parsing_agent.load_ingested_rules("Mumbai", previous)
+            parsing_agent.push_clause_diff({"city": "Mumbai", "rules": []}, existing,
+                                           parsing_agent.edition_lineage(previous))
+
+        assert docs.find.call_args[0][0] == {"city": "Mumbai", "$or": [{"_id": root}, {"lineage": str(root)}]}
+        assert rules.find.call_args[0][0] == {"city": "Mumbai", "source_doc_id": {"$in": [str(root), str(second)]}}
+        delete = rules.bulk_write.call_args[0][0][0]
+        assert delete._filter == {"_id": OLD[0]["_id"], "source_doc_id": "doc-1"}
+        assert docs.insert_one.call_args[0][0]["lineage"] == str(root)
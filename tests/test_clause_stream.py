@@ -0,0 +1,121 @@
+"""
+Tests for streaming clause segmentation (utils/clause_stream.py)
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.clause_stream import iter_clauses, ClauseSegmenter
+
+
+class TestClauseMode:
+    """Clause / Section markers"""
+
+    def test_clause_carried_across_page_break(self):
+        pages = [
+            (1, "Preamble text\nClause 1.1: Max height 24 m\nfor residential"),
+            (2, "buildings in zone A\nSection 2 - FSI 2.5\n"),
+        ]
+        clauses = list(iter_clauses(pages))
+        assert clauses == [
+            {"clause_no": "1.1", "text": "Max height 24 m\nfor residential\nbuildings in zone A",
+             "page_start": 1, "page_end": 2},
+            {"clause_no": "2", "text": "FSI 2.5", "page_start": 2, "page_end": 2},
+        ]
+
+    def test_numbered_line_closes_clause(self):
+        pages = [(1, "Clause 3: Setback 3 m\n1. not part of clause 3\nstill outside\nClause 4: Parking")]
+        clauses = list(iter_clauses(pages))
+        assert [(c["clause_no"], c["text"]) for c in clauses] == [("3", "Setback 3 m"), ("4", "Parking")]
+
+    def test_clauses_are_yielded_as_they_complete(self):
+        segmenter = ClauseSegmenter()
+        assert list(segmenter.feed(1, "Clause 1: a\nb")) == []
+        done = list(segmenter.feed(2, "c\nClause 2: d"))
+        assert [c["clause_no"] for c in done] == ["1"]
+        assert [c["clause_no"] for c in segmenter.finish()] == ["2"]
+
+
+class TestFallbackModes:
+    """Numbered headings and paragraphs for documents without Clause markers"""
+
+    def test_numbered_headings(self):
+        pages = [(1, "12.3) Height limit 24 m\nwrapped line\n"), (2, "12.4: Setback 3 m")]
+        clauses = list(iter_clauses(pages))
+        assert [(c["clause_no"], c["text"], c["page_start"]) for c in clauses] == [
+            ("12.3", "Height limit 24 m", 1), ("12.4", "Setback 3 m", 2)]
+
+    def test_paragraphs_without_numbering(self):
+        long_para = "The maximum permissible height of any building shall not exceed"
+        pages = [(1, f"short one\n\n{long_para}\n"), (2, "twenty four metres.\n\ntiny")]
+        clauses = list(iter_clauses(pages))
+        assert len(clauses) == 1
+        assert clauses[0]["clause_no"] is None
+        assert clauses[0]["text"] == f"{long_para}\ntwenty four metres."
+        assert (clauses[0]["page_start"], clauses[0]["page_end"]) == (1, 2)
+
+
+class TestParityWithFindClauses:
+    """Same clauses as parsing_agent.find_clauses on the joined text"""
+
+    PREAMBLE = ("Government of Maharashtra, Urban Development Department, notification issued under the MRTP Act\n\n"
+                "1. Short title and commencement of these regulations\n"
+                "2) These regulations extend to the whole municipal area\n\n")
+
+    def _both(self, pages):
+        from agents.parsing_agent import find_clauses
+        streamed = [(c["clause_no"], c["text"]) for c in iter_clauses(pages)]
+        whole = [(c["clause_no"], c["text"]) for c in find_clauses("\n".join(t for _, t in pages) + "\n")]
+        return streamed, whole
+
+    def test_preamble_before_first_clause_is_dropped(self):
+        pages = [(1, self.PREAMBLE + "Clause 1: Max height 24 m\nfor residential"), (2, "Clause 2: FSI 2.5")]
+        streamed, whole = self._both(pages)
+        assert streamed == whole == [("1", "Max height 24 m\nfor residential"), ("2", "FSI 2.5")]
+
+    def test_preamble_paragraph_dropped_for_headings(self):
+        streamed, whole = self._both([(1, self.PREAMBLE), (2, "3. Height limit 24 m")])
+        assert streamed == whole
+        assert [no for no, _ in streamed] == ["1", "2", "3"]
+
+    def test_paragraphs_kept_without_any_numbering(self):
+        streamed, whole = self._both([(1, self.PREAMBLE.split("\n\n")[0] + "\n\nshort")])
+        assert streamed == whole and len(streamed) == 1 and streamed[0][0] is None
+
+
+class TestBoundedMemory:
+    """Oversized clauses are split and segmentation stays linear"""
+
+    def test_long_clause_split_into_continued_parts(self):
+        pages = [(1, "Clause 9: start\n" + "x" * 50 + "\n" + "y" * 50 + "\nend")]
+        parts = list(iter_clauses(pages, max_chars=40))
+        assert [p["clause_no"] for p in parts] == ["9", "9", "9"]
+        assert "continued" not in parts[0] and parts[1]["continued"] and parts[2]["continued"]
+        assert "".join(p["text"] for p in parts).replace("\n", "") == "start" + "x" * 50 + "y" * 50 + "end"
+
+    def test_markerless_document_is_linear(self):
+        # the DOTALL look-ahead regex is quadratic on this shape of input
+        pages = ((n, "Clause 1 text without end\n" + "word " * 200 + "\n") for n in range(1, 2001))
+        start = time.perf_counter()
+        count = sum(1 for _ in iter_clauses(pages))
+        assert count == 2000
+        assert time.perf_counter() - start < 5
+
+    def test_markerless_document_streams_past_hold_cap(self):
+        para = "The maximum permissible height of any building shall not exceed twenty four metres."
+        segmenter = ClauseSegmenter(hold_max_chars=3 * len(para))
+        assert list(segmenter.feed(1, f"{para}\n\n{para}\n\n")) == []  # still waiting for a marker
+        streamed = list(segmenter.feed(2, f"{para}\n\n{para}\n\n"))
+        # the third paragraph reaches the cap; the fourth is streamed as soon as it closes
+        assert [c["page_start"] for c in streamed] == [1, 1, 2, 2] and segmenter._held == []
+        # committed: later clauses are streamed as they complete and nothing is withdrawn
+        assert [c["text"] for c in segmenter.feed(3, f"{para}\n\n")] == [para]
+        assert [c["clause_no"] for c in segmenter.feed(4, "Clause 7: FSI 2.5\nClause 8: x")] == ["7"]
+        assert [c["clause_no"] for c in segmenter.finish()] == ["8"]
+
+    def test_hold_cap_zero_keeps_exact_parity(self):
+        para = "The maximum permissible height of any building shall not exceed twenty four metres."
+        pages = [(n, f"{para}\n\n") for n in range(1, 50)] + [(50, "Clause 1: Max height 24 m")]
+        assert [c["clause_no"] for c in iter_clauses(pages, hold_max_chars=0)] == ["1"]
@@ -0,0 +1,147 @@
+# tests/test_compliance_engine.py
+"""
+Tests for the vectorized compliance engine (parity with evaluator / calculator agents)
+"""
+import os
+import random
+import pytest
+import numpy as np
+from unittest.mock import patch
+
+# evaluator_agent builds its Mongo client at import time; no connection is made until first use
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+from agents import evaluator_agent
+from agents.calculator_agent import calculator_agent
+from utils.compliance_engine import (
+    compile_classified_rules,
+    compile_calculator_rules,
+    subjects_matrix,
+    subjects_from_columns,
+    evaluate_matrix,
+    evaluate_calculator_matrix,
+    results_for_row,
+    STATUS_NAMES,
+    OVERALL_NAMES,
+    CHECK_NONE,
+    CHECK_OK,
+)
+
+CATEGORY_SPELLINGS = ["height", "Building_Height", "fsi", "FAR", "setback", "floors", "storeys",
+                      "parking", "coverage", "site_coverage", "land_use", "other"]
+PARSED_KEYS = ["value", "height_m", "fsi", "setback_m", "floors", "max_height", "parking_required",
+               "coverage_percent", "allowed_fsi", "candidate_m"]
+
+
+def _random_rule(rng, idx):
+    parsed = {}
+    for key in rng.sample(PARSED_KEYS, rng.randint(0, 3)):
+        parsed[key] = rng.choice([round(rng.uniform(0.5, 40), 2), str(rng.randint(1, 30)), "n/a", None])
+    shape = rng.choice(["details", "parsed_fields", "parsed"])
+    return {
+        "_id": f"rule_{idx}",
+        "category": rng.choice(CATEGORY_SPELLINGS),
+        shape: parsed,
+        "original_text": f"Clause {idx}",
+    }
+
+
+def _random_project(rng, idx):
+    params = {}
+    for key in ["height_m", "fsi", "setback_m", "floors", "parking_spaces", "coverage_percent"]:
+        if rng.random() < 0.8:
+            params[key] = rng.choice([round(rng.uniform(0.5, 45), 2), str(rng.randint(1, 30))])
+    return {"_id": f"proj_{idx}", "city": "Mumbai", "project_name": f"P{idx}", "parameters": params}
+
+
+class TestClassifiedParity:
+    """Engine output must match evaluator_agent.evaluate_project exactly"""
+
+    @pytest.mark.parametrize("seed", [1, 7, 42])
+    def test_matches_evaluate_project(self, seed):
+        rng = random.Random(seed)
+        rules = [_random_rule(rng, i) for i in range(40)]
+        projects = [_random_project(rng, i) for i in range(60)]
+
+        ruleset = compile_classified_rules(rules)
+        subjects = subjects_matrix([p["parameters"] for p in projects])
+        result = evaluate_matrix(subjects, ruleset)
+
+        for i, project in enumerate(projects):
+            expected = evaluator_agent.evaluate_project(project, rules)
+            assert results_for_row(ruleset, subjects, result, i) == expected["results"]
+            assert result.overall_score[i] == expected["overall_score"]
+            assert OVERALL_NAMES[result.overall_status[i]] == expected["overall_status"]
+            assert result.applicable_count[i] == expected["applicable_rules_count"]
+
+    def test_partial_band(self):
+        rules = [{"_id": "r1", "category": "height", "details": {"value": 20}}]
+        subjects = subjects_matrix([{"height_m": 20}, {"height_m": 21.5}, {"height_m": 30}, {}])
+        result = evaluate_matrix(subjects, compile_classified_rules(rules))
+        assert [STATUS_NAMES[s] for s in result.statuses[:, 0]] == \
+            ["COMPLIANT", "PARTIAL", "NON_COMPLIANT", "NOT_APPLICABLE"]
+        assert list(result.overall_score) == [1.0, 0.5, 0.0, 0.0]
+
+    def test_subjects_from_columns(self):
+        cols = {"height_m": [10.0, 30.0], "fsi": [1.0, np.nan]}
+        subjects = subjects_from_columns(cols)
+        assert subjects.shape == (2, 6)
+        assert subjects[1, 0] == 30.0
+        assert np.isnan(subjects[1, 1])
+
+    def test_empty_ruleset(self):
+        result = evaluate_matrix(subjects_matrix([{"height_m": 10}]), compile_classified_rules([]))
+        assert result.statuses.shape == (1, 0)
+        assert list(result.overall_score) == [0.0]
+
+
+class TestCalculatorParity:
+    """Engine output must match calculator_agent checks"""
+
+    def _rules(self):
+        return [
+            {"id": "r1", "rule": {"clause_no": "A", "parsed_fields": {"height": {"op": "<=", "value_m": 24.0}}}},
+            {"id": "r2", "rule": {"clause_no": "B", "parsed_fields": {"height": {"op": ">", "value_m": 15.0}, "fsi": 2.0}}},
+            {"id": "r3", "rule": {"clause_no": "C", "parsed_fields": {"fsi": "bad"}}},
+            {"id": "r4", "clause_no": "D", "parsed": {"height": {"op": "~", "value_m": 10.0}, "fsi": "1.5"}},
+            {"id": "r5", "rule": {"clause_no": "E"}},
+        ]
+
+    @pytest.mark.parametrize("subject", [
+        {"height_m": 20, "fsi": 2.0},
+        {"height_m": 30, "fsi": 1.0},
+        {"height_m": 12},
+        {"fsi": 2.5},
+        {},
+    ])
+    @patch('agents.calculator_agent.log_geometry')
+    @patch('agents.calculator_agent.json_to_glb')
+    @patch('agents.calculator_agent.get_rules_for_city')
+    def test_matches_calculator_agent(self, mock_rules, mock_glb, mock_log, subject, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        rules = self._rules()
+        mock_rules.return_value = rules
+        expected = calculator_agent("Mumbai", subject)
+
+        ruleset = compile_calculator_rules(rules)
+        heights = np.array([subject.get("height_m", np.nan)], dtype=float)
+        fsis = np.array([subject.get("fsi", np.nan)], dtype=float)
+        out = evaluate_calculator_matrix(heights, fsis, ruleset)
+
+        decode = {CHECK_NONE: None, CHECK_OK: True, 0: False}
+        for j, outcome in enumerate(expected):
+            assert decode[out["height_ok"][0, j]] == outcome["checks"]["height"]["ok"]
+            assert decode[out["fsi_ok"][0, j]] == outcome["checks"]["fsi"]["ok"]
+
+
+def test_category_status_counts():
+    from utils.compliance_engine import category_status_counts
+    rules = [
+        {"_id": 1, "category": "height", "details": {"height_m": 24}},
+        {"_id": 2, "category": "Building_Height", "details": {"height_m": 20}},
+        {"_id": 3, "category": "land_use"},
+    ]
+    ruleset = compile_classified_rules(rules)
+    subjects = subjects_matrix([{"height_m": 21}, {}])
+    counts = category_status_counts(evaluate_matrix(subjects, ruleset), ruleset)
+    assert counts == {"height": {"COMPLIANT": 1, "PARTIAL": 1, "NON_COMPLIANT": 0, "NOT_APPLICABLE": 2}}
@@ -0,0 +1,88 @@
+# tests/test_envelope_solver.py
+"""
+Tests for the buildable-envelope solver
+"""
+import os
+import json
+import pytest
+from unittest.mock import patch
+
+from utils.envelope_solver import solve_envelope, Interval
+
+
+@pytest.fixture
+def city_rules():
+    """Sample rules from mcp_data/rules.json keyed by city"""
+    rules_file = os.path.join(os.path.dirname(__file__), "..", "mcp_data", "rules.json")
+    with open(rules_file, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class TestInterval:
+    """Test interval intersection"""
+    
+    def test_bounds_and_provenance(self):
+        iv = Interval()
+        iv.apply("<=", 24.0, "A")
+        iv.apply("<=", 21.0, "B")
+        iv.apply("<=", 21.0, "C")
+        iv.apply(">=", 3.0, "D")
+        assert iv.as_list() == [3.0, 21.0]
+        assert iv.hi_by == ["B", "C"]
+        assert iv.lo_by == ["D"]
+        assert not iv.empty
+    
+    def test_strict_integer_bound(self):
+        iv = Interval()
+        iv.apply("<", 7, "A", integer=True)
+        assert iv.hi == 6
+    
+    def test_conflict(self):
+        iv = Interval()
+        iv.apply("<=", 2.0, "A")
+        iv.apply(">=", 3.0, "B")
+        assert iv.empty
+
+
+class TestSolveEnvelope:
+    """Test envelope derivation from sample city rules"""
+    
+    def test_floors_and_height_bound(self, city_rules):
+        env = solve_envelope("Mumbai", 30, 20, "Residential", rules=city_rules["Mumbai"])
+        assert env["max_height_m"] == 24.0
+        assert env["max_floors"] == 7
+        assert env["max_built_up_sqm"] == 30 * 20 * 7
+        assert env["binding"]["height_m"]["max"] == ["DCPR 2034-12.3"]
+        assert env["feasible"] is True
+    
+    def test_fsi_bound_with_setbacks(self, city_rules):
+        env = solve_envelope("Nashik", 30, 20, "residential", rules=city_rules["Nashik"])
+        assert env["effective_setback_m"] == 3.0
+        assert env["footprint"]["area_sqm"] == 24 * 14
+        assert env["max_fsi"] == 1.8
+        assert env["max_built_up_sqm"] == pytest.approx(1080.0)
+        assert env["limited_by"] == "fsi"
+    
+    def test_guarded_rule_applies_to_small_plots(self, city_rules):
+        small = solve_envelope("Nashik", 10, 20, "residential", rules=city_rules["Nashik"])
+        large = solve_envelope("Nashik", 30, 20, "residential", rules=city_rules["Nashik"])
+        assert small["max_floors"] == 4
+        assert large["max_floors"] == 5
+    
+    def test_building_type_filter(self, city_rules):
+        env = solve_envelope("Ahmedabad", 30, 20, "commercial", rules=city_rules["Ahmedabad"])
+        assert env["intervals"]["fsi"] == [0.0, 2.0]
+        assert env["max_floors"] == 5
+    
+    def test_unbounded_floors_use_fsi(self):
+        rules = [{"id": "r1", "conditions": "FAR <= 2.0"}]
+        env = solve_envelope("X", 20, 10, rules=rules)
+        assert env["max_floors"] == 2
+        assert env["max_height_m"] == 6.0
+    
+    @patch('agents.agent_clients.get_rules_for_city')
+    def test_fetches_rules_once(self, mock_get_rules):
+        mock_get_rules.return_value = [{"city": "Pune", "conditions": "Height <= 21m", "rule_type": "Residential"}]
+        env = solve_envelope("Pune", 30, 20)
+        mock_get_rules.assert_called_once_with("Pune")
+        assert env["max_height_m"] == 21.0
@@ -0,0 +1,708 @@
+# tests/test_evaluator_agent.py
+"""
+Tests for batch evaluation in the evaluator agent (grouped rule loading, bulk writes)
+"""
+import os
+import pytest
+from unittest.mock import MagicMock, patch
+from pymongo.errors import BulkWriteError, AutoReconnect
+
+# evaluator_agent builds its Mongo client at import time; no connection is made until first use
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+from agents import evaluator_agent
+
+RULES = {
+    "Mumbai": [
+        {"_id": "m1", "category": "height", "details": {"height_m": 24}},
+        {"_id": "m2", "category": "fsi", "details": {"fsi": 2.0}},
+    ],
+    "Pune": [
+        {"_id": "p1", "category": "setback", "details": {"setback_m": 3}},
+    ],
+}
+
+
+def _project(pid, city, **params):
+    return {"_id": pid, "city": city, "project_name": pid, "status": "pending", "parameters": params}
+
+
+@pytest.fixture(autouse=True)
+def clear_evaluation_cache():
+    """Memoized outcomes must not leak between tests"""
+    evaluator_agent.EVAL_CACHE.clear()
+    yield
+    evaluator_agent.EVAL_CACHE.clear()
+
+
+@pytest.fixture
+def collections():
+    """Replace the module's Mongo collections with mocks"""
+    projects, classified, evals, rulesets = MagicMock(), MagicMock(), MagicMock(), MagicMock()
+    classified.find.side_effect = lambda q: list(RULES.get(q["city"], []))
+    with patch.object(evaluator_agent, "PROJECTS_COL", projects), \
+         patch.object(evaluator_agent, "CLASSIFIED_COL", classified), \
+         patch.object(evaluator_agent, "EVAL_COL", evals), \
+         patch.object(evaluator_agent, "RULESET_COL", rulesets):
+        yield projects, classified, evals
+
+
+class TestEvaluatePendingProjects:
+    """Test grouped, chunked evaluation of pending projects"""
+    
+    def test_rules_loaded_once_per_city(self, collections):
+        projects, classified, evals = collections
+        projects.find.return_value.limit.return_value = [
+            _project("a", "Mumbai", height_m=20), _project("b", "Pune", setback_m=2),
+            _project("c", "Mumbai", height_m=30), _project("d", "Mumbai", fsi=1.5),
+        ]
+        with patch.object(evaluator_agent, "ruleset_version", wraps=evaluator_agent.ruleset_version) as version:
+            out = evaluator_agent.evaluate_pending_projects(chunk_size=2)
+        
+        assert classified.find.call_count == 2
+        assert version.call_count == 2  # hashed once per city, not per chunk
+        assert evals.insert_many.call_count == 3  # Mumbai: 2 chunks, Pune: 1
+        assert projects.bulk_write.call_count == 3
+        assert sorted(d["project_key"] for d in out) == ["a", "b", "c", "d"]
+    
+    def test_matches_single_project_evaluation(self, collections):
+        projects, _, _ = collections
+        batch = [_project("a", "Mumbai", height_m=25, fsi="2.1"), _project("b", "Mumbai", floors=4)]
+        projects.find.return_value.limit.return_value = batch
+        out = evaluator_agent.evaluate_pending_projects()
+        
+        for doc, proj in zip(out, batch):
+            expected = evaluator_agent.evaluate_project(proj, RULES["Mumbai"])
+            for key in ("results", "applicable_rules_count", "overall_score", "overall_status", "project_name"):
+                assert doc[key] == expected[key]
+    
+    def test_failed_inserts_are_not_marked_evaluated(self, collections):
+        projects, _, evals = collections
+        projects.find.return_value.limit.return_value = [
+            _project("a", "Mumbai", height_m=20), _project("b", "Mumbai", height_m=21), _project("c", "Mumbai", height_m=22),
+        ]
+        evals.insert_many.side_effect = BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "duplicate key"}]})
+        out = evaluator_agent.evaluate_pending_projects()
+        
+        assert [d["project_key"] for d in out] == ["a", "c"]
+        ops = projects.bulk_write.call_args[0][0]
+        assert [op._filter["_id"] for op in ops] == ["a", "c"]
+    
+    def test_failing_chunk_does_not_stop_others(self, collections):
+        projects, _, evals = collections
+        projects.find.return_value.limit.return_value = [
+            _project("a", "Mumbai", height_m=20), _project("b", "Mumbai", height_m=21),
+        ]
+        evals.insert_many.side_effect = [AutoReconnect("lost connection"), None]
+        out = evaluator_agent.evaluate_pending_projects(chunk_size=1)
+        assert [d["project_key"] for d in out] == ["b"]
+    
+    def test_bad_project_is_isolated(self, collections):
+        projects, _, _ = collections
+        projects.find.return_value.limit.return_value = [
+            _project("a", "Mumbai", height_m=20),
+            {"_id": "bad", "city": "Mumbai", "parameters": "not-a-dict"},
+            _project("c", "Mumbai", height_m=22),
+        ]
+        out = evaluator_agent.evaluate_pending_projects()
+        assert [d["project_key"] for d in out] == ["a", "c"]
+
+
+class TestStreamingEvaluation:
+    """Test the cursor-driven, pooled evaluation mode"""
+    
+    def test_inline_streaming_batches(self, collections):
+        projects, classified, evals = collections
+        docs = [_project(str(i), "Mumbai" if i % 2 else "Pune", height_m=20) for i in range(7)]
+        projects.find.return_value = iter(docs)
+        stats = evaluator_agent.evaluate_pending_streaming(workers=1, batch_size=3)
+        
+        assert stats["evaluated_count"] == 7
+        assert stats["failed_count"] == 0
+        assert stats["batches"] == 3
+        assert classified.find.call_count == 2  # rules cached across batches
+        projects.find.assert_called_once_with({"status": "pending"}, batch_size=3)
+    
+    def test_limit_applied_to_cursor(self, collections):
+        projects, _, _ = collections
+        cursor = MagicMock()
+        cursor.limit.return_value = iter([_project("a", "Mumbai", height_m=20)])
+        projects.find.return_value = cursor
+        stats = evaluator_agent.evaluate_pending_streaming(limit=5, workers=1)
+        cursor.limit.assert_called_once_with(5)
+        assert stats["evaluated_count"] == 1
+    
+    def test_pool_path_collects_every_batch(self, collections):
+        """Runs the pool path on threads so the mocked collections are shared"""
+        from concurrent.futures import ThreadPoolExecutor
+        import threading
+        projects, _, _ = collections
+        projects.find.return_value = iter([_project(str(i), "Mumbai", height_m=20) for i in range(20)])
+        
+        lock, active, peak = threading.Lock(), [0], [0]
+        real_batch = evaluator_agent._evaluate_and_store_batch
+        
+        def tracked(batch):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            try:
+                return real_batch(batch)
+            finally:
+                with lock:
+                    active[0] -= 1
+        
+        with patch.object(evaluator_agent, "ProcessPoolExecutor", ThreadPoolExecutor), \
+             patch.object(evaluator_agent, "_init_worker", lambda: None), \
+             patch.object(evaluator_agent, "_evaluate_and_store_batch", tracked):
+            stats = evaluator_agent.evaluate_pending_streaming(workers=2, batch_size=2)
+        
+        assert stats["evaluated_count"] == 20
+        assert stats["batches"] == 10
+        assert peak[0] <= 2
+
+
+class TestLeaseQueue:
+    """Test the Mongo-backed work queue (claim, renew, fenced completion, release)"""
+    
+    def test_claim_until_queue_empty(self, collections):
+        projects, _, _ = collections
+        projects.find_one_and_update.side_effect = [_project("a", "Mumbai"), _project("b", "Mumbai"), None]
+        claimed = evaluator_agent.claim_projects("w1", batch_size=5, city="Mumbai", lease_seconds=60)
+        
+        assert [p["_id"] for p in claimed] == ["a", "b"]
+        assert projects.find_one_and_update.call_count == 3
+        query, update = projects.find_one_and_update.call_args[0]
+        assert query["city"] == "Mumbai"
+        assert {"status": "pending"} in query["$or"]
+        assert query["$or"][1]["status"] == "evaluating"  # expired leases are reclaimable
+        assert update["$set"]["status"] == "evaluating"
+        assert update["$set"]["lease_owner"] == "w1"
+    
+    def test_claim_respects_batch_size(self, collections):
+        projects, _, _ = collections
+        projects.find_one_and_update.return_value = _project("a", "Mumbai")
+        assert len(evaluator_agent.claim_projects("w1", batch_size=2)) == 2
+    
+    def test_heartbeat_renews_own_leases(self, collections):
+        projects, _, _ = collections
+        projects.update_many.return_value.matched_count = 2
+        heartbeat = evaluator_agent.LeaseHeartbeat("w1", ["a", "b"], lease_seconds=30)
+        heartbeat._stop = MagicMock()
+        heartbeat._stop.wait.side_effect = [False, True]  # one renewal tick, then stop
+        heartbeat._run()
+        
+        heartbeat._stop.wait.assert_called_with(10.0)
+        query = projects.update_many.call_args[0][0]
+        assert query == {"_id": {"$in": ["a", "b"]}, "status": "evaluating", "lease_owner": "w1"}
+    
+    def test_worker_completes_with_fenced_updates(self, collections):
+        projects, _, _ = collections
+        good = dict(_project("a", "Mumbai", height_m=20), evaluation_attempts=1)
+        bad = {"_id": "bad", "city": "Mumbai", "parameters": "not-a-dict", "evaluation_attempts": 3}
+        queue = [good, bad]
+        projects.find_one_and_update.side_effect = lambda *a, **k: queue.pop(0) if queue else None
+        projects.find.return_value = [{"_id": "a"}]  # lease still held at the pre-insert fence
+        projects.bulk_write.return_value.matched_count = 1
+        stats = evaluator_agent.run_queue_worker(batch_size=5, owner="w1")
+        
+        assert stats["evaluated_count"] == 1 and stats["failed_count"] == 1
+        op = projects.bulk_write.call_args[0][0][0]
+        assert op._filter == {"_id": "a", "status": "evaluating", "lease_owner": "w1"}
+        assert set(op._doc["$unset"]) == {"lease_owner", "lease_expires", "evaluation_attempts"}
+        # the bad project exhausted its attempts and is parked as failed
+        release_filter, release_update = projects.update_one.call_args[0]
+        assert release_filter["_id"] == "bad"
+        assert release_update["$set"]["status"] == "failed"
+    
+    def test_reclaimed_lease_skips_insert(self, collections):
+        projects, _, evals = collections
+        projects.find.return_value = [{"_id": "a"}]  # "b" was reclaimed by another worker
+        projects.bulk_write.return_value.matched_count = 1
+        docs = [{"project_id": "a"}, {"project_id": "b"}]
+        stored = evaluator_agent.store_evaluations(docs, lease_owner="w1", lease_seconds=30)
+        
+        assert [d["project_id"] for d in stored] == ["a"]
+        assert evals.insert_many.call_args[0][0] == [{"project_id": "a"}]
+        renew_query = projects.update_many.call_args[0][0]
+        assert renew_query == {"_id": {"$in": ["a", "b"]}, "status": "evaluating", "lease_owner": "w1"}
+    
+    def test_lease_lost_after_insert_deletes_evaluation(self, collections):
+        projects, _, evals = collections
+        # both leases held at the fence; "b" is reclaimed before the status update
+        projects.find.side_effect = [[{"_id": "a"}, {"_id": "b"}], [{"_id": "a"}]]
+        projects.bulk_write.return_value.matched_count = 1
+        docs = [{"_id": "ea", "project_id": "a"}, {"_id": "eb", "project_id": "b"}]
+        stored = evaluator_agent.store_evaluations(docs, lease_owner="w1")
+        
+        assert [d["project_id"] for d in stored] == ["a"]
+        evals.delete_many.assert_called_once_with({"_id": {"$in": ["eb"]}})
+        completed_query = projects.find.call_args[0][0]
+        assert completed_query["status"] == "evaluated" and "last_evaluated" in completed_query
+
+
+class TestCompiledRules:
+    """Test the precompiled rule records and category dispatch"""
+    
+    def test_compile_resolves_shapes(self):
+        compiled = evaluator_agent.compile_rules([
+            {"_id": 1, "category": "Building_Height", "parsed_fields": {"value": "24"}, "text": "max 24 m"},
+            {"_id": 2, "rule_type": "FAR", "details": {"allowed_fsi": 2.5}},
+            {"_id": 3, "category": "land_use", "summary": "residential zone"},
+        ])
+        assert [(r.rule_id, r.category_code, r.allowed) for r in compiled] == [
+            ("1", evaluator_agent.SUBJECT_FIELDS.index("height_m"), 24.0),
+            ("2", evaluator_agent.SUBJECT_FIELDS.index("fsi"), 2.5),
+            ("3", evaluator_agent.CAT_OTHER, None),
+        ]
+        assert compiled[0].rule_text == "max 24 m"
+        assert not hasattr(compiled[0], "__dict__")
+    
+    def test_dispatch_statuses(self):
+        rules = [
+            {"_id": "h", "category": "height", "details": {"height_m": 24}},
+            {"_id": "f", "category": "fsi", "details": {"fsi": 2.0}},
+            {"_id": "s", "category": "setback", "details": {}},
+            {"_id": "l", "category": "land_use"},
+        ]
+        project = _project("a", "Mumbai", height_m=25, fsi=1.5, setback_m=3)
+        doc = evaluator_agent.evaluate_project(project, rules)
+        
+        assert [r["status"] for r in doc["results"]] == ["PARTIAL", "COMPLIANT", "NOT_APPLICABLE", "INFORMATIONAL"]
+        assert doc["results"][2]["proposed"] == 3.0 and doc["results"][2]["allowed"] is None
+        assert doc["results"][3]["proposed"] is None
+        assert doc["applicable_rules_count"] == 2
+        assert doc["overall_score"] == 0.75
+    
+    def test_precompiled_rules_reused(self):
+        rules = [{"_id": "h", "category": "height", "details": {"height_m": 24}}]
+        compiled = evaluator_agent.compile_rules(rules)
+        with patch.object(evaluator_agent, "compile_rules") as spy:
+            doc = evaluator_agent.evaluate_project(_project("a", "Mumbai", height_m=20), rules, compiled)
+        spy.assert_not_called()
+        assert doc["overall_status"] == "COMPLIANT"
+
+
+class TestIncrementalReevaluation:
+    """Test rule-set versioning and patching of stale evaluations"""
+    
+    def test_evaluation_records_rule_set(self):
+        doc = evaluator_agent.evaluate_project(_project("a", "Mumbai", height_m=20), RULES["Mumbai"])
+        compiled = evaluator_agent.compile_rules(RULES["Mumbai"])
+        assert doc["rule_ids"] == ["m1", "m2"]
+        assert doc["ruleset_version"] == evaluator_agent.ruleset_version(compiled)
+        assert evaluator_agent.ruleset_version(list(reversed(compiled))) == doc["ruleset_version"]
+    
+    def test_diff_rulesets(self):
+        old = [evaluator_agent.rule_signature(r) for r in evaluator_agent.compile_rules(RULES["Mumbai"])]
+        new_rules = [
+            {"_id": "m1", "category": "height", "details": {"height_m": 30}},
+            {"_id": "m3", "category": "parking", "details": {"value": 2}},
+        ]
+        diff = evaluator_agent.diff_rulesets(old, evaluator_agent.compile_rules(new_rules))
+        assert diff == {"added": ["m3"], "removed": ["m2"], "changed": ["m1"],
+                        "categories": ["fsi", "height", "parking"]}
+    
+    def test_reevaluate_patches_only_stale_results(self, collections):
+        _, classified, evals = collections
+        old_doc = evaluator_agent.evaluate_project(_project("a", "Mumbai", height_m=28, fsi=1.5), RULES["Mumbai"])
+        old_doc["_id"] = "eval-a"
+        snapshot = [evaluator_agent.rule_signature(r) for r in evaluator_agent.compile_rules(RULES["Mumbai"])]
+        evaluator_agent.RULESET_COL.find_one.return_value = {"rules": snapshot}
+        
+        new_rules = [
+            {"_id": "m1", "category": "height", "details": {"height_m": 30}},  # relaxed
+            {"_id": "m2", "category": "fsi", "details": {"fsi": 2.0}},
+        ]
+        classified.find.side_effect = lambda q: list(new_rules)
+        evals.find.return_value = [old_doc]
+        evals.bulk_write.return_value.modified_count = 1
+        
+        stats = evaluator_agent.reevaluate_affected(city="Mumbai")
+        
+        query = evals.find.call_args[0][0]
+        assert query == {"city": "Mumbai", "ruleset_version": {"$ne": stats["cities"]["Mumbai"]["ruleset_version"]}}
+        op = evals.bulk_write.call_args[0][0][0]
+        patch_doc = op._doc["$set"]
+        assert op._filter == {"_id": "eval-a"}
+        assert patch_doc["results"][0]["status"] == "COMPLIANT"
+        assert patch_doc["results"][1] is old_doc["results"][1]  # untouched rule kept as is
+        assert patch_doc["overall_status"] == "COMPLIANT"
+        assert stats["patched_count"] == 1
+        assert stats["cities"]["Mumbai"]["categories"] == ["height"]
+    
+    def test_missing_snapshot_recomputes_everything(self, collections):
+        _, _, evals = collections
+        legacy = {"_id": "e1", "parameters": {"height_m": 20}, "results": []}
+        evals.find.return_value = [legacy]
+        evaluator_agent.RULESET_COL.find_one.return_value = None
+        evaluator_agent.reevaluate_affected(city="Mumbai")
+        
+        patch_doc = evals.bulk_write.call_args[0][0][0]._doc["$set"]
+        assert [r["rule_id"] for r in patch_doc["results"]] == ["m1", "m2"]
+        assert patch_doc["results"][0]["status"] == "COMPLIANT"
+
+
+class FakeChangeStream:
+    """Minimal stand-in for a pymongo ChangeStream"""
+    
+    def __init__(self, changes, on_exhausted):
+        self.changes = list(changes)
+        self.on_exhausted = on_exhausted
+        self.resume_token = {"_data": "0"}
+    
+    def try_next(self):
+        if not self.changes:
+            self.on_exhausted()
+            return None
+        change = self.changes.pop(0)
+        self.resume_token = {"_data": str(change["_id"])}
+        return change
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+
+class TestEvaluatorDaemon:
+    """Test the long-running daemon (checkpointing, polling fallback, change streams)"""
+    
+    def test_checkpoint_round_trip(self, tmp_path):
+        from datetime import datetime
+        from bson import ObjectId
+        path = str(tmp_path / "ckpt.json")
+        ckpt = evaluator_agent.DaemonCheckpoint(path)
+        assert ckpt.resume_token is None and ckpt.high_water is None
+        
+        oid = ObjectId()
+        ckpt.high_water = (datetime(2025, 10, 1, 12, 0), oid)
+        ckpt.resume_token = {"_data": "abc"}
+        ckpt.retry_ids = [oid]
+        ckpt.save()
+        
+        again = evaluator_agent.DaemonCheckpoint(path)
+        assert again.high_water == (datetime(2025, 10, 1, 12, 0), oid)
+        assert again.resume_token == {"_data": "abc"}
+        assert again.retry_ids == [oid]
+    
+    def test_poll_advances_high_water_mark(self, collections, tmp_path):
+        projects, _, evals = collections
+        batch = [dict(_project("a", "Mumbai", height_m=20), updated_at="2025-10-01T00:00:01Z"),
+                 dict(_project("b", "Mumbai", height_m=20), updated_at="2025-10-01T00:00:02Z")]
+        projects.find.return_value.sort.return_value.limit.return_value = batch
+        daemon = evaluator_agent.EvaluatorDaemon(batch_size=10, checkpoint_path=str(tmp_path / "ckpt.json"))
+        
+        assert daemon.poll_once() == 2
+        assert daemon.checkpoint.high_water == ("2025-10-01T00:00:02Z", "b")
+        assert evaluator_agent.DaemonCheckpoint(str(tmp_path / "ckpt.json")).high_water == ("2025-10-01T00:00:02Z", "b")
+        
+        projects.find.return_value.sort.return_value.limit.return_value = []
+        assert daemon.poll_once() == 0
+        query = projects.find.call_args[0][0]
+        assert query["$or"] == [{"updated_at": {"$gt": "2025-10-01T00:00:02Z"}},
+                                {"updated_at": "2025-10-01T00:00:02Z", "_id": {"$gt": "b"}}]
+    
+    def test_failed_evaluation_holds_high_water_mark(self, collections, tmp_path):
+        projects, _, evals = collections
+        batch = [dict(_project("a", "Mumbai", height_m=20), updated_at="2025-10-01T00:00:01Z"),
+                 dict(_project("b", "Mumbai", height_m=20), updated_at="2025-10-01T00:00:02Z"),
+                 dict(_project("c", "Mumbai", height_m=20), updated_at="2025-10-01T00:00:03Z")]
+        projects.find.return_value.sort.return_value.limit.return_value = batch
+        evals.insert_many.side_effect = BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "boom"}]})
+        daemon = evaluator_agent.EvaluatorDaemon(batch_size=3, checkpoint_path=str(tmp_path / "ckpt.json"))
+        
+        assert daemon.poll_once() == 1  # stops in front of "b" so it is read again
+        assert daemon.checkpoint.high_water == ("2025-10-01T00:00:01Z", "a")
+        assert daemon.stats["evaluated_count"] == 2 and daemon.stats["failed_count"] == 1
+    
+    def test_idle_stream_checkpoint_is_throttled(self, collections, tmp_path):
+        projects, _, _ = collections
+        projects.find.return_value.sort.return_value.limit.return_value = []
+        daemon = evaluator_agent.EvaluatorDaemon(checkpoint_path=str(tmp_path / "ckpt.json"),
+                                                 checkpoint_interval=3600)
+        stream = FakeChangeStream([], daemon.stop)
+        polls = iter(range(1, 6))
+        
+        def idle_get_more():
+            n = next(polls, None)
+            if n is None:
+                daemon.stop()
+            else:
+                stream.resume_token = {"_data": f"idle-{n}"}  # postBatchResumeToken moves while idle
+            return None
+        
+        stream.try_next = idle_get_more
+        projects.watch.return_value = stream
+        with patch.object(evaluator_agent.DaemonCheckpoint, "save", autospec=True) as save:
+            daemon.run()
+        assert save.call_count == 1  # only the final position on stop
+        assert daemon.checkpoint.resume_token == {"_data": "idle-5"}
+    
+    def test_falls_back_to_polling(self, collections, tmp_path):
+        from pymongo.errors import OperationFailure
+        projects, _, _ = collections
+        projects.watch.side_effect = OperationFailure("The $changeStream stage is only supported on replica sets")
+        projects.find.return_value.sort.return_value.limit.return_value = []
+        daemon = evaluator_agent.EvaluatorDaemon(checkpoint_path=str(tmp_path / "ckpt.json"), poll_interval=0)
+        
+        with patch.object(daemon.stop_event, "wait", side_effect=lambda t: daemon.stop()):
+            stats = daemon.run()
+        assert stats["mode"] == "polling"
+    
+    def test_change_stream_micro_batches(self, collections, tmp_path):
+        projects, _, evals = collections
+        projects.find.return_value.sort.return_value.limit.return_value = []  # nothing to catch up
+        changes = [
+            {"_id": 1, "fullDocument": _project("a", "Mumbai", height_m=20)},
+            {"_id": 2, "fullDocument": _project("a", "Mumbai", height_m=21)},  # same project updated again
+            {"_id": 3, "fullDocument": _project("b", "Mumbai", height_m=30)},
+            {"_id": 4, "fullDocument": _project("c", "Pune", setback_m=4)},
+        ]
+        daemon = evaluator_agent.EvaluatorDaemon(batch_size=2, max_wait=60,
+                                                 checkpoint_path=str(tmp_path / "ckpt.json"))
+        projects.watch.return_value = FakeChangeStream(changes, daemon.stop)
+        stats = daemon.run()
+        
+        assert stats["mode"] == "change_stream"
+        assert stats["evaluated_count"] == 3 and stats["batches"] == 2  # [a, b], then [c] flushed on stop
+        assert evals.insert_many.call_args_list[0][0][0][0]["parameters"] == {"height_m": 21}
+        assert evaluator_agent.DaemonCheckpoint(str(tmp_path / "ckpt.json")).resume_token == {"_data": "4"}
+    
+    def test_change_stream_failures_are_retried(self, collections, tmp_path):
+        projects, _, evals = collections
+        projects.find.return_value.sort.return_value.limit.return_value = []  # nothing to catch up
+        changes = [
+            {"_id": 1, "fullDocument": _project("a", "Mumbai", height_m=20)},
+            {"_id": 2, "fullDocument": _project("b", "Mumbai", height_m=30)},
+            {"_id": 3, "fullDocument": _project("c", "Mumbai", height_m=22)},
+        ]
+        evals.insert_many.side_effect = [BulkWriteError({"writeErrors": [{"index": 1, "errmsg": "boom"}]}), None]
+        retried = []
+        
+        def find(query, *args):
+            if "$in" in query.get("_id", {}):
+                retried.append(query)
+                return [_project("b", "Mumbai", height_m=30)]
+            return projects.find.return_value
+        
+        projects.find.side_effect = find
+        path = str(tmp_path / "ckpt.json")
+        daemon = evaluator_agent.EvaluatorDaemon(batch_size=2, max_wait=60, checkpoint_path=path)
+        stream = FakeChangeStream(changes, daemon.stop)
+        saved = []
+        
+        def spy_save(ckpt):
+            saved.append((dict(ckpt.resume_token), list(ckpt.retry_ids)))
+        
+        projects.watch.return_value = stream
+        with patch.object(evaluator_agent.DaemonCheckpoint, "save", autospec=True, side_effect=spy_save):
+            stats = daemon.run()
+        
+        # "b" failed in the first flush: the token moved on but "b" was saved for retry ...
+        assert saved[0] == ({"_data": "2"}, ["b"])
+        # ... and re-queried (only while still pending) with the final flush of "c"
+        assert retried == [{"_id": {"$in": ["b"]}, "status": "pending"}]
+        assert [d["project_id"] for d in evals.insert_many.call_args[0][0]] == ["c", "b"]
+        assert saved[-1] == ({"_data": "3"}, [])
+        assert stats["evaluated_count"] == 3
+
+
+class TestEvaluationMemoization:
+    """Test memoized evaluations keyed by input fingerprint"""
+    
+    def test_identical_inputs_hit_cache(self):
+        first = evaluator_agent.evaluate_project(_project("a", "Mumbai", height_m=20, fsi=1.5), RULES["Mumbai"])
+        
+        def boom(rule, proposed):
+            raise AssertionError("rules must not be iterated on a cache hit")
+        with patch.dict(evaluator_agent.RULE_HANDLERS, {code: boom for code in evaluator_agent.RULE_HANDLERS}):
+            # same normalized values, different spelling and project
+            second = evaluator_agent.evaluate_project(_project("b", "Mumbai", height_m="20", fsi=1.5), RULES["Mumbai"])
+        
+        assert second["project_key"] == "b"
+        assert second["results"] == first["results"]
+        assert second["results"][0] is not first["results"][0]
+        assert evaluator_agent.EVAL_CACHE.stats()["hits"] == 1
+    
+    def test_rule_set_change_misses(self):
+        evaluator_agent.evaluate_project(_project("a", "Mumbai", height_m=20), RULES["Mumbai"])
+        changed = [{"_id": "m1", "category": "height", "details": {"height_m": 19}}]
+        doc = evaluator_agent.evaluate_project(_project("a", "Mumbai", height_m=20), changed)
+        assert doc["results"][0]["status"] == "PARTIAL"
+        assert evaluator_agent.EVAL_CACHE.stats()["hits"] == 0
+    
+    def test_batch_evaluates_distinct_inputs_once(self):
+        batch = [_project(str(i), "Mumbai", height_m=20 + (i % 2)) for i in range(6)]
+        with patch.object(evaluator_agent, "evaluate_matrix", wraps=evaluator_agent.evaluate_matrix) as spy:
+            docs = evaluator_agent.evaluate_projects_batch(batch, RULES["Mumbai"])
+            assert spy.call_args[0][0].shape[0] == 2
+            evaluator_agent.evaluate_projects_batch(batch[:2], RULES["Mumbai"])
+            assert spy.call_count == 1  # second batch fully served from cache
+        assert [d["project_key"] for d in docs] == [str(i) for i in range(6)]
+        assert docs[2]["results"] == docs[0]["results"]
+    
+    def test_persistent_cache_collection(self):
+        from utils.evaluation_cache import EvaluationCache
+        col = MagicMock()
+        col.find_one.return_value = {"_id": "k", "value": {"overall_status": "COMPLIANT"}}
+        cache = EvaluationCache(maxsize=8, collection=col)
+        
+        assert cache.get("k") == {"overall_status": "COMPLIANT"}
+        assert cache.get("k") == {"overall_status": "COMPLIANT"}
+        col.find_one.assert_called_once_with({"_id": "k"})  # second read from the LRU
+        
+        cache.put("k2", {"overall_status": "NON_COMPLIANT"}, city="Pune")
+        query, update = col.update_one.call_args[0]
+        assert query == {"_id": "k2"} and update["$setOnInsert"]["city"] == "Pune"
+        assert col.update_one.call_args[1]["upsert"] is True
+    
+    def test_fingerprint_includes_tolerance(self):
+        from utils.evaluation_cache import evaluation_fingerprint
+        proposed = {"height_m": 20.0}
+        assert evaluation_fingerprint("Mumbai", proposed, "v1") == evaluation_fingerprint("Mumbai", proposed, "v1")
+        assert evaluation_fingerprint("Mumbai", proposed, "v1", tolerance=1.10) != \
+            evaluation_fingerprint("Mumbai", proposed, "v1", tolerance=1.05)
+    
+    def test_cache_bounded_by_size(self):
+        from utils.evaluation_cache import EvaluationCache
+        cache = EvaluationCache(maxsize=100, max_bytes=200)
+        for i in range(10):
+            cache.put(f"k{i}", {"results": [{"rule_text": "x" * 40}], "n": i})
+        
+        assert cache.stats()["bytes"] <= 200
+        assert cache.get("k9") is not None and cache.get("k0") is None
+        cache.put("huge", {"rule_text": "x" * 500})  # larger than the whole cache: not kept
+        assert cache.get("huge") is None and cache.get("k9") is not None
+    
+    def test_get_many_and_put_many_batch_mongo_round_trips(self):
+        from utils.evaluation_cache import EvaluationCache
+        col = MagicMock()
+        col.find.return_value = [{"_id": "b", "value": {"overall_status": "COMPLIANT"}}]
+        cache = EvaluationCache(maxsize=8, collection=col)
+        cache.put_many([("a", {"overall_status": "PARTIALLY_COMPLIANT"}, {"city": "Pune"})])
+        
+        found = cache.get_many(["a", "b", "c", "a"])
+        assert found == {"a": {"overall_status": "PARTIALLY_COMPLIANT"}, "b": {"overall_status": "COMPLIANT"}}
+        col.find.assert_called_once_with({"_id": {"$in": ["b", "c"]}})  # "a" came from the LRU
+        col.find_one.assert_not_called()
+        op = col.bulk_write.call_args[0][0][0]
+        assert op._filter == {"_id": "a"} and op._upsert is True
+        assert col.bulk_write.call_args[1]["ordered"] is False
+        assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+    
+    def test_batch_uses_one_cache_lookup(self):
+        batch = [_project(str(i), "Mumbai", height_m=20 + i) for i in range(5)]
+        with patch.object(evaluator_agent.EVAL_CACHE, "get", side_effect=AssertionError("per-project lookup")), \
+             patch.object(evaluator_agent.EVAL_CACHE, "get_many", wraps=evaluator_agent.EVAL_CACHE.get_many) as get_many:
+            evaluator_agent.evaluate_projects_batch(batch, RULES["Mumbai"])
+        get_many.assert_called_once()
+        assert len(get_many.call_args[0][0]) == 5
+
+
+class TestComplianceReport:
+    """Test the columnar city / category compliance report"""
+    
+    def test_frame_normalises_like_proposed_values(self, collections):
+        projects, _, _ = collections
+        projects.find.return_value = [
+            {"city": "Mumbai", "parameters": {"height_m": " 21.5 ", "fsi": 2, "parking_spaces": 0, "parking": 4}},
+            {"city": "Pune", "parameters": "not-a-dict"},
+            {"city": "Pune", "parameters": {"coverage_percent": "n/a", "floors": 3}},
+        ]
+        frame = evaluator_agent.load_projects_frame()
+        for i, doc in enumerate(projects.find.return_value):
+            params = doc["parameters"] if isinstance(doc["parameters"], dict) else {}
+            expected = evaluator_agent.proposed_values(params)
+            for field in evaluator_agent.SUBJECT_FIELDS:
+                value = frame.loc[i, field]
+                assert (value != value and expected[field] is None) or value == expected[field]
+    
+    def test_rates_match_per_project_evaluation(self, collections):
+        projects, _, _ = collections
+        docs = [
+            _project("a", "Mumbai", height_m=20, fsi=1.5),
+            _project("b", "Mumbai", height_m=25, fsi=2.5),
+            _project("c", "Mumbai", height_m=30),
+            _project("d", "Pune", setback_m=2),
+        ]
+        projects.find.return_value = docs
+        report = evaluator_agent.build_compliance_report()
+        
+        mumbai = report["cities"]["Mumbai"]
+        assert mumbai["projects"] == 3
+        assert mumbai["categories"]["height"] == {
+            "COMPLIANT": 1, "PARTIAL": 1, "NON_COMPLIANT": 1, "NOT_APPLICABLE": 0,
+            "checked": 3, "pass_rate": 0.3333, "partial_rate": 0.3333, "fail_rate": 0.3333,
+        }
+        assert mumbai["categories"]["fsi"]["NOT_APPLICABLE"] == 1
+        expected_overall = {}
+        for doc in docs[:3]:
+            status = evaluator_agent.evaluate_project(doc, RULES["Mumbai"])["overall_status"]
+            expected_overall[status] = expected_overall.get(status, 0) + 1
+        assert {k: v for k, v in mumbai["overall"].items() if v} == expected_overall
+        assert report["cities"]["Pune"]["categories"]["setback"]["pass_rate"] == 1.0
+    
+    def test_write_report(self, collections, tmp_path):
+        projects, _, _ = collections
+        projects.find.return_value = [_project("a", "Mumbai", height_m=20)]
+        report = evaluator_agent.build_compliance_report(city="Mumbai")
+        json_path, csv_path = evaluator_agent.write_compliance_report(report, str(tmp_path))
+        
+        assert projects.find.call_args[0][0] == {"city": "Mumbai"}
+        assert os.path.exists(json_path)
+        with open(csv_path, encoding="utf-8") as f:
+            assert f.readline().startswith("city,category,COMPLIANT")
+
+
+class TestInstrumentation:
+    """Test optional phase timings and comparison counts"""
+    
+    def test_profile_summary_and_trace(self, collections, tmp_path):
+        projects, _, _ = collections
+        projects.find.return_value.limit.return_value = [
+            _project("a", "Mumbai", height_m=20), _project("b", "Mumbai", height_m=20),
+            _project("c", "Mumbai", height_m=30), _project("d", "Pune", setback_m=2),
+        ]
+        trace = tmp_path / "trace.json"
+        evaluator_agent.evaluate_pending_projects(profile=True, trace_path=str(trace))
+        summary = evaluator_agent.LAST_PROFILE
+        
+        assert set(summary["phases"]) == {"load_projects", "load_rules", "evaluate", "write"}
+        assert summary["phases"]["load_rules"]["calls"] == 2
+        # Mumbai: a and b share inputs -> 2 distinct x (1 height + 1 fsi rule); Pune: 1 x 1 setback rule
+        assert summary["counters"] == {"cache_hits": 0, "comparisons.fsi": 2,
+                                       "comparisons.height": 2, "comparisons.setback": 1}
+        assert summary["stored"] == 4
+        
+        import json
+        with open(trace, encoding="utf-8") as f:
+            events = json.load(f)["traceEvents"]
+        assert {e["name"] for e in events} == {"load_projects", "load_rules", "evaluate", "write"}
+        assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+    
+    def test_disabled_by_default(self, collections):
+        from utils.profiling import make_profiler, NULL_PROFILER
+        projects, _, _ = collections
+        projects.find.return_value.limit.return_value = [_project("a", "Mumbai", height_m=20)]
+        evaluator_agent.LAST_PROFILE.clear()
+        
+        with patch.object(evaluator_agent, "make_profiler", wraps=make_profiler) as spy:
+            evaluator_agent.evaluate_pending_projects()
+        spy.assert_called_once_with(enabled=False, trace=False)
+        assert make_profiler(enabled=False, trace=False) is NULL_PROFILER
+        assert evaluator_agent.LAST_PROFILE == {}
+    
+    def test_streaming_profile_runs_in_process(self, collections):
+        projects, _, _ = collections
+        projects.find.return_value = iter([_project(str(i), "Mumbai", height_m=20 + i) for i in range(5)])
+        with patch.object(evaluator_agent, "ProcessPoolExecutor") as pool:
+            stats = evaluator_agent.evaluate_pending_streaming(workers=4, batch_size=2, profile=True)
+        summary = evaluator_agent.LAST_PROFILE
+        
+        assert not pool.called and stats["evaluated_count"] == 5
+        assert set(summary["phases"]) == {"load_projects", "load_rules", "evaluate", "write"}
+        assert summary["phases"]["load_rules"]["calls"] == 1  # cached after the first batch
+        assert summary["phases"]["evaluate"]["calls"] == 3
+        assert summary["counters"]["comparisons.height"] == 5 and summary["stored"] == 5
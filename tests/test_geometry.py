@@ -278,3 +278,45 @@ class TestGLBFileValidation:
         file_size = os.path.getsize(glb_path)
         # GLB should be between 1KB and 10MB
         assert 1000 < file_size < 10_000_000
+
+
+class TestGeometryJobs:
+    """Test background geometry generation"""
+    
+    def test_job_completes_in_background(self, sample_spec, tmp_path, monkeypatch):
+        """Test a submitted job reaches 'done' and writes the GLB"""
+        from utils import geometry_jobs
+        monkeypatch.setenv("MCP_BASE_URL", "http://127.0.0.1:9/api/mcp")  # log_geometry fails fast
+        
+        job_id = geometry_jobs.submit_geometry_job("bg_case", sample_spec, output_dir=str(tmp_path))
+        assert geometry_jobs.job_status(job_id)["state"] in ("pending", "running", "done")
+        
+        status = geometry_jobs.wait_for_jobs([job_id], timeout=60)[0]
+        assert status["state"] == "done"
+        assert status["case_id"] == "bg_case"
+        assert os.path.exists(status["path"])
+        geometry_jobs.shutdown()
+    
+    def test_unknown_job(self):
+        """Test polling an id that was never submitted"""
+        from utils.geometry_jobs import job_status
+        assert job_status("does-not-exist")["state"] == "unknown"
+
+    def test_finished_jobs_are_released(self):
+        """Test forget_jobs and TTL pruning keep the job registry bounded"""
+        from concurrent.futures import Future
+        from utils import geometry_jobs
+        
+        for job_id in ("old", "fresh", "running"):
+            future = Future()
+            geometry_jobs._jobs[job_id] = {"job_id": job_id, "case_id": job_id, "future": future}
+            if job_id != "running":
+                future.set_result(f"{job_id}.glb")
+                geometry_jobs._log_done(job_id, job_id, future)
+        geometry_jobs._jobs["old"]["finished_at"] -= 7200
+        
+        assert geometry_jobs.prune_finished_jobs(ttl=3600) == 1
+        assert geometry_jobs.job_status("old")["state"] == "unknown"
+        assert geometry_jobs.job_status("fresh")["state"] == "done"
+        geometry_jobs.forget_jobs(["fresh", "running"])
+        assert "fresh" not in geometry_jobs._jobs and "running" not in geometry_jobs._jobs
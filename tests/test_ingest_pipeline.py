@@ -0,0 +1,191 @@
+"""
+Tests for the staged ingestion pipeline (utils/ingest_pipeline.py)
+"""
+import os
+import sys
+import time
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import ingest_pipeline
+from utils.ingest_pipeline import Pipeline, Stage, ingest, ingest_pdf
+
+PAGES = {
+    "a.pdf": [(1, "Clause 1: Max height 24 m\nfor residential"), (2, "Clause 2: FSI 2.5\nClause 3: Setback 3 m")],
+    "b.pdf": [(1, "Clause 7: Parking 1 per unit")],
+}
+
+
+def _fake_iter_pages(pdf_path, workers=None, sha256=None):
+    name = os.path.basename(pdf_path)
+    if name == "truncated.pdf":
+        yield from PAGES["a.pdf"]
+        raise RuntimeError("page 3 is corrupt")
+    if name not in PAGES:
+        raise RuntimeError("No PDF backend available")
+    yield from PAGES[name]
+
+
+def _classify(text):
+    return ("fsi", {"fsi": 2.5}) if "FSI" in text else ("other", {})
+
+
+@pytest.fixture
+def pdfs(tmp_path):
+    paths = {}
+    for name in list(PAGES) + ["broken.pdf", "truncated.pdf"]:
+        path = tmp_path / name
+        path.write_bytes(b"%PDF")
+        paths[name] = str(path)
+    return paths
+
+
+@pytest.fixture
+def fake_pages():
+    with patch.object(ingest_pipeline, "iter_pages", side_effect=_fake_iter_pages):
+        yield
+
+
+class TestPipeline:
+    """Bounded queues, ordering and per-stage counters"""
+
+    def test_stages_run_concurrently_with_backpressure(self):
+        def produce(n, emit, count):
+            for i in range(3):
+                emit((n, i))
+
+        def slow_sink(item, emit, count):
+            time.sleep(0.005)
+            count("written")
+            emit(item)
+
+        pipeline = Pipeline([Stage("produce", produce), Stage("sink", slow_sink, workers=2)], queue_size=1)
+        out = pipeline.run(range(5))
+        assert sorted(out) == [(n, i) for n in range(5) for i in range(3)]
+        stats = pipeline.stats()["stages"]
+        assert stats["produce"]["items"] == 5 and stats["produce"]["emitted"] == 15
+        assert stats["sink"]["written"] == 15 and stats["sink"]["workers"] == 2
+        assert stats["produce"]["blocked_s"] > 0
+
+    def test_stage_exception_is_counted_not_fatal(self):
+        def flaky(item, emit, count):
+            if item == 2:
+                raise ValueError("boom")
+            emit(item)
+
+        pipeline = Pipeline([Stage("flaky", flaky)])
+        assert pipeline.run(range(4)) == [0, 1, 3]
+        assert pipeline.stats()["stages"]["flaky"]["errors"] == 1
+
+
+class TestIngest:
+    """extract -> segment -> push over several files"""
+
+    def test_results_in_input_order_with_provenance(self, pdfs, fake_pages, tmp_path):
+        run = ingest([("Mumbai", pdfs["a.pdf"]), ("Pune", pdfs["broken.pdf"]), ("Pune", pdfs["b.pdf"])],
+                     push=False, output_dir=str(tmp_path / "out"), classify=_classify, batch_size=1)
+        a, broken, b = run["results"]
+        assert [r["clause_no"] for r in a["parsed"]["rules"]] == ["1", "2", "3"]
+        assert a["parsed"]["rules"][0]["text"] == "Max height 24 m\nfor residential"
+        assert (a["parsed"]["rules"][1]["page_start"], a["parsed"]["rules"][1]["rule_type"]) == (2, "fsi")
+        assert b["parsed"]["rules"][0]["id"] == "pune_r_1"
+        assert broken["parsed"] is None and broken["errors"][0]["stage"] == "extract"
+        assert len(list((tmp_path / "out").glob("*.json"))) == 2
+        stages = run["stats"]["stages"]
+        assert stages["extract"]["pages"] == 3 and stages["segment"]["clauses"] == 4
+
+    def test_rule_batches_and_document_record(self, pdfs, fake_pages, tmp_path):
+        from agents import parsing_agent
+        docs, rules = MagicMock(), MagicMock()
+        with patch.object(parsing_agent, "_docs_col", docs), patch.object(parsing_agent, "_rules_col", rules):
+            run = ingest([("Mumbai", pdfs["a.pdf"])], output_dir=str(tmp_path), classify=_classify, batch_size=2)
+
+        batches = [c[0][0] for c in rules.insert_many.call_args_list]
+        assert sorted(len(b) for b in batches) == [1, 2]
+        record = docs.insert_one.call_args[0][0]
+        assert record["status"] == "complete"
+        assert all(r["source_doc_id"] == str(record["_id"]) for b in batches for r in b)
+        assert {r["clause_no"]: r["full_text"] for b in batches for r in b}["1"] == "Max height 24 m\nfor residential"
+
+        result = run["results"][0]
+        by_id = {str(r["_id"]): r["clause_no"] for b in batches for r in b}
+        assert [by_id[i] for i in result["push_result"]["inserted_rules"]] == ["1", "2", "3"]
+        assert run["stats"]["stages"]["push"]["rules"] == 3
+
+    def test_failed_batch_rolls_back_without_document_record(self, pdfs, fake_pages, tmp_path):
+        from agents import parsing_agent
+        docs, rules = MagicMock(), MagicMock()
+        rules.insert_many.side_effect = [None, EnvironmentError("connection reset"), None]
+        with patch.object(parsing_agent, "_docs_col", docs), patch.object(parsing_agent, "_rules_col", rules):
+            run = ingest([("Mumbai", pdfs["a.pdf"])], output_dir=str(tmp_path), classify=_classify,
+                         batch_size=1, push_workers=1)
+
+        assert rules.insert_many.call_count == 3
+        assert not docs.insert_one.called
+        doc_id = rules.insert_many.call_args_list[0][0][0][0]["source_doc_id"]
+        rules.delete_many.assert_called_once_with({"source_doc_id": doc_id})
+        result = run["results"][0]
+        assert result["push_result"] is None and result["errors"][0]["stage"] == "push"
+        assert result["parsed"]["rule_count"] == 3
+
+    def test_extraction_error_removes_written_batches(self, pdfs, fake_pages, tmp_path):
+        from agents import parsing_agent
+        docs, rules = MagicMock(), MagicMock()
+        with patch.object(parsing_agent, "_docs_col", docs), patch.object(parsing_agent, "_rules_col", rules):
+            run = ingest([("Mumbai", pdfs["truncated.pdf"])], output_dir=str(tmp_path), classify=_classify,
+                         batch_size=1)
+
+        assert not docs.insert_one.called
+        written = [r["_id"] for c in rules.insert_many.call_args_list for r in c[0][0]]
+        removed = rules.delete_many.call_args_list
+        assert removed and removed[0][0][0]["source_doc_id"]
+        # batches finishing after the rollback delete their own rules
+        late = [i for c in removed[1:] for i in c[0][0]["_id"]["$in"]]
+        assert set(late) <= set(written)
+        assert run["results"][0]["errors"][0]["stage"] == "extract"
+
+    def test_classification_runs_in_its_own_stage(self, pdfs, fake_pages, tmp_path):
+        import threading
+        threads = set()
+
+        def classify(text):
+            threads.add(threading.current_thread().name)
+            return _classify(text)
+
+        run = ingest([("Mumbai", pdfs["a.pdf"])], push=False, output_dir=str(tmp_path), classify=classify)
+        assert threads == {"ingest-classify-0"}
+        stages = run["stats"]["stages"]
+        assert list(stages) == ["extract", "segment", "classify", "push"]
+        assert stages["segment"]["clauses"] == 3 and stages["classify"]["rules"] == 3
+
+    def test_classification_error_fails_only_that_file(self, pdfs, fake_pages, tmp_path):
+        from agents import parsing_agent
+        docs, rules = MagicMock(), MagicMock()
+
+        def classify(text):
+            if "Setback" in text:
+                raise ValueError("bad clause")
+            return _classify(text)
+
+        with patch.object(parsing_agent, "_docs_col", docs), patch.object(parsing_agent, "_rules_col", rules):
+            run = ingest([("Mumbai", pdfs["a.pdf"]), ("Pune", pdfs["b.pdf"])], output_dir=str(tmp_path),
+                         classify=classify, batch_size=1, push_workers=1)
+
+        a, b = run["results"]
+        assert a["parsed"] is None and a["errors"][0]["stage"] == "classify"
+        assert b["parsed"]["rule_count"] == 1 and b["push_result"]["document_id"]
+        assert docs.insert_one.call_count == 1  # only b.pdf gets a documents record
+        doc_id = rules.insert_many.call_args_list[0][0][0][0]["source_doc_id"]
+        rules.delete_many.assert_any_call({"source_doc_id": doc_id})
+
+    def test_ingest_pdf_raises_push_failure(self, pdfs, fake_pages, tmp_path):
+        from agents import parsing_agent
+        rules = MagicMock()
+        rules.insert_many.side_effect = EnvironmentError("MONGO_URI not set")
+        with patch.object(parsing_agent, "_rules_col", rules), \
+             patch.object(parsing_agent, "_docs_col", MagicMock()), \
+             patch.object(parsing_agent, "classify_rule_text_cached", side_effect=_classify), \
+             pytest.raises(EnvironmentError):
+            ingest_pdf(pdfs["b.pdf"], "Pune", output_dir=str(tmp_path))
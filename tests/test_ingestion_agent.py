@@ -0,0 +1,134 @@
+"""
+Tests for bulk directory / manifest ingestion (agents/ingestion_agent.py)
+"""
+import os
+import sys
+import json
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import ingestion_agent
+from utils import ingest_pipeline
+from utils.pdf_extract import file_sha256
+
+
+def _fake_iter_pages(pdf_path, workers=None, sha256=None):
+    yield 1, f"Clause 1: FSI 2.5 for {os.path.basename(pdf_path)}\nClause 2: Max height 24 m"
+
+
+def _classify(text):
+    return ("fsi", {"fsi": 2.5}) if "FSI" in text else ("other", {})
+
+
+@pytest.fixture
+def state_dir(tmp_path):
+    root = tmp_path / "maharashtra"
+    (root / "Pune").mkdir(parents=True)
+    (root / "Pune" / "udcpr.pdf").write_bytes(b"%PDF pune")
+    (root / "Pune" / "notes.txt").write_text("ignored")
+    (root / "Nashik_DCR_2020.pdf").write_bytes(b"%PDF nashik")
+    (root / "Nashik_copy.pdf").write_bytes(b"%PDF nashik")
+    return root
+
+
+class TestInputs:
+    """Directory scanning and manifests"""
+
+    def test_scan_directory_infers_cities(self, state_dir):
+        entries = ingestion_agent.scan_directory(str(state_dir))
+        assert [(c, os.path.basename(p)) for c, p in entries] == [
+            ("Nashik", "Nashik_DCR_2020.pdf"), ("Nashik", "Nashik_copy.pdf"), ("Pune", "udcpr.pdf")]
+        assert {c for c, _ in ingestion_agent.scan_directory(str(state_dir), city="Thane")} == {"Thane"}
+
+    def test_manifest_csv_and_json(self, state_dir):
+        csv_path = state_dir / "manifest.csv"
+        csv_path.write_text("city,pdf\nPune,Pune/udcpr.pdf\n")
+        json_path = state_dir / "manifest.json"
+        json_path.write_text(json.dumps([{"city": "Nashik", "pdf": str(state_dir / "Nashik_DCR_2020.pdf")}]))
+        assert ingestion_agent.read_manifest(str(csv_path)) == [("Pune", str(state_dir / "Pune" / "udcpr.pdf"))]
+        assert ingestion_agent.read_manifest(str(json_path))[0][0] == "Nashik"
+
+        bad = state_dir / "bad.csv"
+        bad.write_text("city,pdf\n,x.pdf\n")
+        with pytest.raises(ValueError):
+            ingestion_agent.read_manifest(str(bad))
+
+
+class TestSkipByContentHash:
+    """Files already ingested for the city are not parsed again"""
+
+    def test_plan_skips_duplicates_and_known_hashes(self, state_dir):
+        entries = ingestion_agent.scan_directory(str(state_dir)) + [("Pune", str(state_dir / "missing.pdf"))]
+        pune_sha = file_sha256(str(state_dir / "Pune" / "udcpr.pdf"))
+        docs = MagicMock()
+        docs.find.return_value = [{"city": "Pune", "content_sha256": pune_sha}]
+        with patch.object(ingestion_agent, "_docs_col", docs):
+            todo, skipped = ingestion_agent.plan_files(entries)
+        assert [os.path.basename(p) for _, p, _ in todo] == ["Nashik_DCR_2020.pdf"]
+        assert sorted(s["status"] for s in skipped) == ["already_ingested", "duplicate", "missing"]
+        query = docs.find.call_args[0][0]
+        assert query["status"] == "complete" and pune_sha in query["content_sha256"]["$in"]
+
+        with patch.object(ingestion_agent, "_docs_col", docs):
+            todo, _ = ingestion_agent.plan_files(entries, force=True)
+        assert len(todo) == 2
+
+    def test_files_hashed_in_thread_pool(self, state_dir):
+        import threading
+        entries = ingestion_agent.scan_directory(str(state_dir))
+        threads = []
+
+        def sha(path):
+            threads.append(threading.current_thread().name)
+            return file_sha256(path)
+
+        with patch.object(ingestion_agent, "file_sha256", side_effect=sha):
+            serial, _ = ingestion_agent.plan_files(entries, check_ingested=False, hash_workers=1)
+            pooled, _ = ingestion_agent.plan_files(entries, check_ingested=False, hash_workers=4)
+        assert pooled == serial  # input order is kept
+        assert all(name.startswith("ingest-hash") for name in threads[len(entries):])
+
+    def test_indexes_ensured_once_per_process(self):
+        docs = MagicMock()
+        with patch.object(ingestion_agent, "_docs_col", docs), patch.object(ingestion_agent, "_indexes_ready", False):
+            ingestion_agent.ensure_ingest_indexes()
+            ingestion_agent.ensure_ingest_indexes()
+            ingestion_agent.already_ingested(["abc"])
+        assert docs.create_index.call_count == 2  # hash lookup + diff baseline lookup, once
+
+
+class TestRunIngestion:
+    """Concurrent run with a summary under the report folder"""
+
+    def test_run_writes_summary(self, state_dir, tmp_path):
+        entries = ingestion_agent.scan_directory(str(state_dir))
+        progress = []
+        real_ingest = ingest_pipeline.ingest
+
+        def _ingest(files, **kwargs):
+            kwargs.update(classify=_classify, output_dir=str(tmp_path / "parsed"))
+            wrapped = kwargs.pop("progress")
+            return real_ingest(files, progress=lambda *a: (progress.append(a[:2]), wrapped(*a)), **kwargs)
+
+        with patch.object(ingest_pipeline, "iter_pages", side_effect=_fake_iter_pages), \
+             patch.object(ingestion_agent, "ingest", side_effect=_ingest):
+            summary = ingestion_agent.run_ingestion(entries, workers=2, push=False,
+                                                    report_dir=str(tmp_path / "reports"))
+
+        assert summary["totals"] == {"files": 3, "ingested": 2, "failed": 0, "skipped": 1, "rules": 4, "pages": 2}
+        assert {f["status"] for f in summary["files"]} == {"ingested"}
+        assert sorted(progress) == [(1, 2), (2, 2)]
+        assert summary["stages"]["extract"]["workers"] == 2
+        with open(summary["report_path"], encoding="utf-8") as f:
+            assert json.load(f)["totals"]["rules"] == 4
+
+    def test_dry_run_parses_nothing(self, state_dir, tmp_path):
+        docs = MagicMock()
+        docs.find.return_value = []
+        with patch.object(ingestion_agent, "_docs_col", docs), patch.object(ingestion_agent, "ingest") as ingest:
+            code = ingestion_agent.main([str(state_dir), "--dry-run", "--report-dir", str(tmp_path)])
+        assert code == 0 and not ingest.called
+        report = json.loads(next(tmp_path.glob("ingestion_run_*.json")).read_text(encoding="utf-8"))
+        assert [f["status"] for f in report["files"]] == ["planned", "planned"]
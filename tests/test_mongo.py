@@ -0,0 +1,85 @@
+"""
+Tests for the shared lazy Mongo connection manager (utils/mongo.py)
+"""
+import os
+import sys
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import mongo
+
+
+@pytest.fixture(autouse=True)
+def fresh_client(monkeypatch):
+    """Each test starts without a client and with a known URI."""
+    monkeypatch.setenv("MONGO_URI", "mongodb://localhost:27017")
+    monkeypatch.setenv("MONGO_DB", "test_db")
+    monkeypatch.setattr(mongo, "_client", None)
+    monkeypatch.setattr(mongo, "_client_pid", None)
+    yield
+
+
+class TestGetClient:
+    """Client creation, reuse and fork handling"""
+
+    @patch("pymongo.MongoClient")
+    def test_created_once_and_reused(self, client_cls):
+        assert mongo.get_client() is mongo.get_client()
+        client_cls.assert_called_once()
+
+    @patch("pymongo.MongoClient")
+    def test_pool_sizes_from_env(self, client_cls, monkeypatch):
+        monkeypatch.setenv("MONGO_MAX_POOL_SIZE", "7")
+        monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "2")
+        mongo.get_client()
+        kwargs = client_cls.call_args.kwargs
+        assert kwargs["maxPoolSize"] == 7
+        assert kwargs["minPoolSize"] == 2
+        assert "tlsCAFile" not in kwargs
+
+    def test_tls_ca_only_for_atlas_or_tls_uris(self):
+        assert "tlsCAFile" in mongo.client_options("mongodb+srv://user:pw@cluster0.example.net/")
+        assert "tlsCAFile" in mongo.client_options("mongodb://h:27017/?tls=true")
+        assert "tlsCAFile" not in mongo.client_options("mongodb://localhost:27017")
+
+    @patch("pymongo.MongoClient")
+    def test_new_client_in_forked_child(self, client_cls):
+        client_cls.side_effect = [MagicMock(name="parent"), MagicMock(name="child")]
+        parent = mongo.get_client()
+        mongo._forget_client_after_fork()
+        child = mongo.get_client()
+        assert child is not parent
+        parent.close.assert_not_called()
+
+    @patch("pymongo.MongoClient")
+    def test_pid_change_rebuilds_client(self, client_cls):
+        client_cls.side_effect = [MagicMock(), MagicMock()]
+        first = mongo.get_client()
+        with patch("os.getpid", return_value=os.getpid() + 1):
+            assert mongo.get_client() is not first
+
+    def test_missing_uri_raises_on_use(self, monkeypatch):
+        monkeypatch.delenv("MONGO_URI")
+        with pytest.raises(EnvironmentError):
+            mongo.get_client()
+
+
+class TestLazyCollection:
+    """Module-level handles must not connect until used"""
+
+    @patch("pymongo.MongoClient")
+    def test_no_connection_until_attribute_access(self, client_cls):
+        col = mongo.LazyCollection("projects")
+        client_cls.assert_not_called()
+        col.find_one({"_id": 1})
+        client = client_cls.return_value
+        client.__getitem__.assert_called_with("test_db")
+        client.__getitem__.return_value.get_collection.assert_called_with("projects")
+
+    def test_dunder_lookups_do_not_connect(self):
+        col = mongo.LazyCollection("rules")
+        with patch.object(mongo, "get_client") as get_client:
+            assert not hasattr(col, "__array__")
+            get_client.assert_not_called()
@@ -0,0 +1,199 @@
+"""
+Tests for parallel page-range PDF extraction (utils/pdf_extract.py)
+"""
+import os
+import sys
+import multiprocessing
+import pytest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import pdf_extract
+from utils.pdf_extract import split_ranges, extract_range, extract_pages, iter_pages, join_pages
+
+PAGES = 40
+
+
+class FakeFitz:
+    """PyMuPDF stand-in: page n reads 'page n'; pages listed in `broken` raise."""
+
+    def __init__(self, pages=PAGES, broken=(), blank=()):
+        self.pages, self.broken, self.blank = pages, set(broken), set(blank)
+
+    def open(self, path):
+        fake = self
+
+        class Doc:
+            page_count = fake.pages
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def load_page(self, pno):
+                if pno in fake.broken:
+                    raise RuntimeError("corrupt page")
+
+                class Page:
+                    def get_text(self, kind):
+                        return "" if pno in fake.blank else f"page {pno + 1}"
+                return Page()
+        return Doc()
+
+
+class FakePdfplumber:
+    """pdfplumber stand-in honouring the 1-based `pages` argument."""
+
+    def open(self, path, pages=None):
+        numbers = pages or list(range(1, PAGES + 1))
+
+        class Page:
+            def __init__(self, n):
+                self.n = n
+
+            def extract_text(self):
+                return f"plumber {self.n}"
+
+        class Pdf:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+        pdf = Pdf()
+        pdf.pages = [Page(n) for n in numbers]
+        return pdf
+
+
+@pytest.fixture(autouse=True)
+def extract_cache(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "extract_cache"
+    monkeypatch.setattr(pdf_extract, "PDF_EXTRACT_CACHE_DIR", str(cache_dir))
+    return cache_dir
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(b"%PDF-1.4 fake")
+    return str(path)
+
+
+class TestSplitRanges:
+    """Page ranges cover the document exactly once, in order"""
+
+    def test_covers_all_pages(self):
+        ranges = split_ranges(401, workers=4, min_pages=16)
+        assert ranges[0][0] == 0 and ranges[-1][1] == 401
+        assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+        assert len(ranges) == 8
+
+    def test_small_documents_stay_in_one_range(self):
+        assert split_ranges(10, workers=8, min_pages=16) == [(0, 10)]
+        assert split_ranges(0, workers=8) == []
+
+
+class TestExtractRange:
+    """Per-range backend fallback"""
+
+    def test_fitz_preferred(self, pdf_file):
+        with patch.object(pdf_extract, "fitz", FakeFitz()), patch.object(pdf_extract, "pdfplumber", FakePdfplumber()):
+            assert extract_range(pdf_file, 2, 4) == (["page 3", "page 4"], "fitz")
+
+    def test_falls_back_to_pdfplumber_for_failing_range(self, pdf_file):
+        with patch.object(pdf_extract, "fitz", FakeFitz(broken={3})), \
+             patch.object(pdf_extract, "pdfplumber", FakePdfplumber()):
+            assert extract_range(pdf_file, 2, 4) == (["plumber 3", "plumber 4"], "pdfplumber")
+
+    def test_blank_range_tries_pdfplumber(self, pdf_file):
+        with patch.object(pdf_extract, "fitz", FakeFitz(blank={0, 1})), \
+             patch.object(pdf_extract, "pdfplumber", None):
+            assert extract_range(pdf_file, 0, 2) == (["", ""], None)
+
+
+class TestExtractPages:
+    """Whole-document extraction keeps page order"""
+
+    def test_inline(self, pdf_file):
+        with patch.object(pdf_extract, "fitz", FakeFitz()):
+            pages = extract_pages(pdf_file, workers=1)
+        assert pages == [f"page {i}" for i in range(1, PAGES + 1)]
+
+    @pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="fake backends need fork")
+    def test_process_pool_keeps_order_with_mixed_backends(self, pdf_file):
+        with patch.object(pdf_extract, "fitz", FakeFitz(broken={25})), \
+             patch.object(pdf_extract, "pdfplumber", FakePdfplumber()), \
+             patch.object(pdf_extract, "PDF_EXTRACT_PAGES_PER_RANGE", 5):
+            pages = extract_pages(pdf_file, workers=2)
+        assert len(pages) == PAGES
+        assert pages[:3] == ["page 1", "page 2", "page 3"]
+        assert pages[25] == "plumber 26"
+        assert pages[-1] == "page 40"
+
+    @pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="fake backends need fork")
+    def test_iter_pages_streams_in_order(self, pdf_file):
+        with patch.object(pdf_extract, "fitz", FakeFitz()), patch.object(pdf_extract, "PDF_EXTRACT_PAGES_PER_RANGE", 3):
+            pages = list(iter_pages(pdf_file, workers=2))
+        assert pages == [(i, f"page {i}") for i in range(1, PAGES + 1)]
+
+    def test_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            extract_pages(str(tmp_path / "nope.pdf"))
+
+    def test_join_pages_markers(self):
+        assert join_pages(["a", " ", "c"], markers=True) == "--- PAGE 1 ---\na\n\n--- PAGE 3 ---\nc"
+        assert join_pages(["a", "", "c"]) == "a\n\nc"
+
+
+class TestExtractionCache:
+    """Unchanged PDFs are read back from the content-hash cache"""
+
+    def test_second_run_skips_extraction(self, pdf_file, extract_cache):
+        with patch.object(pdf_extract, "fitz", FakeFitz()):
+            first = extract_pages(pdf_file, workers=1)
+            with patch.object(pdf_extract, "extract_range", side_effect=AssertionError("re-extracted")), \
+                 patch.object(pdf_extract, "page_count", side_effect=AssertionError("re-opened")):
+                second = extract_pages(pdf_file, workers=1)
+        assert second == first
+        assert len(list(extract_cache.rglob("*.ndjson.gz"))) == 1
+
+    def test_changed_content_or_extractor_misses(self, pdf_file, extract_cache):
+        with patch.object(pdf_extract, "fitz", FakeFitz()):
+            extract_pages(pdf_file, workers=1)
+            with open(pdf_file, "ab") as f:
+                f.write(b" edited")
+            extract_pages(pdf_file, workers=1)
+            with patch.object(pdf_extract, "EXTRACTOR_VERSION", "2"):
+                extract_pages(pdf_file, workers=1)
+        assert len(list(extract_cache.rglob("*.ndjson.gz"))) == 3
+
+    def test_abandoned_extraction_is_not_cached(self, pdf_file, extract_cache):
+        with patch.object(pdf_extract, "fitz", FakeFitz()), patch.object(pdf_extract, "PDF_EXTRACT_PAGES_PER_RANGE", 5):
+            pages = iter_pages(pdf_file, workers=1)
+            next(pages)
+            pages.close()
+        assert list(extract_cache.rglob("*.gz*")) == []
+
+    def test_cache_disabled(self, pdf_file, extract_cache):
+        with patch.object(pdf_extract, "fitz", FakeFitz()), patch.object(pdf_extract, "PDF_EXTRACT_CACHE_DIR", "off"):
+            assert extract_pages(pdf_file, workers=1)[0] == "page 1"
+        assert not extract_cache.exists()
+
+    def test_known_hash_is_not_recomputed(self, pdf_file, extract_cache):
+        sha = pdf_extract.file_sha256(pdf_file)
+        with patch.object(pdf_extract, "fitz", FakeFitz()), \
+             patch.object(pdf_extract, "file_sha256", side_effect=AssertionError("re-hashed")):
+            pages = list(iter_pages(pdf_file, workers=1, sha256=sha))
+        assert len(pages) == PAGES
+        assert [p.name.split("-")[0] for p in extract_cache.rglob("*.ndjson.gz")] == [sha]
+
+    def test_concurrent_writers_use_separate_temp_files(self, pdf_file, extract_cache):
+        with patch.object(pdf_extract, "fitz", FakeFitz()):
+            first, second = iter_pages(pdf_file, workers=1), iter_pages(pdf_file, workers=1)
+            next(first), next(second)  # both writing the same entry, as two ingest threads would
+            assert len(list(extract_cache.rglob("*.tmp"))) == 2
+            assert len(list(first)) == len(list(second)) == PAGES - 1
+        assert [p.suffix for p in extract_cache.rglob("*.gz*")] == [".gz"]
@@ -0,0 +1,244 @@
+"""
+Tests for the single-pass rule classifier (agents/rule_classification_agent.py)
+"""
+import os
+import re
+import sys
+import glob
+import json
+import random
+import pytest
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import rule_classification_agent as classifier
+from agents.rule_classification_agent import classify_rule_text, patterns
+from utils import classification_cache
+from utils.classification_cache import ClassificationCache
+
+PARSED_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'parsed')
+
+
+def reference_classify(text):
+    """Per-category search in priority order (the behaviour the classifier must keep)."""
+    info = {"category": "other", "details": {}}
+    for cat, pattern in patterns.items():
+        m = pattern.search(text)
+        if m:
+            info["category"] = cat
+            nums = re.findall(r"[\d\.]+", text)
+            if nums:
+                try:
+                    info["details"]["value"] = float(nums[0])
+                except ValueError:
+                    pass
+            info["details"]["matched"] = m.group(0)
+            break
+    return info
+
+
+class TestClassifyRuleText:
+    """Category, value and matched span"""
+
+    def test_priority_beats_position(self):
+        result = classify_rule_text("Parking as per table; FSI: 2.5 permissible")
+        assert result["category"] == "fsi"
+        assert result["details"] == {"value": 2.5, "matched": "FSI: 2.5"}
+
+    def test_height_needs_number_on_same_line(self):
+        text = "Maximum height as notified\nsetback 3 m; height limit 24 m"
+        result = classify_rule_text(text)
+        assert result["category"] == "height"
+        assert result["details"]["matched"] == "height limit 24 m"
+
+    def test_other_has_no_details(self):
+        assert classify_rule_text("General provisions apply.") == {"category": "other", "details": {}}
+
+    def test_value_is_first_numeric_token(self):
+        # "No." yields "." first, which is not a float, so no value (unchanged behaviour)
+        assert "value" not in classify_rule_text("Clause No. 5: parking for 2 cars")["details"]
+
+    def test_unicode_case_folding(self):
+        for text in ["PARKİNG 4", "ſetback 3", "parkıng area", "Site Coverage – 40%"]:
+            assert classify_rule_text(text) == reference_classify(text)
+
+
+class TestParity:
+    """Single pass must match the per-category reference exactly"""
+
+    def test_randomized_texts(self):
+        tokens = ["FSI", "F.S.I", "floor space index", "height", "storeys", "floor height",
+                  "maximum height", "setback", "set back", "parking area", "stilt", "mixed use",
+                  "tenements", "plinth area", "ground coverage", "12", "3.5", "1.2.3", ".", ":",
+                  "m", "meter", "\n", " ", "heights", "no.", "FSIx", "_height", "–"]
+        rng = random.Random(0)
+        for _ in range(5000):
+            text = "".join(rng.choice(tokens) + rng.choice(["", " "]) for _ in range(rng.randint(0, 12)))
+            assert classify_rule_text(text) == reference_classify(text), repr(text)
+
+    @pytest.mark.skipif(not glob.glob(os.path.join(PARSED_DIR, "*.json")), reason="no parsed corpus")
+    def test_parsed_corpus(self):
+        for path in glob.glob(os.path.join(PARSED_DIR, "*.json")):
+            with open(path, encoding="utf-8") as f:
+                for rule in json.load(f).get("rules", []):
+                    text = rule.get("text") or ""
+                    assert classify_rule_text(text) == reference_classify(text)
+
+
+RULES = [
+    {"_id": "r1", "clause_no": "1.1", "full_text": "FSI 2.5 permissible"},
+    {"_id": "r2", "clause_no": "1.2", "full_text": "Maximum height 24 m"},
+]
+
+
+def _classified_doc(rule, version=classifier.CLASSIFIER_VERSION, _id=None):
+    text = rule["full_text"]
+    return {
+        "_id": _id or f"c_{rule['_id']}",
+        "source_rule_id": rule["_id"],
+        "source_hash": classifier.source_hash(rule["clause_no"], text),
+        "classifier_version": version,
+    }
+
+
+@pytest.fixture(autouse=True)
+def temp_cache(tmp_path):
+    """Classification cache in a temp dir instead of outputs/."""
+    cache = ClassificationCache(str(tmp_path / "classification_cache.sqlite"))
+    with patch.object(classification_cache, "_cache", cache):
+        yield cache
+    cache.close()
+
+
+@pytest.fixture
+def collections():
+    rules_col, classified_col = MagicMock(), MagicMock()
+    with patch.object(classifier, "_rules", rules_col), \
+         patch.object(classifier, "_classified", classified_col), \
+         patch.object(classifier, "_indexes_ready", True):
+        yield rules_col, classified_col
+
+
+class TestIncrementalClassification:
+    """classify_rules_for_city only touches new / changed rules"""
+
+    def test_first_run_upserts_every_rule(self, collections):
+        rules_col, classified_col = collections
+        rules_col.find.return_value = RULES
+        classified_col.find.return_value = []
+        docs = classifier.classify_rules_for_city("Pune")
+        assert [d["source_rule_id"] for d in docs] == ["r1", "r2"]
+        ops = classified_col.bulk_write.call_args.args[0]
+        assert [op._filter for op in ops] == [{"source_rule_id": "r1"}, {"source_rule_id": "r2"}]
+        assert all(op._upsert for op in ops)
+        assert docs[0]["classifier_version"] == classifier.CLASSIFIER_VERSION
+
+    def test_unchanged_city_does_no_work(self, collections):
+        rules_col, classified_col = collections
+        rules_col.find.return_value = RULES
+        classified_col.find.return_value = [_classified_doc(r) for r in RULES]
+        with patch.object(classifier, "classify_rule_text") as classify:
+            assert classifier.classify_rules_for_city("Pune") == []
+            classify.assert_not_called()
+        classified_col.bulk_write.assert_not_called()
+
+    def test_changed_text_and_version_are_reclassified(self, collections):
+        rules_col, classified_col = collections
+        edited = dict(RULES[0], full_text="FSI 3.0 permissible")
+        rules_col.find.return_value = [edited, RULES[1]]
+        classified_col.find.return_value = [_classified_doc(RULES[0]), _classified_doc(RULES[1], version="0")]
+        docs = classifier.classify_rules_for_city("Pune")
+        assert [d["source_rule_id"] for d in docs] == ["r1", "r2"]
+        assert docs[0]["details"]["value"] == 3.0
+
+    def test_duplicates_from_insert_only_runs_are_removed(self, collections):
+        rules_col, classified_col = collections
+        rules_col.find.return_value = RULES[:1]
+        classified_col.find.return_value = [_classified_doc(RULES[0]), _classified_doc(RULES[0], _id="dup")]
+        assert classifier.classify_rules_for_city("Pune") == []
+        ops = classified_col.bulk_write.call_args.args[0]
+        assert len(ops) == 1 and ops[0]._filter == {"_id": "dup"}
+        assert classified_col.bulk_write.call_args.kwargs == {"ordered": True}
+
+    def test_duplicate_deletes_run_before_upserts(self, collections):
+        rules_col, classified_col = collections
+        edited = dict(RULES[0], full_text="FSI 3.0 permissible")
+        rules_col.find.return_value = [edited]
+        classified_col.find.return_value = [_classified_doc(RULES[0]), _classified_doc(RULES[0], _id="dup")]
+        classifier.classify_rules_for_city("Pune")
+        calls = classified_col.bulk_write.call_args_list
+        (deletes, delete_kw), (upserts, upsert_kw) = [(c.args[0], c.kwargs) for c in calls]
+        assert [op._filter for op in deletes] == [{"_id": "dup"}] and delete_kw == {"ordered": True}
+        assert [op._filter for op in upserts] == [{"source_rule_id": "r1"}] and upsert_kw == {"ordered": False}
+
+    def test_classified_docs_of_deleted_rules_are_removed(self, collections):
+        rules_col, classified_col = collections
+        rules_col.find.return_value = RULES[:1]
+        gone = dict(RULES[1], _id="r9")
+        classified_col.find.return_value = [_classified_doc(RULES[0]), _classified_doc(gone, _id="orphan")]
+        assert classifier.classify_rules_for_city("Pune") == []
+        ops = classified_col.bulk_write.call_args.args[0]
+        assert [op._filter for op in ops] == [{"_id": "orphan"}]
+
+    def test_city_without_rules_drops_all_classified(self, collections):
+        rules_col, classified_col = collections
+        rules_col.find.return_value = []
+        classified_col.find.return_value = [_classified_doc(r, _id=f"c-{r['_id']}") for r in RULES]
+        classifier.classify_rules_for_city("Pune")
+        ops = classified_col.bulk_write.call_args.args[0]
+        assert [op._filter for op in ops] == [{"_id": "c-r1"}, {"_id": "c-r2"}]
+
+
+class _Cursor:
+    """Minimal iterable cursor stand-in for find()."""
+
+    def __init__(self, docs):
+        self._it = iter(docs)
+
+    def __iter__(self):
+        return self._it
+
+
+class TestBatchClassification:
+    """classify_cities_streaming: cursor chunks, pool classification, one bulk write per chunk"""
+
+    def _setup(self, collections, rules_by_city, existing=()):
+        rules_col, classified_col = collections
+        rules_col.distinct.return_value = list(rules_by_city)
+        rules_col.find.side_effect = lambda query, *a, **kw: _Cursor(rules_by_city[query["city"]])
+        classified_col.find.return_value = list(existing)
+        return rules_col, classified_col
+
+    def test_all_cities_inline(self, collections):
+        many = [{"_id": f"p{i}", "clause_no": str(i), "full_text": f"setback {i} m"} for i in range(5)]
+        _, classified_col = self._setup(collections, {"Pune": many, "Mumbai": RULES})
+        stats = classifier.classify_cities_streaming(None, workers=1, batch_size=2)
+        assert stats["rules"] == 7 and stats["classified"] == 7
+        assert stats["cities"]["Pune"] == {"rules": 5, "classified": 5, "unchanged": 0, "removed": 0}
+        # Mumbai: 1 chunk of 2, Pune: chunks of 2 / 2 / 1
+        assert classified_col.bulk_write.call_count == 4
+        assert stats["rules_per_s"] > 0
+
+    def test_unchanged_rules_skip_pool_and_writes(self, collections):
+        _, classified_col = self._setup(collections, {"Pune": RULES}, [_classified_doc(r) for r in RULES])
+        stats = classifier.classify_cities_streaming(["Pune"], workers=2, batch_size=10)
+        assert stats["unchanged"] == 2 and stats["classified"] == 0
+        classified_col.bulk_write.assert_not_called()
+
+    def test_orphans_removed_after_cursor_pass(self, collections):
+        gone = dict(RULES[1], _id="r9")
+        existing = [_classified_doc(r) for r in RULES] + [_classified_doc(gone, _id="orphan")]
+        _, classified_col = self._setup(collections, {"Pune": RULES}, existing)
+        stats = classifier.classify_cities_streaming(["Pune"], workers=1, batch_size=1)
+        assert stats["removed"] == 1 and stats["cities"]["Pune"]["removed"] == 1
+        (ops,), kwargs = classified_col.bulk_write.call_args
+        assert [op._filter for op in ops] == [{"_id": "orphan"}] and kwargs == {"ordered": False}
+
+    def test_process_pool_matches_inline(self, collections):
+        many = [{"_id": f"p{i}", "clause_no": str(i), "full_text": f"FSI {i}.5"} for i in range(9)]
+        _, classified_col = self._setup(collections, {"Pune": many})
+        stats = classifier.classify_cities_streaming(["Pune"], workers=2, batch_size=4)
+        assert stats["classified"] == 9 and stats["batches"] == 3
+        written = [op._doc["$set"] for call in classified_col.bulk_write.call_args_list for op in call.args[0]]
+        assert sorted(d["details"]["value"] for d in written) == [i + 0.5 for i in range(9)]
@@ -0,0 +1,120 @@
+# tests/test_rule_predicates.py
+"""
+Tests for the rule predicate compiler (free-text conditions / entitlements)
+"""
+import os
+import json
+import pytest
+from unittest.mock import patch
+
+from utils import rule_predicates
+from utils.rule_predicates import (
+    Predicate,
+    parse_constraints,
+    parse_predicate,
+    compile_rule,
+    height_fsi_constraints,
+)
+
+
+class TestParsing:
+    """Test parsing of constraint strings"""
+
+    @pytest.mark.parametrize("text,metric,op,value,unit", [
+        ("Height <= 24m", "height_m", "<=", 24.0, "m"),
+        ("FAR <= 1.5", "fsi", "<=", 1.5, None),
+        ("FSI < 2", "fsi", "<", 2.0, None),
+        ("Setback >= 4m", "setback_m", ">=", 4.0, "m"),
+        ("Side margin >= 2m", "side_margin_m", ">=", 2.0, "m"),
+        ("Max 7 floors", "floors", "<=", 7.0, None),
+        ("Maximum height 24 m", "height_m", "<=", 24.0, "m"),
+        ("Min setback of 3 m", "setback_m", ">=", 3.0, "m"),
+        ("Ground+6", "floors", "<=", 7.0, None),
+    ])
+    def test_parse_single(self, text, metric, op, value, unit):
+        p = parse_predicate(text)
+        assert (p.metric, p.op, p.value, p.unit) == (metric, op, value, unit)
+
+    def test_unit_conversion_to_metres(self):
+        p = parse_predicate("Height <= 80 ft")
+        assert p.unit == "m"
+        assert p.value == pytest.approx(24.384)
+
+    def test_multiple_segments_and_unparsed(self):
+        preds, unparsed = parse_constraints("Height <= 27m, FAR <= 2.5; Industrial sheds permitted")
+        assert [p.metric for p in preds] == ["height_m", "fsi"]
+        assert unparsed == ("Industrial sheds permitted",)
+
+    def test_guarded_predicate(self):
+        p = parse_predicate("Max 4 floors for plots < 250 sq.m")
+        assert p.metric == "floors" and p.value == 4.0
+        assert p.guard == Predicate("plot_area_sqm", "<", 250.0, "sqm", None, "plots < 250 sq.m")
+        assert p.check({"floors": 5, "plot_area_sqm": 200}) is False
+        assert p.check({"floors": 5, "plot_area_sqm": 400}) is None  # guard rules it out
+        assert p.check({"floors": 3}) is True
+
+    def test_all_sample_rules_parse(self):
+        rules_file = os.path.join(os.path.dirname(__file__), "..", "mcp_data", "rules.json")
+        with open(rules_file, encoding="utf-8") as f:
+            data = json.load(f)
+        for city_rules in data.values():
+            for r in city_rules:
+                compiled = compile_rule(r)
+                assert compiled.predicates or compiled.unparsed
+
+
+class TestCompiledRules:
+    """Test compiled rule evaluation and caching"""
+
+    def setup_method(self):
+        rule_predicates.clear_cache()
+
+    def test_evaluate_subject(self):
+        compiled = compile_rule({"id": "r1", "conditions": "Height <= 24m", "entitlements": "Max 7 floors"})
+        assert compiled.evaluate({"height_m": 21, "floors": 8}) == {"height_m": True, "floors": False}
+        assert compiled.evaluate({}) == {"height_m": None, "floors": None}
+
+    def test_cached_per_rule_version(self):
+        rule = {"id": "r1", "rule": {"conditions": "Height <= 24m"}, "time": "2025-10-12T16:33:02Z"}
+        with patch.object(rule_predicates, "parse_constraints", wraps=rule_predicates.parse_constraints) as spy:
+            first = compile_rule(rule)
+            again = compile_rule(dict(rule))
+            assert first is again
+            assert spy.call_count == 2  # conditions + entitlements, parsed once
+
+            amended = {"id": "r1", "rule": {"conditions": "Height <= 30m"}, "time": "2025-11-01T00:00:00Z"}
+            assert compile_rule(amended).first("height_m").value == 30.0
+
+    def test_height_fsi_constraints_prefers_parsed_fields(self):
+        rule = {"rule": {"parsed_fields": {"height": {"op": "<", "value_m": 10}}, "conditions": "Height <= 24m"}}
+        assert height_fsi_constraints(rule) == ({"op": "<", "value_m": 10}, None)
+
+    def test_height_fsi_constraints_from_conditions(self):
+        rule = {"id": "p2", "conditions": "Height <= 27m, FAR <= 2.5", "entitlements": "Max 8 floors"}
+        assert height_fsi_constraints(rule) == ({"op": "<=", "value_m": 27.0}, 2.5)
+
+
+    def test_height_fsi_constraints_respect_guards(self):
+        rule = {"id": "p3", "conditions": "Height <= 40m for plots > 1000 sq.m, Height <= 24m, FAR <= 1.5 for road width >= 18m"}
+        assert height_fsi_constraints(rule) == ({"op": "<=", "value_m": 24.0}, None)
+        large = {"height_m": 30, "plot_area_sqm": 1500, "road_width_m": 24}
+        assert height_fsi_constraints(rule, large) == ({"op": "<=", "value_m": 40.0}, 1.5)
+        assert height_fsi_constraints(rule, {"height_m": 30, "plot_area_sqm": 600, "road_width_m": 9}) == (
+            {"op": "<=", "value_m": 24.0}, None)
+
+
+class TestCalculatorWithConditions:
+    """Calculator agent checks rules that only carry free-text conditions"""
+
+    @patch('agents.calculator_agent.get_rules_for_city')
+    @patch('agents.calculator_agent.log_geometry')
+    @patch('agents.calculator_agent.json_to_glb')
+    def test_conditions_only_rule(self, mock_glb, mock_log, mock_get_rules, tmp_path, monkeypatch):
+        from agents.calculator_agent import calculator_agent
+        monkeypatch.chdir(tmp_path)
+        mock_get_rules.return_value = [
+            {"city": "Pune", "clause_no": "PMC-12.1", "conditions": "Height <= 27m, FAR <= 2.5"},
+        ]
+        results = calculator_agent("Pune", {"height_m": 30, "fsi": 2.0})
+        assert results[0]["checks"]["height"]["ok"] is False
+        assert results[0]["checks"]["fsi"]["ok"] is True
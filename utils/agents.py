@@ -1,5 +1,6 @@
 #agents.py
 from utils import mcpstore
+from utils.rule_predicates import compile_rule
 import uuid
 
 def parsing_agent(rule_json):
@@ -15,7 +16,7 @@ def calculator_agent(city):
     for r in rules:
         outputs.append({
             "clause_no": r["rule"].get("clause_no"),
-            "entitlement": "Allowed" if "height" in r["rule"].get("conditions", "").lower() else "Check"
+            "entitlement": "Allowed" if compile_rule(r).first("height_m") else "Check"
         })
         mcpstore.log_geometry(r["id"], f"outputs/geometry/{r['id']}.glb")
     return outputs
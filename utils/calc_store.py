@@ -0,0 +1,238 @@
+# utils/calc_store.py
+"""
+Calculator Result Store
+-----------------------
+- Append-only NDJSON store for calculator_agent outcomes (one line per run)
+- Partitioned per city and per UTC day; a day rotates to a new part once it
+  reaches CALC_STORE_MAX_BYTES
+- Optional compression works on whole segments: runs are appended to a plain part,
+  which is gzipped in one pass when it rotates or when its day is over (per-run gzip
+  members would each cost a header and compress almost nothing)
+- Readers stream segments line by line, so history and pass rates never load
+  a whole city into memory
+- Writers serialise on an OS-level lock file per city (fcntl.flock), so separate
+  processes (the app and the CLI) never rotate, compress or append to a segment
+  at the same time; where fcntl is unavailable only the in-process lock applies
+
+Layout:
+  <CALC_STORE_DIR>/<city>/<YYYY-MM-DD>/part-00000.ndjson[.gz]
+  <CALC_STORE_DIR>/<city>/.lock
+
+Environment variables:
+- CALC_STORE_DIR       : root directory (default: outputs/calc_store)
+- CALC_STORE_MAX_BYTES : rotate a segment after this many bytes (default: 64 MiB)
+- CALC_STORE_COMPRESS  : "1"/"true" to gzip closed segments (default: off)
+
+Usage:
+  from utils.calc_store import append_run, iter_history, pass_rates
+
+  append_run("Pune", {"height_m": 20, "fsi": 2.2}, outcomes)
+  for run in iter_history("Pune", since="2025-10-01"):
+      ...
+  pass_rates("Pune")   # {"runs": 42, "checks": {"height": {"passed": .., "rate": ..}, ...}}
+"""
+import os
+import re
+import gzip
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock
+    fcntl = None
+
+logger = logging.getLogger("CalcStore")
+
+CALC_STORE_DIR = os.getenv("CALC_STORE_DIR", os.path.join("outputs", "calc_store"))
+CALC_STORE_MAX_BYTES = int(os.getenv("CALC_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+CALC_STORE_COMPRESS = os.getenv("CALC_STORE_COMPRESS", "").strip().lower() in ("1", "true", "yes")
+
+_PART_RE = re.compile(r"^part-(\d{5})\.ndjson(\.gz)?$")
+_LOCK_NAME = ".lock"
+_lock = threading.Lock()
+
+DateLike = Union[str, date, datetime, None]
+
+
+# ----------------- PATHS -----------------
+def _city_dir(city: str, root: Optional[str] = None) -> str:
+    safe = re.sub(r"[^\w\-]+", "_", city.strip()) or "unknown"
+    return os.path.join(root or CALC_STORE_DIR, safe)
+
+
+def _parts(day_dir: str) -> List[str]:
+    if not os.path.isdir(day_dir):
+        return []
+    names = set(n for n in os.listdir(day_dir) if _PART_RE.match(n))
+    # mid-compression both encodings of a part exist; the plain one is still authoritative
+    return sorted(n for n in names if not (n.endswith(".gz") and n[:-3] in names))
+
+
+@contextmanager
+def _partition_lock(city_dir: str) -> Iterator[None]:
+    """
+    Hold the city's write lock: the thread lock within this process, plus an
+    exclusive flock on <city_dir>/.lock across processes. Rotation, sealing and
+    appends all happen under it, so no writer appends to a segment being gzipped.
+    """
+    with _lock:
+        os.makedirs(city_dir, exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(city_dir, _LOCK_NAME), "a") as handle:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+def _compress_segment(path: str) -> str:
+    """Gzip a closed plain segment in one pass; the .gz replaces it atomically."""
+    target = path + ".gz"
+    tmp = f"{target}.{os.getpid()}.tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+        for chunk in iter(lambda: src.read(1 << 20), b""):
+            dst.write(chunk)
+    os.replace(tmp, target)
+    os.remove(path)
+    return target
+
+
+def _seal_previous_days(city_dir: str, today: str) -> None:
+    """Compress plain parts of days before `today` (they will not be appended to again)."""
+    for day in sorted(os.listdir(city_dir)):
+        if day >= today or day == _LOCK_NAME:
+            continue
+        day_dir = os.path.join(city_dir, day)
+        for name in _parts(day_dir):
+            if not name.endswith(".gz"):
+                _compress_segment(os.path.join(day_dir, name))
+
+
+def _current_segment(day_dir: str, compress: bool, max_bytes: int) -> str:
+    """Last plain part of the day, or the next one once it is full (compressing the full one)."""
+    parts = _parts(day_dir)
+    if parts:
+        last = parts[-1]
+        path = os.path.join(day_dir, last)
+        if not last.endswith(".gz") and os.path.getsize(path) < max_bytes:
+            return path
+        if compress and not last.endswith(".gz"):
+            _compress_segment(path)
+        index = int(_PART_RE.match(last).group(1)) + 1
+    else:
+        index = 0
+    return os.path.join(day_dir, f"part-{index:05d}.ndjson")
+
+
+def _as_day(value: DateLike) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+
+# ----------------- WRITE -----------------
+def append_run(city: str, subject: Dict[str, Any], outcomes: List[Dict[str, Any]],
+               root: Optional[str] = None, compress: Optional[bool] = None,
+               max_bytes: Optional[int] = None) -> str:
+    """Append one calculator run as a single NDJSON line; returns the segment path."""
+    now = datetime.utcnow()
+    record = {
+        "timestamp": now.isoformat() + "Z",
+        "city": city,
+        "subject": subject,
+        "outcomes": outcomes,
+    }
+    line = (json.dumps(record, default=str, separators=(",", ":")) + "\n").encode("utf-8")
+    compress = CALC_STORE_COMPRESS if compress is None else compress
+    max_bytes = CALC_STORE_MAX_BYTES if max_bytes is None else max_bytes
+
+    city_dir = _city_dir(city, root)
+    day_dir = os.path.join(city_dir, now.strftime("%Y-%m-%d"))
+    with _partition_lock(city_dir):
+        if compress and not os.path.isdir(day_dir):
+            _seal_previous_days(city_dir, now.strftime("%Y-%m-%d"))
+        os.makedirs(day_dir, exist_ok=True)
+        path = _current_segment(day_dir, compress, max_bytes)
+        with open(path, "ab") as f:
+            f.write(line)
+    return path
+
+
+# ----------------- READ -----------------
+def list_cities(root: Optional[str] = None) -> List[str]:
+    root = root or CALC_STORE_DIR
+    if not os.path.isdir(root):
+        return []
+    return sorted(n for n in os.listdir(root) if os.path.isdir(os.path.join(root, n)))
+
+
+def iter_segments(city: str, since: DateLike = None, until: DateLike = None,
+                  root: Optional[str] = None) -> Iterator[str]:
+    """Segment paths for a city in chronological order, limited to days in [since, until]."""
+    city_dir = _city_dir(city, root)
+    if not os.path.isdir(city_dir):
+        return
+    lo, hi = _as_day(since), _as_day(until)
+    for day in sorted(os.listdir(city_dir)):
+        if day == _LOCK_NAME or (lo and day < lo) or (hi and day > hi):
+            continue
+        day_dir = os.path.join(city_dir, day)
+        for name in _parts(day_dir):
+            yield os.path.join(day_dir, name)
+
+
+def iter_history(city: str, since: DateLike = None, until: DateLike = None,
+                 root: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """Stream stored runs for a city, oldest first. Corrupt lines are skipped."""
+    for path in iter_segments(city, since, until, root):
+        opener = gzip.open if path.endswith(".gz") else open
+        try:
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Skipping corrupt line in %s", path)
+        except (OSError, EOFError) as e:
+            # a truncated gzip tail (crash mid-write) ends that segment only
+            logger.warning("Stopped reading %s: %s", path, e)
+
+
+def pass_rates(city: str, since: DateLike = None, until: DateLike = None,
+               root: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Aggregate check outcomes over a city's history in one streaming pass.
+    Returns {"city", "runs", "checks": {check: {"passed", "failed", "unknown", "rate"}}}
+    where rate = passed / (passed + failed), or None when nothing was decided.
+    """
+    runs = 0
+    checks: Dict[str, Dict[str, Any]] = {}
+    for run in iter_history(city, since, until, root):
+        runs += 1
+        for outcome in run.get("outcomes") or []:
+            for name, check in (outcome.get("checks") or {}).items():
+                bucket = checks.setdefault(name, {"passed": 0, "failed": 0, "unknown": 0})
+                ok = check.get("ok") if isinstance(check, dict) else None
+                if ok is True:
+                    bucket["passed"] += 1
+                elif ok is False:
+                    bucket["failed"] += 1
+                else:
+                    bucket["unknown"] += 1
+
+    for bucket in checks.values():
+        decided = bucket["passed"] + bucket["failed"]
+        bucket["rate"] = round(bucket["passed"] / decided, 4) if decided else None
+    return {"city": city, "runs": runs, "checks": checks}
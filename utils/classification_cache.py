@@ -0,0 +1,233 @@
+# utils/classification_cache.py
+"""
+Classification Cache
+--------------------
+- Persistent SQLite cache of rule-classifier results keyed by a hash of
+  (classifier namespace, classifier version, whitespace-normalized clause text)
+- The same clause repeated across cities, re-parses and near-identical DCR editions
+  is classified once; bumping a classifier version simply stops matching old entries
+- Callers classify the normalized text (see normalize_clause_text), so a cached result
+  is exactly what the classifier would return for any text with the same key
+- Hits / misses are counted per namespace in-process and added to the database on
+  flush (at exit, or explicitly), so the hit rate survives across runs
+- Safe with several processes: WAL journal, short busy timeout, one connection per pid;
+  any SQLite error degrades to classifying without the cache
+
+Environment variables:
+- CLASSIFICATION_CACHE_PATH : SQLite file (default: outputs/classification_cache.sqlite;
+                              empty or "off" disables the cache)
+
+Usage:
+  from utils.classification_cache import get_cache
+
+  result = get_cache().classify("rule_classifier", "3", text, classify_rule_text)
+  get_cache().stats()   # {"rule_classifier": {"hits": 10, "misses": 2, "hit_rate": 0.8333, ...}}
+
+  python -m utils.classification_cache            # print persisted statistics
+"""
+import os
+import re
+import json
+import atexit
+import hashlib
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("ClassificationCache")
+
+CLASSIFICATION_CACHE_PATH = os.getenv(
+    "CLASSIFICATION_CACHE_PATH", os.path.join("outputs", "classification_cache.sqlite")
+)
+
+STATS_FLUSH_EVERY = 256  # lookups between writes of the hit / miss counters
+
+_HSPACE_RE = re.compile(r"[^\S\n]+")
+_BLANK_LINES_RE = re.compile(r"\n{2,}")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS stats (
+    namespace TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def normalize_clause_text(text: str) -> str:
+    """
+    Collapse runs of spaces / tabs to one space, strip every line and drop blank lines.
+    Line breaks are kept because the classifiers only look for values on a keyword's line.
+    """
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = (_HSPACE_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n", "\n".join(line for line in lines if line))
+
+
+def cache_key(namespace: str, version: str, normalized: str) -> str:
+    return hashlib.sha1(f"{namespace}\0{version}\0{normalized}".encode("utf-8")).hexdigest()
+
+
+class ClassificationCache:
+    """SQLite-backed classification memo with per-namespace hit-rate counters."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._totals: Dict[str, Dict[str, int]] = {}
+        self._pending_n = 0
+
+    # ----------------- CONNECTION -----------------
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            # counters inherited from a parent process were already counted there
+            self._conn, self._pid = conn, os.getpid()
+            self._pending, self._totals, self._pending_n = {}, {}, 0
+        return self._conn
+
+    def close(self) -> None:
+        self.flush_stats()
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    # ----------------- LOOKUP -----------------
+    def _count(self, namespace: str, field: str) -> None:
+        with self._lock:
+            for bucket in (self._pending, self._totals):
+                counts = bucket.setdefault(namespace, {"hits": 0, "misses": 0})
+                counts[field] += 1
+            self._pending_n += 1
+            due = self._pending_n >= STATS_FLUSH_EVERY
+        if due:
+            # pool workers exit without running atexit, so counts are flushed as they go
+            self.flush_stats()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connect().execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def put(self, key: str, namespace: str, version: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False, default=str)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR IGNORE INTO entries (key, namespace, version, value, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, namespace, version, payload, datetime.utcnow().isoformat() + "Z"),
+            )
+            conn.commit()
+
+    def classify(self, namespace: str, version: str, text: str, classify_fn: Callable[[str], Any]) -> Any:
+        """
+        classify_fn(normalized text), memoized. The value comes back as stored JSON
+        (tuples become lists), so callers convert back where the type matters.
+        """
+        normalized = normalize_clause_text(text or "")
+        key = cache_key(namespace, version, normalized)
+        try:
+            value = self.get(key)
+        except sqlite3.Error as e:
+            logger.warning("Classification cache lookup failed (%s): %s", self.path, e)
+            return classify_fn(normalized)
+        if value is not None:
+            self._count(namespace, "hits")
+            return value
+
+        self._count(namespace, "misses")
+        value = classify_fn(normalized)
+        try:
+            self.put(key, namespace, version, value)
+        except sqlite3.Error as e:
+            logger.warning("Classification cache write failed (%s): %s", self.path, e)
+        return json.loads(json.dumps(value, ensure_ascii=False, default=str))
+
+    # ----------------- STATISTICS -----------------
+    def flush_stats(self) -> None:
+        """Add this process's pending hit / miss counts to the persisted totals."""
+        with self._lock:
+            if not self._pending or self._conn is None or self._pid != os.getpid():
+                return
+            pending, self._pending, self._pending_n = self._pending, {}, 0
+            try:
+                for namespace, counts in pending.items():
+                    self._conn.execute(
+                        "INSERT INTO stats (namespace, hits, misses) VALUES (?, ?, ?) "
+                        "ON CONFLICT(namespace) DO UPDATE SET hits = hits + excluded.hits, "
+                        "misses = misses + excluded.misses",
+                        (namespace, counts["hits"], counts["misses"]),
+                    )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning("Could not persist classification cache stats: %s", e)
+
+    def stats(self, persisted: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Per-namespace hits, misses and hit_rate (this process, or all runs if persisted)."""
+        if persisted:
+            self.flush_stats()
+            with self._lock:
+                conn = self._connect()
+                rows = conn.execute("SELECT namespace, hits, misses FROM stats").fetchall()
+                entries = dict(conn.execute("SELECT namespace, COUNT(*) FROM entries GROUP BY namespace").fetchall())
+            counts = {ns: {"hits": h, "misses": m} for ns, h, m in rows}
+        else:
+            counts = {ns: dict(c) for ns, c in self._totals.items()}
+            entries = None
+
+        out: Dict[str, Dict[str, Any]] = {}
+        for namespace, c in sorted(counts.items()):
+            looked_up = c["hits"] + c["misses"]
+            out[namespace] = {**c, "hit_rate": round(c["hits"] / looked_up, 4) if looked_up else None}
+            if entries is not None:
+                out[namespace]["entries"] = entries.get(namespace, 0)
+        return out
+
+
+_cache: Optional[ClassificationCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[ClassificationCache]:
+    """Process-wide cache at CLASSIFICATION_CACHE_PATH, or None when disabled."""
+    global _cache
+    if CLASSIFICATION_CACHE_PATH.strip().lower() in ("", "off", "0", "none"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ClassificationCache(CLASSIFICATION_CACHE_PATH)
+            atexit.register(_cache.flush_stats)
+        return _cache
+
+
+def classify_cached(namespace: str, version: str, text: str, classify_fn: Callable[[str], Any]) -> Any:
+    """classify_fn on the normalized text, through the shared cache when it is enabled."""
+    cache = get_cache()
+    if cache is None:
+        return classify_fn(normalize_clause_text(text or ""))
+    return cache.classify(namespace, version, text, classify_fn)
+
+
+if __name__ == "__main__":
+    cache = get_cache()
+    if cache is None:
+        print("Classification cache is disabled (CLASSIFICATION_CACHE_PATH).")
+    else:
+        print(json.dumps({"path": cache.path, "namespaces": cache.stats(persisted=True)}, indent=2))
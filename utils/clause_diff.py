@@ -0,0 +1,139 @@
+# utils/clause_diff.py
+"""
+Clause Diff
+-----------
+- Matches the clauses of a new DCR edition against the clauses already ingested for
+  the city: first by clause number, then (for what is left, e.g. renumbered or
+  unnumbered clauses) by text similarity with difflib
+- Texts are compared whitespace-normalized (utils.classification_cache), so reflowed
+  lines or a different extractor do not show up as amendments
+- The result is a change set: inserted / modified / removed clauses plus the number
+  left unchanged; callers write only the change set, so an amendment costs O(changes)
+
+Environment variables:
+- CLAUSE_DIFF_SIMILARITY : minimum difflib ratio for a similarity match (default: 0.8)
+
+Usage:
+  from utils.clause_diff import diff_clauses
+
+  changes = diff_clauses(existing_rules, new_rules)
+  changes["inserted"]   # [new clause, ...]
+  changes["modified"]   # [{"old": stored rule, "new": clause, "similarity": 0.93, "matched_by": "clause_no"}]
+  changes["removed"]    # [stored rule, ...]
+  changes["unchanged"]  # int
+"""
+import os
+from collections import defaultdict, deque
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.classification_cache import normalize_clause_text
+
+CLAUSE_DIFF_SIMILARITY = float(os.getenv("CLAUSE_DIFF_SIMILARITY", "0.8"))
+
+Clause = Dict[str, Any]
+
+
+def _norm(clause: Clause) -> str:
+    return normalize_clause_text(clause.get("text") or "")
+
+
+def _similarity(a: str, b: str, threshold: float) -> Optional[float]:
+    """difflib ratio, or None when the cheap upper bounds already rule the pair out."""
+    sm = SequenceMatcher(None, a, b, autojunk=False)
+    if sm.real_quick_ratio() < threshold or sm.quick_ratio() < threshold:
+        return None
+    ratio = sm.ratio()
+    return ratio if ratio >= threshold else None
+
+
+def _modified(old: Clause, new: Clause, similarity: float, matched_by: str) -> Dict[str, Any]:
+    return {"old": old, "new": new, "similarity": round(similarity, 4), "matched_by": matched_by}
+
+
+def diff_clauses(old: Sequence[Clause], new: Sequence[Clause],
+                 threshold: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Change set turning `old` (stored rules) into `new` (freshly parsed clauses).
+    Repeated clause numbers are paired in document order.
+    """
+    threshold = CLAUSE_DIFF_SIMILARITY if threshold is None else threshold
+    old_norm = [_norm(c) for c in old]
+    new_norm = [_norm(c) for c in new]
+    modified: List[Dict[str, Any]] = []
+    unchanged = 0
+
+    # ----------------- PASS 1: CLAUSE NUMBER -----------------
+    by_no = defaultdict(deque)
+    for i, c in enumerate(old):
+        if c.get("clause_no") is not None:
+            by_no[str(c["clause_no"])].append(i)
+    matched_old = set()
+    unmatched_new: List[int] = []
+    for j, c in enumerate(new):
+        queue = by_no.get(str(c.get("clause_no"))) if c.get("clause_no") is not None else None
+        if not queue:
+            unmatched_new.append(j)
+            continue
+        i = queue.popleft()
+        matched_old.add(i)
+        if old_norm[i] == new_norm[j]:
+            unchanged += 1
+        else:
+            ratio = SequenceMatcher(None, old_norm[i], new_norm[j], autojunk=False).ratio()
+            modified.append(_modified(old[i], new[j], ratio, "clause_no"))
+
+    # ----------------- PASS 2: TEXT SIMILARITY -----------------
+    unmatched_old = [i for i in range(len(old)) if i not in matched_old]
+    by_text = defaultdict(deque)
+    for i in unmatched_old:
+        by_text[old_norm[i]].append(i)
+    remaining_new: List[int] = []
+    for j in unmatched_new:
+        queue = by_text.get(new_norm[j])
+        if not queue:
+            remaining_new.append(j)
+            continue
+        i = queue.popleft()
+        matched_old.add(i)
+        if old[i].get("clause_no") == new[j].get("clause_no"):
+            unchanged += 1
+        else:
+            modified.append(_modified(old[i], new[j], 1.0, "text"))  # renumbered
+
+    candidates = []
+    for j in remaining_new:
+        for i in unmatched_old:
+            if i in matched_old:
+                continue
+            ratio = _similarity(old_norm[i], new_norm[j], threshold)
+            if ratio is not None:
+                candidates.append((-ratio, j, i))
+    taken_new = set()
+    for neg_ratio, j, i in sorted(candidates):
+        if j in taken_new or i in matched_old:
+            continue
+        taken_new.add(j)
+        matched_old.add(i)
+        modified.append(_modified(old[i], new[j], -neg_ratio, "similarity"))
+    inserted = [j for j in remaining_new if j not in taken_new]
+
+    return {
+        "inserted": [new[j] for j in inserted],
+        "modified": modified,
+        "removed": [old[i] for i in range(len(old)) if i not in matched_old],
+        "unchanged": unchanged,
+    }
+
+
+def summarize(changes: Dict[str, Any]) -> Dict[str, Any]:
+    """Counts plus the clause numbers touched, for logs and the documents record."""
+    return {
+        "inserted": len(changes["inserted"]),
+        "modified": len(changes["modified"]),
+        "removed": len(changes["removed"]),
+        "unchanged": changes["unchanged"],
+        "inserted_clauses": [c.get("clause_no") for c in changes["inserted"]],
+        "modified_clauses": [m["new"].get("clause_no") for m in changes["modified"]],
+        "removed_clauses": [c.get("clause_no") for c in changes["removed"]],
+    }
@@ -0,0 +1,187 @@
+# utils/clause_stream.py
+"""
+Streaming Clause Segmentation
+-----------------------------
+- Line-oriented state machine over an iterable of (page_no, text) pages: each line is
+  looked at once, so segmentation is linear in document size (no DOTALL look-ahead scans)
+- A clause that runs over a page break is carried into the next page; clauses are
+  yielded as soon as the next marker (or the end of the document) closes them
+- Every clause keeps its provenance: page_start / page_end (1-based)
+- Memory holds one page plus the clause being built (and, before the first Clause
+  marker, at most CLAUSE_HOLD_MAX_CHARS of held clauses); a clause longer than
+  CLAUSE_MAX_CHARS is yielded in parts flagged "continued"
+
+Segmentation rules (same output as parsing_agent.find_clauses, line by line):
+- "Clause 12.3: ..." / "Section 4 - ..." at the start of a line opens a clause
+- Before any Clause/Section marker, a numbered heading ("12.3) ...", "4. ...") opens a
+  clause; once markers are in use, a numbered line closes the open clause instead
+- Until the first marker of either kind, blank-line separated paragraphs longer than
+  60 characters become clauses with clause_no None (documents without numbering)
+- find_clauses uses headings only when there are no Clause/Section markers, and
+  paragraphs only when there are neither, so everything found before the first
+  Clause/Section marker is held back: it is dropped when a marker turns up and yielded
+  by finish() otherwise
+- The held text is capped at CLAUSE_HOLD_MAX_CHARS. Past the cap the segmenter commits:
+  the held clauses are yielded and the rest of the document is streamed. This is where
+  it can differ from find_clauses: a Clause/Section marker (or a first heading, for a
+  paragraph document) after the cap no longer discards what came before, so such a
+  document keeps both its early headings / paragraphs and its later clauses. Documents
+  whose first marker shows up before the cap, and all documents when the cap is 0,
+  segment exactly as find_clauses does
+
+Environment variables:
+- CLAUSE_MAX_CHARS       : split clauses longer than this (default: 200000)
+- CLAUSE_HOLD_MAX_CHARS  : stream heading / paragraph clauses once this much text is held
+                           waiting for a possible Clause marker (default: 2000000, 0 = never)
+
+Usage:
+  from utils.pdf_extract import iter_pages
+  from utils.clause_stream import iter_clauses
+
+  for clause in iter_clauses(iter_pages("data/DCPR_2034.pdf")):
+      clause["clause_no"], clause["text"], clause["page_start"], clause["page_end"]
+"""
+import os
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+CLAUSE_MAX_CHARS = int(os.getenv("CLAUSE_MAX_CHARS", "200000"))
+CLAUSE_HOLD_MAX_CHARS = int(os.getenv("CLAUSE_HOLD_MAX_CHARS", "2000000"))
+MIN_PARAGRAPH_CHARS = 60
+
+CLAUSE_START_RE = re.compile(r"^\s*(?:Clause|Section)\s*([0-9]+(?:\.[0-9]+)*)\s*[:.\-]?\s*(.*)$", re.IGNORECASE)
+HEADING_RE = re.compile(r"^\s*(\d+(?:\.\d+)*)\s*[).:-]\s*(.+)$")
+NUMBERED_LINE_RE = re.compile(r"^\d+\.")
+
+Clause = Dict[str, Any]
+
+
+class ClauseSegmenter:
+    """Incremental segmenter: feed(page_no, text) yields the clauses each page completes."""
+
+    def __init__(self, max_chars: Optional[int] = None, hold_max_chars: Optional[int] = None):
+        self.max_chars = CLAUSE_MAX_CHARS if max_chars is None else max_chars
+        self.hold_max_chars = CLAUSE_HOLD_MAX_CHARS if hold_max_chars is None else hold_max_chars
+        self.mode: Optional[str] = None  # None (no markers yet) / "heading" / "clause"
+        self._no: Optional[str] = None
+        self._lines: List[str] = []
+        self._size = 0
+        self._start: Optional[int] = None
+        self._end: Optional[int] = None
+        self._open = False  # a numbered clause is being built
+        self._continued = False
+        self._held: List[Clause] = []  # headings / paragraphs seen before any Clause marker
+        self._held_chars = 0
+        self._committed = False  # hold cap reached: everything is streamed from here on
+
+    # ----------------- CLAUSE BUFFER -----------------
+    def _begin(self, clause_no: Optional[str], first: str, page_no: int) -> None:
+        self._no, self._lines, self._size = clause_no, [], 0
+        self._start = self._end = page_no
+        self._open = clause_no is not None
+        self._continued = False
+        if first:
+            self._append(first, page_no)
+
+    def _append(self, line: str, page_no: int) -> None:
+        self._lines.append(line)
+        self._size += len(line) + 1
+        self._end = page_no
+
+    def _flush(self) -> Optional[Clause]:
+        text = "\n".join(self._lines).strip()
+        clause = None
+        if self._open:
+            if text:
+                clause = {"clause_no": self._no, "text": text, "page_start": self._start, "page_end": self._end}
+        elif len(text) > MIN_PARAGRAPH_CHARS:
+            clause = {"clause_no": None, "text": text, "page_start": self._start, "page_end": self._end}
+        if clause is not None and self._continued:
+            clause["continued"] = True
+        self._lines, self._size, self._start = [], 0, None
+        return clause
+
+    def _emit(self, clause: Optional[Clause]) -> Iterator[Clause]:
+        if clause is None:
+            return
+        if self.mode == "clause" or self._committed:
+            yield clause
+            return
+        self._held.append(clause)
+        self._held_chars += len(clause["text"])
+        if self.hold_max_chars and self._held_chars >= self.hold_max_chars:
+            # stop waiting for a Clause marker; what is held is final from here on
+            self._committed = True
+            held, self._held, self._held_chars = self._held, [], 0
+            yield from held
+
+    def _close(self) -> Iterator[Clause]:
+        yield from self._emit(self._flush())
+        self._open = False
+        self._no = None
+
+    def _switch(self, mode: str) -> None:
+        """Move to a stronger mode; what the weaker one found is discarded, as in find_clauses."""
+        if self.mode != mode:
+            self.mode = mode
+            self._held, self._held_chars = [], 0
+
+    # ----------------- STATE MACHINE -----------------
+    def feed(self, page_no: int, text: str) -> Iterator[Clause]:
+        for raw in text.splitlines():
+            line = raw.rstrip()
+            m = CLAUSE_START_RE.match(line)
+            if m:
+                yield from self._close()
+                self._switch("clause")
+                self._begin(m.group(1).strip(), m.group(2).strip(), page_no)
+                continue
+
+            if self.mode != "clause":
+                h = HEADING_RE.match(line)
+                if h:
+                    yield from self._close()
+                    self._switch("heading")
+                    self._begin(h.group(1).strip(), h.group(2).strip(), page_no)
+                    # a heading clause is its own line, as in find_clauses
+                    yield from self._close()
+                    continue
+            elif NUMBERED_LINE_RE.match(line):
+                yield from self._close()
+                continue
+
+            if self._open:
+                self._append(line, page_no)
+                if self._size >= self.max_chars:
+                    yield from self._emit(self._flush())
+                    self._start, self._continued = page_no, True
+            elif self.mode is None:
+                # paragraph fallback for documents without any numbering so far
+                if line.strip():
+                    if self._start is None:
+                        self._start = page_no
+                    self._append(line, page_no)
+                    if self._size >= self.max_chars:
+                        yield from self._close()
+                else:
+                    yield from self._close()
+
+    def finish(self) -> Iterator[Clause]:
+        yield from self._close()
+        held, self._held, self._held_chars = self._held, [], 0
+        yield from held
+
+
+def iter_clauses(pages: Iterable[Tuple[int, str]], max_chars: Optional[int] = None,
+                 hold_max_chars: Optional[int] = None) -> Iterator[Clause]:
+    """Clauses from (page_no, text) pages, yielded as they complete."""
+    segmenter = ClauseSegmenter(max_chars, hold_max_chars)
+    for page_no, text in pages:
+        yield from segmenter.feed(page_no, text)
+    yield from segmenter.finish()
+
+
+def stream_pdf_clauses(pdf_path: str, workers: Optional[int] = None) -> Iterator[Clause]:
+    """Extract pages in parallel (utils.pdf_extract) and segment them as they arrive."""
+    from utils.pdf_extract import iter_pages
+    return iter_clauses(iter_pages(pdf_path, workers=workers))
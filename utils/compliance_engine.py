@@ -0,0 +1,388 @@
+# utils/compliance_engine.py
+"""
+Vectorized Compliance Engine
+----------------------------
+- Compiles a city's rules once into NumPy arrays (category code, operator code, threshold)
+- Evaluates an N x M subject-by-rule matrix in one pass instead of per-subject Python loops
+- Two rule flavours are supported:
+    * classified rules   -> same statuses / scores as evaluator_agent.evaluate_project
+    * calculator rules   -> same height / fsi checks as calculator_agent.calculator_agent
+
+Usage:
+  from utils.compliance_engine import compile_classified_rules, subjects_matrix, evaluate_matrix
+
+  ruleset = compile_classified_rules(classified_rule_docs)
+  subjects = subjects_matrix([p["parameters"] for p in projects])
+  result = evaluate_matrix(subjects, ruleset)
+  result.statuses        # (N, M) int8 status codes
+  result.overall_score   # (N,) float, rounded like evaluate_project
+"""
+import os
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from utils.rule_predicates import height_fsi_constraints
+
+# Partial tolerance multiplier: if proposed <= allowed * TOLERANCE => Partial
+PARTIAL_TOLERANCE = float(os.getenv("EVAL_PARTIAL_TOLERANCE", "1.10"))  # 10% default
+
+# ----------------- CODES -----------------
+# Category codes double as the column index into the subject matrix.
+CAT_OTHER = -1
+CAT_HEIGHT, CAT_FSI, CAT_SETBACK, CAT_FLOORS, CAT_PARKING, CAT_COVERAGE = range(6)
+
+# Subject matrix columns (same order as the category codes above)
+SUBJECT_FIELDS = ("height_m", "fsi", "setback_m", "floors", "parking", "coverage")
+# Canonical category names (same order), used when aggregating by category
+CATEGORY_NAMES = ("height", "fsi", "setback", "floors", "parking", "coverage")
+
+CATEGORY_ALIASES: Dict[str, int] = {
+    "height": CAT_HEIGHT, "building_height": CAT_HEIGHT, "max_height": CAT_HEIGHT, "height_candidate": CAT_HEIGHT,
+    "fsi": CAT_FSI, "far": CAT_FSI, "floor_space_index": CAT_FSI,
+    "setback": CAT_SETBACK, "setbacks": CAT_SETBACK,
+    "floors": CAT_FLOORS, "storeys": CAT_FLOORS, "floor_count": CAT_FLOORS,
+    "parking": CAT_PARKING,
+    "coverage": CAT_COVERAGE, "site_coverage": CAT_COVERAGE, "ground_coverage": CAT_COVERAGE,
+}
+
+# parsed_fields keys probed (in order) for the allowed value of each category
+ALLOWED_KEYS: Dict[int, List[str]] = {
+    CAT_HEIGHT: ["height_m", "value", "candidate_m", "max_height"],
+    CAT_FSI: ["fsi", "value", "allowed_fsi"],
+    CAT_SETBACK: ["setback_m", "value", "setback_candidate_m"],
+    CAT_FLOORS: ["floors", "value"],
+    CAT_PARKING: ["value", "parking_required", "parking_spaces"],
+    CAT_COVERAGE: ["value", "coverage_percent", "allowed_coverage"],
+}
+
+OP_NONE, OP_LE, OP_LT, OP_GE, OP_GT, OP_EQ = -1, 0, 1, 2, 3, 4
+OPERATORS: Dict[str, int] = {"<=": OP_LE, "<": OP_LT, ">=": OP_GE, ">": OP_GT, "=": OP_EQ}
+
+# Per-rule status codes; anything >= ST_COMPLIANT counts as applicable
+ST_NOT_APPLICABLE, ST_INFORMATIONAL, ST_COMPLIANT, ST_PARTIAL, ST_NON_COMPLIANT = range(5)
+STATUS_NAMES = ("NOT_APPLICABLE", "INFORMATIONAL", "COMPLIANT", "PARTIAL", "NON_COMPLIANT")
+
+OVERALL_COMPLIANT, OVERALL_PARTIAL, OVERALL_NON_COMPLIANT = range(3)
+OVERALL_NAMES = ("COMPLIANT", "PARTIALLY_COMPLIANT", "NON_COMPLIANT")
+
+# Calculator check codes (None / False / True in calculator_agent outcomes)
+CHECK_NONE, CHECK_FAIL, CHECK_OK = -1, 0, 1
+
+
+# ----------------- SCALAR HELPERS -----------------
+def to_number(v: Any) -> Optional[float]:
+    """Try to coerce v into float, return None if impossible."""
+    if v is None:
+        return None
+    if isinstance(v, (int, float)):
+        return float(v)
+    try:
+        # protect against Decimal strings
+        if isinstance(v, Decimal):
+            return float(v)
+        return float(str(v).strip())
+    except (ValueError, TypeError, InvalidOperation):
+        return None
+
+
+def pick_best_value(parsed_fields: Dict[str, Any], keys: List[str]) -> Optional[float]:
+    """Given parsed_fields and list of candidate keys, return first numeric value found."""
+    for k in keys:
+        if k in parsed_fields:
+            val = to_number(parsed_fields[k])
+            if val is not None:
+                return val
+    return None
+
+
+def proposed_values(params: Dict[str, Any]) -> Dict[str, Optional[float]]:
+    """Normalise project parameters to the numeric fields the rules are compared against."""
+    return {
+        "height_m": to_number(params.get("height_m")),
+        "fsi": to_number(params.get("fsi")),
+        "setback_m": to_number(params.get("setback_m")),
+        "floors": to_number(params.get("floors")),
+        "parking": to_number(params.get("parking_spaces") or params.get("parking")),
+        "coverage": to_number(params.get("coverage_percent") or params.get("coverage")),
+    }
+
+
+def _nan_or(v: Optional[float]) -> float:
+    return np.nan if v is None else v
+
+
+def _none_or(v: float) -> Optional[float]:
+    return None if np.isnan(v) else float(v)
+
+
+# ----------------- COMPILED RULE SETS -----------------
+@dataclass
+class CompiledRuleSet:
+    """Column-oriented view of M classified rules."""
+    rule_ids: List[str]
+    categories: List[str]          # original category spelling, echoed in results
+    rule_texts: List[str]
+    category_codes: np.ndarray     # (M,) int8, CAT_*
+    operator_codes: np.ndarray     # (M,) int8, OP_*
+    thresholds: np.ndarray         # (M,) float64, NaN when no numeric value
+
+    def __len__(self) -> int:
+        return len(self.rule_ids)
+
+
+@dataclass
+class CalculatorRuleSet:
+    """Column-oriented view of M calculator (MCP) rules: one height and one fsi constraint each."""
+    rule_ids: List[Any]
+    clause_nos: List[Any]
+    height_rules: List[Any]        # raw parsed height dicts, echoed in outcomes
+    fsi_rules: List[Any]           # raw parsed fsi values, echoed in outcomes
+    height_ops: np.ndarray         # (M,) int8, OP_NONE when the rule has no height constraint
+    height_thresholds: np.ndarray  # (M,) float64
+    has_height: np.ndarray         # (M,) bool, rule carries a (truthy) height constraint
+    fsi_thresholds: np.ndarray     # (M,) float64, NaN when not numeric
+    has_fsi: np.ndarray            # (M,) bool, rule carries a (truthy) fsi constraint
+
+    def __len__(self) -> int:
+        return len(self.rule_ids)
+
+
+def classified_rule_fields(rule: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the shape-agnostic fields of one classified rule doc."""
+    category = rule.get("category") or rule.get("rule_type") or rule.get("type") or "other"
+    parsed = rule.get("details") or rule.get("parsed_fields") or rule.get("parsed") or {}
+    code = CATEGORY_ALIASES.get(category.lower(), CAT_OTHER)
+    return {
+        "rule_id": str(rule.get("_id")),
+        "category": category,
+        "category_code": code,
+        "allowed": pick_best_value(parsed, ALLOWED_KEYS[code]) if code != CAT_OTHER else None,
+        "rule_text": rule.get("original_text") or rule.get("text") or rule.get("full_text") or rule.get("summary") or "",
+    }
+
+
+def compile_classified_rules(rules: Sequence[Dict[str, Any]]) -> CompiledRuleSet:
+    """Compile classified_rules docs into arrays. All classified limits are maxima (<=)."""
+    fields = [classified_rule_fields(r) for r in rules]
+    return CompiledRuleSet(
+        rule_ids=[f["rule_id"] for f in fields],
+        categories=[f["category"] for f in fields],
+        rule_texts=[f["rule_text"] for f in fields],
+        category_codes=np.array([f["category_code"] for f in fields], dtype=np.int8),
+        operator_codes=np.full(len(fields), OP_LE, dtype=np.int8),
+        thresholds=np.array([_nan_or(f["allowed"]) for f in fields], dtype=np.float64),
+    )
+
+
+def compile_calculator_rules(rules: Sequence[Dict[str, Any]]) -> CalculatorRuleSet:
+    """
+    Compile MCP rules (as returned by get_rules_for_city) into arrays. Compiled without
+    a subject, so guarded limits ("for plots above 500 sqm") are left out; this matches
+    calculator_agent for subjects that carry only height_m / fsi.
+    """
+    rule_ids, clause_nos, height_rules, fsi_rules = [], [], [], []
+    height_ops, height_thr, has_height, fsi_thr, has_fsi = [], [], [], [], []
+
+    for r in rules:
+        rule_obj = r.get("rule", r)  # some endpoints return wrapped
+        height_rule, fsi_rule = height_fsi_constraints(r)
+
+        rule_ids.append(r.get("id"))
+        clause_nos.append(rule_obj.get("clause_no"))
+        height_rules.append(height_rule)
+        fsi_rules.append(fsi_rule)
+
+        has_height.append(bool(height_rule))
+        if height_rule:
+            height_ops.append(OPERATORS.get(height_rule.get("op"), OP_NONE))
+            height_thr.append(_nan_or(to_number(height_rule.get("value_m"))))
+        else:
+            height_ops.append(OP_NONE)
+            height_thr.append(np.nan)
+
+        has_fsi.append(bool(fsi_rule))
+        try:
+            fsi_thr.append(float(fsi_rule) if fsi_rule else np.nan)
+        except Exception:
+            fsi_thr.append(np.nan)
+
+    return CalculatorRuleSet(
+        rule_ids=rule_ids,
+        clause_nos=clause_nos,
+        height_rules=height_rules,
+        fsi_rules=fsi_rules,
+        height_ops=np.array(height_ops, dtype=np.int8),
+        height_thresholds=np.array(height_thr, dtype=np.float64),
+        has_height=np.array(has_height, dtype=bool),
+        fsi_thresholds=np.array(fsi_thr, dtype=np.float64),
+        has_fsi=np.array(has_fsi, dtype=bool),
+    )
+
+
+# ----------------- SUBJECT MATRICES -----------------
+def subjects_matrix(params_list: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Build the (N, len(SUBJECT_FIELDS)) float matrix from project parameter dicts; NaN = missing."""
+    out = np.full((len(params_list), len(SUBJECT_FIELDS)), np.nan, dtype=np.float64)
+    for i, params in enumerate(params_list):
+        proposed = proposed_values(params or {})
+        for j, field in enumerate(SUBJECT_FIELDS):
+            v = proposed[field]
+            if v is not None:
+                out[i, j] = v
+    return out
+
+
+def subjects_from_columns(columns: Mapping[str, Any], n: Optional[int] = None) -> np.ndarray:
+    """Build the subject matrix from already-numeric columns (dict of arrays or a DataFrame)."""
+    if n is None:
+        n = len(next(iter(columns.values()))) if len(columns) else 0
+    out = np.full((n, len(SUBJECT_FIELDS)), np.nan, dtype=np.float64)
+    for j, field in enumerate(SUBJECT_FIELDS):
+        if field in columns:
+            out[:, j] = np.asarray(columns[field], dtype=np.float64)
+    return out
+
+
+# ----------------- VECTORIZED EVALUATION -----------------
+@dataclass
+class MatrixResult:
+    statuses: np.ndarray          # (N, M) int8, ST_*
+    applicable_count: np.ndarray  # (N,) int
+    overall_score: np.ndarray     # (N,) float64, rounded to 2 places
+    overall_status: np.ndarray    # (N,) int8, OVERALL_*
+
+
+def _apply_op(op: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    if op == OP_LE:
+        return left <= right
+    if op == OP_LT:
+        return left < right
+    if op == OP_GE:
+        return left >= right
+    if op == OP_GT:
+        return left > right
+    if op == OP_EQ:
+        return left == right
+    return np.zeros(np.broadcast(left, right).shape, dtype=bool)
+
+
+def _round2(values: np.ndarray) -> np.ndarray:
+    """Python round(x, 2) semantics; scores only take a handful of distinct values."""
+    if values.size == 0:
+        return values
+    uniq, inverse = np.unique(values, return_inverse=True)
+    return np.array([round(float(u), 2) for u in uniq], dtype=np.float64)[inverse.reshape(values.shape)]
+
+
+def evaluate_matrix(subjects: np.ndarray, ruleset: CompiledRuleSet,
+                    tolerance: float = PARTIAL_TOLERANCE) -> MatrixResult:
+    """
+    Evaluate N subjects against M compiled classified rules.
+    Mirrors evaluator_agent.compare_numeric / evaluate_project cell for cell.
+    """
+    n, m = subjects.shape[0], len(ruleset)
+    codes = ruleset.category_codes
+    handled = codes != CAT_OTHER
+
+    # (N, M) proposed values: pick the subject column each rule's category compares against
+    proposed = np.full((n, m), np.nan, dtype=np.float64)
+    if handled.any():
+        proposed[:, handled] = subjects[:, codes[handled]]
+    allowed = ruleset.thresholds[np.newaxis, :]
+    missing = np.isnan(proposed) | np.isnan(allowed)
+
+    compliant = np.zeros((n, m), dtype=bool)
+    partial = np.zeros((n, m), dtype=bool)
+    for op in np.unique(ruleset.operator_codes):
+        cols = ruleset.operator_codes == op
+        p, a = proposed[:, cols], allowed[:, cols]
+        compliant[:, cols] = _apply_op(int(op), p, a)
+        if op in (OP_LE, OP_LT):
+            partial[:, cols] = p <= a * tolerance
+        elif op in (OP_GE, OP_GT):
+            partial[:, cols] = p >= a / tolerance
+
+    statuses = np.full((n, m), ST_NON_COMPLIANT, dtype=np.int8)
+    statuses[partial] = ST_PARTIAL
+    statuses[compliant] = ST_COMPLIANT
+    statuses[missing] = ST_NOT_APPLICABLE
+    statuses[:, ~handled] = ST_INFORMATIONAL
+
+    applicable = statuses >= ST_COMPLIANT
+    applicable_count = applicable.sum(axis=1)
+    score_sum = (statuses == ST_COMPLIANT).sum(axis=1) + 0.5 * (statuses == ST_PARTIAL).sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where(applicable_count > 0, score_sum / np.maximum(applicable_count, 1), 0.0)
+    overall_score = _round2(ratio)
+
+    overall_status = np.full(n, OVERALL_NON_COMPLIANT, dtype=np.int8)
+    overall_status[overall_score >= 0.5] = OVERALL_PARTIAL
+    overall_status[overall_score >= 0.9] = OVERALL_COMPLIANT
+
+    return MatrixResult(statuses, applicable_count, overall_score, overall_status)
+
+
+def results_for_row(ruleset: CompiledRuleSet, subjects: np.ndarray, result: MatrixResult,
+                    row: int) -> List[Dict[str, Any]]:
+    """Expand one subject's row into evaluate_project's per-rule `results` list."""
+    out = []
+    statuses = result.statuses[row]
+    for j, rule_id in enumerate(ruleset.rule_ids):
+        code = int(ruleset.category_codes[j])
+        handled = code != CAT_OTHER
+        out.append({
+            "rule_id": rule_id,
+            "category": ruleset.categories[j],
+            "rule_text": ruleset.rule_texts[j],
+            "allowed": _none_or(ruleset.thresholds[j]) if handled else None,
+            "proposed": _none_or(subjects[row, code]) if handled else None,
+            "status": STATUS_NAMES[statuses[j]],
+        })
+    return out
+
+
+def category_status_counts(result: MatrixResult, ruleset: CompiledRuleSet) -> Dict[str, Dict[str, int]]:
+    """
+    Count rule-check cells per canonical category and status over all subjects.
+    Informational (unhandled) rules are left out.
+    """
+    out: Dict[str, Dict[str, int]] = {}
+    for code, name in enumerate(CATEGORY_NAMES):
+        cols = ruleset.category_codes == code
+        if not cols.any():
+            continue
+        counts = np.bincount(result.statuses[:, cols].ravel(), minlength=len(STATUS_NAMES))
+        out[name] = {STATUS_NAMES[st]: int(counts[st])
+                     for st in (ST_COMPLIANT, ST_PARTIAL, ST_NON_COMPLIANT, ST_NOT_APPLICABLE)}
+    return out
+
+
+def evaluate_calculator_matrix(heights: np.ndarray, fsis: np.ndarray,
+                               ruleset: CalculatorRuleSet) -> Dict[str, np.ndarray]:
+    """
+    Evaluate N subjects (height_m, fsi columns; NaN = not provided) against M calculator rules.
+    Returns CHECK_* matrices for height and fsi plus the per-cell geometry status
+    (True when every non-None check passed), mirroring calculator_agent.
+    """
+    n, m = heights.shape[0], len(ruleset)
+    h = heights[:, np.newaxis]
+    f = fsis[:, np.newaxis]
+
+    height_ok = np.full((n, m), CHECK_NONE, dtype=np.int8)
+    has_h = ~np.isnan(h) & ruleset.has_height[np.newaxis, :]
+    passed = np.zeros((n, m), dtype=bool)
+    for op in np.unique(ruleset.height_ops):
+        cols = ruleset.height_ops == op
+        passed[:, cols] = _apply_op(int(op), h, ruleset.height_thresholds[np.newaxis, cols])
+    height_ok[has_h] = np.where(passed, CHECK_OK, CHECK_FAIL)[has_h]
+
+    fsi_ok = np.full((n, m), CHECK_NONE, dtype=np.int8)
+    fsi_valid = ruleset.has_fsi & ~np.isnan(ruleset.fsi_thresholds)
+    has_f = ~np.isnan(f) & fsi_valid[np.newaxis, :]
+    fsi_ok[has_f] = np.where(f <= ruleset.fsi_thresholds[np.newaxis, :], CHECK_OK, CHECK_FAIL)[has_f]
+
+    compliant = (height_ok != CHECK_FAIL) & (fsi_ok != CHECK_FAIL)
+    return {"height_ok": height_ok, "fsi_ok": fsi_ok, "compliant": compliant}
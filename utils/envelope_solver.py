@@ -0,0 +1,183 @@
+# utils/envelope_solver.py
+"""
+Buildable Envelope Solver
+-------------------------
+- Computes the maximum compliant height, floors, FSI and built-up area for a plot
+  in one call, instead of re-running calculator_agent with trial inputs
+- Every applicable compiled predicate (utils.rule_predicates) narrows an interval
+  [lo, hi] per metric; the envelope is derived analytically from the intersections
+- Reports which clauses bind each limit and any conflicting rules (empty intervals)
+
+Usage:
+  from utils.envelope_solver import solve_envelope
+
+  env = solve_envelope("Pune", width_m=30, depth_m=20, building_type="residential")
+  env["max_height_m"], env["max_floors"], env["max_fsi"], env["max_built_up_sqm"]
+"""
+import math
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from utils.rule_predicates import Predicate, compile_rule
+
+logger = logging.getLogger("EnvelopeSolver")
+
+INF = math.inf
+BUILDING_TYPES = {"residential", "commercial", "mixed-use", "mixed use", "mixed", "industrial", "institutional"}
+INTEGER_METRICS = {"floors", "parking"}
+
+
+class Interval:
+    """Closed interval [lo, hi] with clause provenance for each bound."""
+    __slots__ = ("lo", "hi", "lo_by", "hi_by")
+
+    def __init__(self, lo: float = 0.0, hi: float = INF):
+        self.lo = lo
+        self.hi = hi
+        self.lo_by: List[str] = []
+        self.hi_by: List[str] = []
+
+    def apply(self, op: str, value: float, source: str, integer: bool = False) -> None:
+        if op in ("<=", "<", "="):
+            hi = value - 1 if (op == "<" and integer) else value
+            if hi < self.hi:
+                self.hi, self.hi_by = hi, [source]
+            elif hi == self.hi:
+                self.hi_by.append(source)
+        if op in (">=", ">", "="):
+            lo = value + 1 if (op == ">" and integer) else value
+            if lo > self.lo:
+                self.lo, self.lo_by = lo, [source]
+            elif lo == self.lo and lo > 0:
+                self.lo_by.append(source)
+
+    @property
+    def empty(self) -> bool:
+        return self.lo > self.hi
+
+    def as_list(self) -> List[Optional[float]]:
+        return [self.lo, None if self.hi == INF else self.hi]
+
+
+def _applies_to(rule: Dict[str, Any], building_type: str) -> bool:
+    """Rules tagged with another building type are skipped; untagged / non-type tags apply to all."""
+    rule_obj = rule.get("rule", rule)
+    tag = (rule_obj.get("rule_type") or "").strip().lower()
+    if tag not in BUILDING_TYPES:
+        return True
+    wanted = building_type.strip().lower()
+    if tag.startswith("mixed") and wanted.startswith("mixed"):
+        return True
+    return tag == wanted
+
+
+def _guard_allows(pred: Predicate, known: Dict[str, float]) -> bool:
+    guard = pred.guard
+    if guard is None:
+        return True
+    value = known.get(guard.metric)
+    return True if value is None else guard.holds(value)
+
+
+def build_intervals(rules: Sequence[Dict[str, Any]], building_type: str,
+                    known: Dict[str, float]) -> Dict[str, Interval]:
+    """Intersect every applicable predicate into one Interval per metric."""
+    intervals: Dict[str, Interval] = {}
+    for r in rules:
+        if not _applies_to(r, building_type):
+            continue
+        rule_obj = r.get("rule", r)
+        source = str(rule_obj.get("clause_no") or r.get("id") or r.get("_id") or "unknown")
+        for pred in compile_rule(r).predicates:
+            if not _guard_allows(pred, known):
+                continue
+            iv = intervals.setdefault(pred.metric, Interval())
+            iv.apply(pred.op, pred.value, source, integer=pred.metric in INTEGER_METRICS)
+    return intervals
+
+
+def solve_envelope(city: str, width_m: float, depth_m: float, building_type: str = "residential",
+                   floor_height_m: float = 3.0, setback_m: float = 0.0,
+                   rules: Optional[Sequence[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Return the buildable envelope for a width x depth plot.
+    rules: MCP rule records; fetched with get_rules_for_city(city) when omitted.
+    setback_m: setback the designer intends to keep; the required minimum wins if larger.
+    """
+    if rules is None:
+        from agents.agent_clients import get_rules_for_city
+        rules = get_rules_for_city(city)
+
+    plot_area = width_m * depth_m
+    known = {"plot_area_sqm": plot_area, "plot_width_m": width_m, "plot_depth_m": depth_m}
+    intervals = build_intervals(rules, building_type, known)
+
+    def iv(metric: str) -> Interval:
+        return intervals.get(metric) or Interval()
+
+    conflicts = [
+        {"metric": m, "min": i.lo, "min_by": i.lo_by, "max": i.hi, "max_by": i.hi_by}
+        for m, i in intervals.items() if i.empty
+    ]
+
+    # footprint after setbacks (front/rear on depth, side margins on width) and coverage cap
+    setback = max(setback_m, iv("setback_m").lo)
+    side = max(setback, iv("side_margin_m").lo) if "side_margin_m" in intervals else setback
+    rear = max(setback, iv("rear_margin_m").lo) if "rear_margin_m" in intervals else setback
+    fp_width = max(0.0, width_m - 2 * side)
+    fp_depth = max(0.0, depth_m - setback - rear)
+    footprint = fp_width * fp_depth
+    coverage_hi = iv("coverage").hi
+    if coverage_hi != INF:
+        footprint = min(footprint, plot_area * coverage_hi / 100.0)
+
+    # floors: explicit cap and what the height cap allows
+    height_hi = iv("height_m").hi
+    floors_hi = iv("floors").hi
+    floors_by_height = math.floor(height_hi / floor_height_m + 1e-9) if height_hi != INF else INF
+    max_floors = min(floors_hi, floors_by_height)
+
+    # built-up area: FSI cap vs footprint stacked over the permitted floors
+    fsi_hi = iv("fsi").hi
+    area_by_fsi = fsi_hi * plot_area if fsi_hi != INF else INF
+    area_by_floors = footprint * max_floors if max_floors != INF else INF
+    max_built_up = min(area_by_fsi, area_by_floors)
+
+    if max_built_up == INF:
+        limited_by = None
+    elif area_by_fsi <= area_by_floors:
+        limited_by = "fsi"
+    elif max_floors == floors_hi:
+        limited_by = "floors"
+    else:
+        limited_by = "height"
+
+    # floors beyond what the FSI cap can fill add no area
+    if max_floors == INF and footprint > 0 and area_by_fsi != INF:
+        max_floors = math.ceil(area_by_fsi / footprint - 1e-9)
+    max_height = height_hi if height_hi != INF or max_floors == INF else max_floors * floor_height_m
+
+    def finite(v: float) -> Optional[float]:
+        return None if v == INF else round(v, 3)
+
+    result = {
+        "city": city,
+        "building_type": building_type,
+        "plot": {"width_m": width_m, "depth_m": depth_m, "area_sqm": plot_area},
+        "footprint": {"width_m": fp_width, "depth_m": fp_depth, "area_sqm": round(footprint, 3)},
+        "effective_setback_m": setback,
+        "max_height_m": finite(max_height),
+        "max_floors": None if max_floors == INF else int(max_floors),
+        "max_fsi": finite(max_built_up / plot_area) if plot_area and max_built_up != INF else None,
+        "max_built_up_sqm": finite(max_built_up),
+        "limited_by": limited_by,
+        "intervals": {m: i.as_list() for m, i in intervals.items()},
+        "binding": {m: {"min": i.lo_by, "max": i.hi_by} for m, i in intervals.items()},
+        "feasible": not conflicts and footprint > 0,
+        "conflicts": conflicts,
+        "rules_considered": len(rules),
+    }
+    logger.info("Envelope for %s (%s, %.1fx%.1f): height=%s floors=%s fsi=%s",
+                city, building_type, width_m, depth_m,
+                result["max_height_m"], result["max_floors"], result["max_fsi"])
+    return result
@@ -0,0 +1,180 @@
+# utils/evaluation_cache.py
+"""
+Evaluation Cache
+----------------
+- Memoizes evaluator results on a fingerprint of (engine version, city, normalized proposed
+  values, rule-set version, partial tolerance); projects with identical parameters in the
+  same city share one result
+- In-process LRU bounded by entry count and by approximate size (JSON-encoded bytes), so a
+  few rule sets with long rule texts cannot grow every worker without limit
+- Optionally backed by a persistent Mongo collection shared by all workers; get_many /
+  put_many read and write a whole batch in one round trip each
+- Entries never go stale: a reclassified rule set has a new version, a changed tolerance or
+  evaluation logic (ENGINE_VERSION) a new key prefix, hence new fingerprints
+
+Usage:
+  from utils.evaluation_cache import EvaluationCache, evaluation_fingerprint
+
+  cache = EvaluationCache(maxsize=4096, max_bytes=32 << 20, collection=db.get_collection("evaluation_cache"))
+  key = evaluation_fingerprint("Mumbai", proposed_values(params), ruleset_version)
+  hit = cache.get(key) or compute(...)
+  hits = cache.get_many(keys)           # {key: outcome} for the keys that were cached
+  cache.put_many([(key, outcome, {"city": "Mumbai"}), ...])
+"""
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from utils.compliance_engine import PARTIAL_TOLERANCE, SUBJECT_FIELDS
+
+logger = logging.getLogger("EvaluationCache")
+
+# bump when evaluation logic changes in a way that alters stored outcomes
+ENGINE_VERSION = "1"
+
+
+def evaluation_fingerprint(city: Any, proposed: Mapping[str, Optional[float]], version: str,
+                           tolerance: float = PARTIAL_TOLERANCE) -> str:
+    """Stable key for one evaluation input (proposed as returned by proposed_values)."""
+    payload = json.dumps([ENGINE_VERSION, city, [proposed.get(f) for f in SUBJECT_FIELDS], version, tolerance],
+                         default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _entry_size(value: Dict[str, Any]) -> int:
+    return len(json.dumps(value, default=str, separators=(",", ":")))
+
+
+class EvaluationCache:
+    """Thread-safe LRU of evaluation outcomes with an optional Mongo second level."""
+
+    def __init__(self, maxsize: int = 4096, collection=None, max_bytes: int = 32 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        size = _entry_size(value)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+            while len(self._entries) > self.maxsize or (self.max_bytes and self.nbytes > self.max_bytes):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value
+
+        if self.collection is not None:
+            try:
+                doc = self.collection.find_one({"_id": key})
+            except Exception as e:
+                logger.warning("Evaluation cache lookup failed: %s", e)
+                doc = None
+            if doc is not None:
+                value = doc.get("value")
+                self._remember(key, value)
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any], **meta: Any) -> None:
+        """Store an outcome; meta (e.g. city, ruleset_version) is kept alongside in Mongo."""
+        if self.maxsize <= 0:
+            return
+        self._remember(key, value)
+        if self.collection is not None:
+            try:
+                self.collection.update_one(
+                    {"_id": key},
+                    {"$setOnInsert": {"value": value, **meta, "created_at": datetime.utcnow().isoformat() + "Z"}},
+                    upsert=True,
+                )
+            except Exception as e:
+                logger.warning("Evaluation cache write failed: %s", e)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached outcomes for the given keys; LRU first, then one $in query for the rest."""
+        if self.maxsize <= 0:
+            return {}
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key)
+                if value is not None:
+                    found[key] = value
+
+        missing = [k for k in keys if k not in found]
+        if missing and self.collection is not None:
+            try:
+                docs = list(self.collection.find({"_id": {"$in": missing}}))
+            except Exception as e:
+                logger.warning("Evaluation cache lookup failed: %s", e)
+                docs = []
+            for doc in docs:
+                value = doc.get("value")
+                if value is not None:
+                    self._remember(doc["_id"], value)
+                    found[doc["_id"]] = value
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, Dict[str, Any], Mapping[str, Any]]]) -> None:
+        """Store (key, outcome, meta) triples; Mongo gets one unordered bulk of upserts."""
+        if self.maxsize <= 0:
+            return
+        ops: List[UpdateOne] = []
+        now = datetime.utcnow().isoformat() + "Z"
+        for key, value, meta in items:
+            self._remember(key, value)
+            if self.collection is not None:
+                ops.append(UpdateOne({"_id": key},
+                                     {"$setOnInsert": {"value": value, **meta, "created_at": now}}, upsert=True))
+        if ops:
+            try:
+                self.collection.bulk_write(ops, ordered=False)
+            except Exception as e:
+                logger.warning("Evaluation cache write failed: %s", e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+        self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "bytes": self.nbytes, "hits": self.hits, "misses": self.misses}
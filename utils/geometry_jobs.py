@@ -0,0 +1,153 @@
+# utils/geometry_jobs.py
+"""
+Background Geometry Jobs
+------------------------
+- Runs GLB export (json_to_glb) + MCP geometry logging in a background process pool
+- Callers get a job_id immediately and poll job_status(job_id) until the model is ready
+- Keeps compliance checks in the UI path free of 3D export latency
+- Job records are dropped with forget_jobs() when the caller is done with them;
+  finished jobs nobody forgot are pruned after GEOMETRY_JOB_TTL seconds
+
+Environment variables:
+- GEOMETRY_WORKERS : size of the process pool (default: 2)
+- GEOMETRY_JOB_TTL : seconds a finished job stays queryable (default: 3600)
+
+Usage:
+  from utils.geometry_jobs import submit_geometry_job, job_status
+
+  job_id = submit_geometry_job("rule_123", {"parameters": {...}, "status": "compliant"})
+  job_status(job_id)   # {"state": "running", ...} -> {"state": "done", "path": "outputs/geometry/rule_123.glb"}
+"""
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("GeometryJobs")
+
+GEOMETRY_WORKERS = int(os.getenv("GEOMETRY_WORKERS", "2"))
+GEOMETRY_JOB_TTL = float(os.getenv("GEOMETRY_JOB_TTL", "3600"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+_jobs: Dict[str, Dict[str, Any]] = {}
+
+
+def _run_geometry_job(case_id: str, geometry_spec: Dict[str, Any], output_dir: str) -> str:
+    """Worker: export the GLB and register it with MCP. Runs in a pool process."""
+    from utils.geometry_converter import json_to_glb
+    from agents.agent_clients import log_geometry
+
+    geom_path = json_to_glb(
+        json_path=f"{case_id}.json",  # Just for naming
+        output_dir=output_dir,
+        spec_data=geometry_spec
+    )
+    log_geometry(case_id, geom_path)
+    return geom_path
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=GEOMETRY_WORKERS)
+        return _executor
+
+
+def submit_geometry_job(case_id: str, geometry_spec: Dict[str, Any],
+                        output_dir: str = "outputs/geometry") -> str:
+    """Queue a geometry export and return its job id without waiting for it."""
+    job_id = uuid.uuid4().hex[:12]
+    prune_finished_jobs()
+    future = _get_executor().submit(_run_geometry_job, case_id, geometry_spec, output_dir)
+    with _lock:
+        _jobs[job_id] = {
+            "job_id": job_id,
+            "case_id": case_id,
+            "submitted_at": datetime.utcnow().isoformat() + "Z",
+            "future": future,
+        }
+    future.add_done_callback(lambda f, jid=job_id, cid=case_id: _log_done(jid, cid, f))
+    return job_id
+
+
+def _log_done(job_id: str, case_id: str, future: Future) -> None:
+    with _lock:
+        if job_id in _jobs:
+            _jobs[job_id]["finished_at"] = time.monotonic()
+    if future.cancelled():
+        return
+    err = future.exception()
+    if err is not None:
+        logger.error("Geometry job %s for %s failed: %s", job_id, case_id, err)
+    else:
+        logger.info("✅ Generated 3D geometry for %s: %s (job %s)", case_id, future.result(), job_id)
+
+
+def job_status(job_id: str) -> Dict[str, Any]:
+    """
+    Return {"job_id", "case_id", "state", "path", "error"} where state is one of
+    pending / running / done / failed / unknown.
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return {"job_id": job_id, "case_id": None, "state": "unknown", "path": None, "error": None}
+
+    future: Future = job["future"]
+    status = {"job_id": job_id, "case_id": job["case_id"], "state": "pending", "path": None, "error": None}
+    if future.done():
+        err = None if future.cancelled() else future.exception()
+        if future.cancelled() or err is not None:
+            status["state"] = "failed"
+            status["error"] = "cancelled" if future.cancelled() else str(err)
+        else:
+            status["state"] = "done"
+            status["path"] = future.result()
+    elif future.running():
+        status["state"] = "running"
+    return status
+
+
+def wait_for_jobs(job_ids: List[str], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Block until the given jobs finish (or timeout) and return their statuses."""
+    with _lock:
+        futures = [_jobs[j]["future"] for j in job_ids if j in _jobs]
+    wait(futures, timeout=timeout)
+    return [job_status(j) for j in job_ids]
+
+
+def forget_job(job_id: str) -> None:
+    with _lock:
+        _jobs.pop(job_id, None)
+
+
+def forget_jobs(job_ids: List[str]) -> None:
+    """Drop job records (running exports still finish; their status is just no longer kept)."""
+    with _lock:
+        for job_id in job_ids:
+            _jobs.pop(job_id, None)
+
+
+def prune_finished_jobs(ttl: Optional[float] = None) -> int:
+    """Drop jobs that finished more than ttl seconds ago; returns how many were dropped."""
+    ttl = GEOMETRY_JOB_TTL if ttl is None else ttl
+    cutoff = time.monotonic() - ttl
+    with _lock:
+        stale = [j for j, job in _jobs.items() if job.get("finished_at") is not None and job["finished_at"] <= cutoff]
+        for job_id in stale:
+            del _jobs[job_id]
+    return len(stale)
+
+
+def shutdown(wait_for_pending: bool = True) -> None:
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait_for_pending)
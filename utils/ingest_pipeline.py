@@ -0,0 +1,560 @@
+# utils/ingest_pipeline.py
+"""
+Staged Ingestion Pipeline
+-------------------------
+- One ingestion path for DCR PDFs: extract -> segment -> classify -> push, connected by bounded
+  queues; a full queue blocks its producer (backpressure), so memory stays bounded
+  however far extraction runs ahead of MongoDB
+- extract : page text via utils.pdf_extract (page ranges in a process pool, extraction
+            cache); INGEST_FILE_WORKERS threads each drive one file at a time
+- segment : one thread; clauses are segmented page by page (utils.clause_stream)
+- classify: one thread; clauses are classified (parsing_agent.classify_rule_text_cached,
+            memoized) and sent downstream in batches of INGEST_BATCH_SIZE rules, while
+            the segment stage already works on the next pages
+- a file that fails in any stage has its per-file state dropped there and its error
+  passed downstream
+- push    : INGEST_PUSH_WORKERS threads; insert_many per rule batch, then the local
+            JSON and the documents record once a file is complete. Rule batches of
+            one file are written while later pages (or the next file) are extracted;
+            the documents record (status "complete") is only inserted after all of
+            them are in, and a file whose extraction or any batch failed gets no
+            record and its batches already written are deleted again
+- diff jobs (parsing_agent --diff) hold their rules until the file is complete and
+  push only the change set against the file's previous edition (utils/clause_diff.py)
+- Every stage counts items in / out, busy time, time blocked on a full downstream
+  queue (backpressure) and time idle waiting for input
+
+Environment variables:
+- INGEST_QUEUE_SIZE   : capacity of each inter-stage queue (default: 64)
+- INGEST_BATCH_SIZE   : rules per insert_many (default: 200)
+- INGEST_FILE_WORKERS : files extracted concurrently (default: 1)
+- INGEST_PUSH_WORKERS : MongoDB writer threads (default: 4)
+
+Usage:
+  from utils.ingest_pipeline import ingest, ingest_pdf
+
+  parsed = ingest_pdf("data/DCPR_2034.pdf", "Mumbai")            # one file; raises on failure
+  run = ingest([("Mumbai", "a.pdf"), ("Pune", "b.pdf")])          # many files
+  run["results"], run["stats"]["stages"]["push"]["items_per_s"]
+"""
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from pathlib import Path
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+
+from utils.pdf_extract import PDF_EXTRACT_WORKERS, file_sha256, iter_pages
+from utils.clause_stream import ClauseSegmenter
+
+logger = logging.getLogger("IngestPipeline")
+
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "200"))
+INGEST_FILE_WORKERS = int(os.getenv("INGEST_FILE_WORKERS", "1"))
+INGEST_PUSH_WORKERS = int(os.getenv("INGEST_PUSH_WORKERS", "4"))
+
+_STOP = object()
+
+
+# ----------------- GENERIC STAGES -----------------
+class Stage:
+    """
+    fn(item, emit, count) run by `workers` threads. emit(x) hands x to the next stage
+    and blocks while that stage's queue is full; count(key, n) bumps a stage counter.
+    Exceptions from fn are logged and counted (fn is expected to turn per-item
+    failures into events itself).
+    """
+
+    def __init__(self, name: str, fn: Callable[..., None], workers: int = 1):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {"workers": self.workers, "items": 0, "emitted": 0, "errors": 0,
+                                      "busy_s": 0.0, "blocked_s": 0.0, "idle_s": 0.0}
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + n
+
+    def _add(self, key: str, value: float) -> None:
+        with self._lock:
+            self.stats[key] += value
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues; run(items) returns what the last stage emits.
+    on_output(x), if given, is called (serialized) as each output arrives.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: Optional[int] = None,
+                 on_output: Optional[Callable[[Any], None]] = None):
+        self.stages = stages
+        self.queue_size = INGEST_QUEUE_SIZE if queue_size is None else max(1, queue_size)
+        self.on_output = on_output
+        self.elapsed_s: Optional[float] = None
+        self._started: Optional[float] = None
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        outputs: List[Any] = []
+        out_lock = threading.Lock()
+        remaining = [s.workers for s in self.stages]
+        remaining_lock = threading.Lock()
+
+        def _emitter(i: int) -> Callable[[Any], None]:
+            stage = self.stages[i]
+            if i + 1 == len(self.stages):
+                def emit(x: Any) -> None:
+                    with out_lock:
+                        outputs.append(x)
+                        if self.on_output is not None:
+                            self.on_output(x)
+                    stage.count("emitted")
+                return emit
+            downstream = queues[i + 1]
+
+            def emit(x: Any) -> None:
+                t0 = time.perf_counter()
+                downstream.put(x)
+                stage._add("blocked_s", time.perf_counter() - t0)
+                stage.count("emitted")
+            return emit
+
+        def _worker(i: int) -> None:
+            stage, inbox, emit = self.stages[i], queues[i], _emitter(i)
+            while True:
+                t0 = time.perf_counter()
+                item = inbox.get()
+                stage._add("idle_s", time.perf_counter() - t0)
+                if item is _STOP:
+                    break
+                t0 = time.perf_counter()
+                try:
+                    stage.fn(item, emit, stage.count)
+                except Exception:
+                    stage.count("errors")
+                    logger.exception("Stage %s failed on an item", stage.name)
+                stage._add("busy_s", time.perf_counter() - t0)
+                stage.count("items")
+            with remaining_lock:
+                remaining[i] -= 1
+                last = remaining[i] == 0
+            if last and i + 1 < len(self.stages):
+                for _ in range(self.stages[i + 1].workers):
+                    queues[i + 1].put(_STOP)
+
+        threads = [
+            threading.Thread(target=_worker, args=(i,), name=f"ingest-{stage.name}-{n}", daemon=True)
+            for i, stage in enumerate(self.stages) for n in range(stage.workers)
+        ]
+        self._started, self.elapsed_s = time.perf_counter(), None
+        for t in threads:
+            t.start()
+        try:
+            for item in items:
+                queues[0].put(item)
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_STOP)
+            for t in threads:
+                t.join()
+        self.elapsed_s = time.perf_counter() - self._started
+        return outputs
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-stage counters; while running, throughput is measured up to now."""
+        if self.elapsed_s is not None:
+            elapsed = self.elapsed_s
+        else:
+            elapsed = time.perf_counter() - self._started if self._started else 0.0
+        out: Dict[str, Any] = {"elapsed_s": round(elapsed, 3), "queue_size": self.queue_size, "stages": {}}
+        for stage in self.stages:
+            s = dict(stage.stats)
+            for key in ("busy_s", "blocked_s", "idle_s"):
+                s[key] = round(s[key], 3)
+            s["items_per_s"] = round(s["items"] / elapsed, 2) if elapsed > 0 else None
+            out["stages"][stage.name] = s
+        return out
+
+
+# ----------------- INGESTION STAGES -----------------
+def _agent():
+    # imported lazily: parsing_agent imports this module
+    from agents import parsing_agent
+    return parsing_agent
+
+
+def _new_parsed(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "city": job["city"],
+        "source_file": os.path.basename(job["pdf_path"]),
+        "content_sha256": job.get("sha256"),
+        "parsed_at": datetime.utcnow().isoformat() + "Z",
+        "rule_count": 0,
+        "rules": [],
+    }
+
+
+def _make_extract(page_workers: int):
+    def extract(job: Dict[str, Any], emit, count) -> None:
+        try:
+            job["sha256"] = job.get("sha256") or file_sha256(job["pdf_path"])
+            emit(("begin", job))
+            for page_no, text in iter_pages(job["pdf_path"], workers=page_workers, sha256=job["sha256"]):
+                emit(("page", job, page_no, text))
+                count("pages")
+        except Exception as e:
+            logger.error("Extraction failed for %s: %s", job["pdf_path"], e)
+            emit(("error", job, "extract", e))
+            return
+        emit(("end", job))
+    return extract
+
+
+def _make_segment():
+    segmenters: Dict[str, ClauseSegmenter] = {}  # single worker: no lock needed
+
+    def _fail(job: Dict[str, Any], e: Exception, emit) -> None:
+        logger.error("Segmentation failed for %s: %s", job["pdf_path"], e)
+        segmenters.pop(job["id"], None)
+        emit(("error", job, "segment", e))
+
+    def _send(job: Dict[str, Any], clauses: List[Dict[str, Any]], emit, count) -> None:
+        if clauses:
+            emit(("clauses", job, clauses))
+            count("clauses", len(clauses))
+
+    def segment(event: Tuple, emit, count) -> None:
+        kind, job = event[0], event[1]
+        if kind == "begin":
+            segmenters[job["id"]] = ClauseSegmenter()
+            emit(event)
+        elif kind in ("page", "end"):
+            segmenter = segmenters.get(job["id"])
+            if segmenter is None:
+                return  # the file already failed here
+            try:
+                if kind == "page":
+                    clauses = list(segmenter.feed(event[2], event[3]))
+                else:
+                    clauses = list(segmenter.finish())
+                    del segmenters[job["id"]]
+            except Exception as e:
+                _fail(job, e, emit)
+                return
+            _send(job, clauses, emit, count)
+            if kind == "end":
+                emit(event)
+        else:  # "error": drop partial state and pass the failure on
+            segmenters.pop(job["id"], None)
+            emit(event)
+    return segment
+
+
+def _make_classify(classify: Callable[[str], Tuple[str, Dict[str, Any]]], batch_size: int):
+    open_jobs: Dict[str, Dict[str, Any]] = {}  # single worker: no lock needed
+
+    def _add_clauses(state: Dict[str, Any], clauses, emit, count) -> None:
+        job, parsed = state["job"], state["parsed"]
+        for c in clauses:
+            rtype, fields = classify(c.get("text", ""))
+            parsed["rules"].append({
+                "id": f"{job['city'].lower()}_r_{len(parsed['rules']) + 1}",
+                "clause_no": c.get("clause_no"),
+                "text": c.get("text"),
+                "page_start": c.get("page_start"),
+                "page_end": c.get("page_end"),
+                "parsed_fields": fields,
+                "rule_type": rtype,
+            })
+            count("rules")
+        if not job.get("diff"):
+            pending = len(parsed["rules"]) - state["sent"]
+            if pending >= batch_size:
+                _send(state, emit)
+
+    def _send(state: Dict[str, Any], emit) -> None:
+        rules = state["parsed"]["rules"]
+        if state["sent"] < len(rules):
+            emit(("rules", state["job"], state["batches"], rules[state["sent"]:]))
+            state["sent"], state["batches"] = len(rules), state["batches"] + 1
+
+    def classify_event(event: Tuple, emit, count) -> None:
+        kind, job = event[0], event[1]
+        if kind == "begin":
+            open_jobs[job["id"]] = {"job": job, "parsed": _new_parsed(job), "sent": 0, "batches": 0}
+        elif kind == "clauses":
+            state = open_jobs.get(job["id"])
+            if state is None:
+                return  # the file already failed here
+            try:
+                _add_clauses(state, event[2], emit, count)
+            except Exception as e:
+                logger.error("Classification failed for %s: %s", job["pdf_path"], e)
+                open_jobs.pop(job["id"], None)
+                emit(("error", job, "classify", e))
+        elif kind == "end":
+            state = open_jobs.pop(job["id"], None)
+            if state is None:
+                return
+            if not job.get("diff"):
+                _send(state, emit)
+            parsed = state["parsed"]
+            parsed["rule_count"] = len(parsed["rules"])
+            if not parsed["rules"]:
+                logger.warning("⚠️ No clauses found in %s — possibly scanned PDF (image only).", job["pdf_path"])
+            emit(("document", job, parsed, state["batches"]))
+        else:  # "error": drop partial state and pass the failure on
+            open_jobs.pop(job["id"], None)
+            emit(event)
+    return classify_event
+
+
+def _save_json(parsed: Dict[str, Any], job: Dict[str, Any], output_dir: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    out_name = f"{Path(job['pdf_path']).stem}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.json"
+    out_path = os.path.join(output_dir, out_name)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(parsed, f, indent=2, ensure_ascii=False)
+    return out_path
+
+
+def _make_push(push: bool, output_dir: Optional[str], batch_size: int):
+    # per file: rule batches written / failed, and the parsed document once segmentation
+    # is done; the documents record is only inserted after every batch is in
+    lock = threading.Lock()
+    files: Dict[str, Dict[str, Any]] = {}
+
+    def _state(job: Dict[str, Any]) -> Dict[str, Any]:
+        # caller holds lock
+        return files.setdefault(job["id"], {"written": 0, "failed": 0, "expected": None,
+                                            "parsed": None, "aborted": False, "in_flight": 0})
+
+    def _settle(job: Dict[str, Any], state: Dict[str, Any]) -> None:
+        # caller holds lock; an aborted file gets no more batches, so drop it once none is in flight
+        if state["aborted"] and not state["in_flight"]:
+            files.pop(job["id"], None)
+
+    def _insert_rules(agent, job: Dict[str, Any], rules: List[Dict[str, Any]], count) -> List[str]:
+        records = [{"_id": ObjectId(), **agent._rule_record(r, job["city"], job["doc_id"])} for r in rules]
+        for start in range(0, len(records), batch_size):
+            agent._rules_col.insert_many(records[start:start + batch_size], ordered=False)
+        count("rules", len(records))
+        return [str(r["_id"]) for r in records]
+
+    def _rollback(agent, job: Dict[str, Any], reason: str) -> None:
+        """Delete the rule batches of a file that will not get a documents record."""
+        try:
+            res = agent._rules_col.delete_many({"source_doc_id": job["doc_id"]})
+            logger.warning("Removed %d rules of %s (%s)", res.deleted_count, job["pdf_path"], reason)
+        except Exception as e:
+            logger.error("Could not remove the rules of %s (source_doc_id=%s): %s", job["pdf_path"], job["doc_id"], e)
+
+    def _abort(agent, job: Dict[str, Any], reason: str) -> None:
+        # batches still in flight see the flag and remove their own rules
+        with lock:
+            state = _state(job)
+            state["aborted"] = True
+            _settle(job, state)
+        _rollback(agent, job, reason)
+
+    def _finish(agent, job: Dict[str, Any], emit) -> None:
+        """Insert the documents record (or roll back) once every batch of a segmented file is settled."""
+        with lock:
+            state = files.get(job["id"])
+            if state is None or state["expected"] is None or state["written"] + state["failed"] < state["expected"]:
+                return
+            del files[job["id"]]
+        parsed = state["parsed"]
+        if state["failed"]:
+            _rollback(agent, job, f"{state['failed']} rule batch(es) failed")
+            emit(("document", job, parsed, None))
+            return
+        try:
+            agent._docs_col.insert_one({"_id": ObjectId(job["doc_id"]), **agent._document_record(parsed)})
+        except Exception as e:
+            logger.error("Documents record failed for %s: %s", job["pdf_path"], e)
+            emit(("error", job, "push", e))
+            _rollback(agent, job, "documents record failed")
+            emit(("document", job, parsed, None))
+            return
+        logger.info(f"✅ Uploaded {len(parsed['rules'])} rules to MongoDB.")
+        emit(("document", job, parsed, {"document_id": job["doc_id"]}))
+
+    def _push_batch(agent, job: Dict[str, Any], idx: int, rules: List[Dict[str, Any]], emit, count) -> None:
+        # the state is held by reference: an abort may drop it from `files` meanwhile
+        with lock:
+            state = _state(job)
+            if state["aborted"]:
+                return
+            state["in_flight"] += 1
+        try:
+            ids = _insert_rules(agent, job, rules, count)
+        except Exception as e:
+            logger.error("Rule batch %d failed for %s: %s", idx, job["pdf_path"], e)
+            emit(("error", job, "push", e))
+            with lock:
+                state["in_flight"] -= 1
+                state["failed"] += 1
+                aborted = state["aborted"]
+                _settle(job, state)
+            if aborted:
+                _rollback(agent, job, "file failed upstream")  # a partial insert_many may have landed
+            else:
+                _finish(agent, job, emit)
+            return
+        with lock:
+            state["in_flight"] -= 1
+            aborted = state["aborted"]
+            if not aborted:
+                state["written"] += 1
+            _settle(job, state)
+        if aborted:
+            agent._rules_col.delete_many({"_id": {"$in": [ObjectId(i) for i in ids]}})
+            return
+        emit(("pushed", job, idx, ids))
+        _finish(agent, job, emit)
+
+    def push_event(event: Tuple, emit, count) -> None:
+        kind, job = event[0], event[1]
+        if kind == "error":
+            if push:
+                _abort(_agent(), job, f"{event[2]} failed")
+            emit(event)
+            return
+        if kind == "rules":
+            if push:
+                _push_batch(_agent(), job, event[2], event[3], emit, count)
+            else:
+                emit(("pushed", job, event[2], []))
+            return
+
+        parsed, batches = event[2], event[3]
+        agent = _agent() if push else None
+        try:
+            if output_dir is not None:
+                out_path = _save_json(parsed, job, output_dir)
+                logger.info(f"✅ Saved parsed JSON locally: {out_path}")
+            if not push:
+                emit(("document", job, parsed, None))
+                return
+            if job.get("diff"):
+                previous = agent.previous_edition(job["city"], parsed["source_file"], job.get("previous"))
+                existing = agent.load_ingested_rules(job["city"], previous) if previous else []
+                if existing:
+                    emit(("document", job, parsed,
+                          agent.push_clause_diff(parsed, existing, agent.edition_lineage(previous))))
+                    return
+                # first edition: diff jobs hold their rules, so push them all here
+                emit(("pushed", job, 0, _insert_rules(agent, job, parsed["rules"], count)))
+        except Exception as e:
+            logger.error("Push failed for %s: %s", job["pdf_path"], e)
+            emit(("error", job, "push", e))
+            if push:
+                _abort(agent, job, "push failed")
+            emit(("document", job, parsed, None))  # parsed, not (fully) pushed
+            return
+        with lock:
+            state = _state(job)
+            state["expected"], state["parsed"] = batches, parsed
+        _finish(agent, job, emit)
+    return push_event
+
+
+# ----------------- ENTRY POINTS -----------------
+def ingest(files: Iterable[Tuple[str, ...]], diff: bool = False, push: bool = True,
+           output_dir: Optional[str] = None, classify: Optional[Callable] = None,
+           file_workers: Optional[int] = None, push_workers: Optional[int] = None,
+           queue_size: Optional[int] = None, batch_size: Optional[int] = None,
+           progress: Optional[Callable[[int, int, Dict[str, Any], Dict[str, Any]], None]] = None,
+           previous: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Ingest (city, pdf_path) or (city, pdf_path, sha256) tuples through the staged
+    pipeline. Returns {"results": [...], "stats": {...}}: one result per file in input
+    order with sha256, parsed (None on failure), push_result and errors
+    ([{"stage", "error"}]). output_dir defaults to parsing_agent.PARSED_OUTPUT_DIR.
+    progress(done, total, {"city", "pdf_path", "rules", "ok"}, stats) is called as
+    each file finishes. previous names the diff baseline (parsing_agent.previous_edition)
+    for every file, so it is meant for single-file runs.
+    """
+    file_workers = INGEST_FILE_WORKERS if file_workers is None else max(1, file_workers)
+    push_workers = INGEST_PUSH_WORKERS if push_workers is None else max(1, push_workers)
+    batch_size = INGEST_BATCH_SIZE if batch_size is None else max(1, batch_size)
+    if classify is None:
+        classify = _agent().classify_rule_text_cached
+    if output_dir is None:
+        output_dir = _agent().PARSED_OUTPUT_DIR
+
+    jobs = [
+        {"id": str(n), "city": city, "pdf_path": pdf_path, "sha256": rest[0] if rest else None,
+         "diff": diff, "previous": previous, "doc_id": str(ObjectId())}
+        for n, (city, pdf_path, *rest) in enumerate(files)
+    ]
+    done, failed = set(), set()
+
+    def _on_output(event: Tuple) -> None:
+        kind, job = event[0], event[1]
+        if kind == "error":
+            failed.add(job["id"])
+            if event[2] == "push":
+                return  # a failed push still delivers its document event
+        elif kind != "document":
+            return
+        done.add(job["id"])
+        if progress is not None:
+            rules = len(event[2]["rules"]) if kind == "document" else 0
+            summary = {"city": job["city"], "pdf_path": job["pdf_path"], "rules": rules, "ok": job["id"] not in failed}
+            progress(len(done), len(jobs), summary, pipeline.stats())
+
+    pipeline = Pipeline([
+        Stage("extract", _make_extract(max(1, PDF_EXTRACT_WORKERS // file_workers)), workers=file_workers),
+        # single workers keep page and clause order per file; classification overlaps segmentation
+        Stage("segment", _make_segment(), workers=1),
+        Stage("classify", _make_classify(classify, batch_size), workers=1),
+        Stage("push", _make_push(push, output_dir, batch_size), workers=push_workers),
+    ], queue_size=queue_size, on_output=_on_output)
+    events = pipeline.run(jobs)
+
+    results = {job["id"]: {"city": job["city"], "pdf_path": job["pdf_path"], "parsed": None,
+                           "push_result": None, "errors": [], "_ids": []} for job in jobs}
+    for event in events:
+        kind, job = event[0], event[1]
+        res = results[job["id"]]
+        if kind == "pushed":
+            res["_ids"].append((event[2], event[3]))
+        elif kind == "document":
+            res["parsed"], res["push_result"] = event[2], event[3]
+        else:
+            res["errors"].append({"stage": event[2], "error": event[3]})
+    ordered = []
+    for job in jobs:
+        res = results[job["id"]]
+        res["sha256"] = job["sha256"]
+        ids = [i for _, batch in sorted(res.pop("_ids"), key=lambda b: b[0]) for i in batch]
+        if res["push_result"] is not None and "inserted_rules" not in res["push_result"]:
+            res["push_result"]["inserted_rules"] = ids
+        if res["parsed"] is not None:
+            res["parsed"]["push_result"] = res["push_result"]
+        ordered.append(res)
+    return {"results": ordered, "stats": pipeline.stats()}
+
+
+def ingest_pdf(pdf_path: str, city: str, diff: bool = False, push: bool = True,
+               output_dir: Optional[str] = None, previous: Optional[str] = None) -> Dict[str, Any]:
+    """One file through the pipeline; the parsed document, or the first error raised."""
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(pdf_path)
+    run = ingest([(city, pdf_path)], diff=diff, push=push, output_dir=output_dir, previous=previous)
+    result = run["results"][0]
+    if result["errors"]:
+        raise result["errors"][0]["error"]
+    logger.info("Ingestion stages: %s", json.dumps(run["stats"]["stages"]))
+    return result["parsed"]
@@ -0,0 +1,139 @@
+# utils/mongo.py
+"""
+Shared Mongo Connection
+-----------------------
+- One pooled MongoClient per process, created on first use (importing an agent or
+  running its --help never touches the network)
+- Fork-safe: a forked child (multiprocessing / ProcessPoolExecutor workers) drops the
+  inherited client and lazily builds its own instead of reusing the parent's sockets
+- LazyCollection stands in for a module-level collection handle and resolves it on
+  each attribute access, so agents keep their COLLECTION globals without connecting
+- certifi CA bundle is used for mongodb+srv:// (Atlas) and explicit tls/ssl URIs
+
+Environment variables:
+- MONGO_URI            : connection string (required on first use)
+- MONGO_DB             : database name (default: mcp_database)
+- MONGO_MAX_POOL_SIZE  : max connections per client (default: 50)
+- MONGO_MIN_POOL_SIZE  : connections kept open when idle (default: 0)
+- MONGO_TIMEOUT_MS     : server selection timeout (default: 15000)
+
+Usage:
+  from utils.mongo import get_collection, LazyCollection
+
+  rules = get_collection("rules")
+  PROJECTS_COL = LazyCollection("projects")   # safe at import time
+"""
+import os
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger("Mongo")
+
+# load .env from project root (one directory up from utils/)
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), "..", ".env"))
+
+DEFAULT_DB = "mcp_database"
+
+_client = None
+_client_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _uses_tls(uri: str) -> bool:
+    lowered = uri.lower()
+    return lowered.startswith("mongodb+srv://") or "tls=true" in lowered or "ssl=true" in lowered
+
+
+def client_options(uri: str) -> Dict[str, Any]:
+    """Keyword arguments for MongoClient, read from the environment at call time."""
+    options: Dict[str, Any] = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "0")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_TIMEOUT_MS", "15000")),
+    }
+    if _uses_tls(uri):
+        import certifi
+        options["tlsCAFile"] = certifi.where()
+    return options
+
+
+def get_client():
+    """The process-wide MongoClient, created on first call (and again after a fork)."""
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _lock:
+        if _client is None or _client_pid != pid:
+            uri = os.getenv("MONGO_URI")
+            if not uri:
+                raise EnvironmentError("MONGO_URI must be set in .env")
+            from pymongo import MongoClient
+            _client = MongoClient(uri, **client_options(uri))
+            _client_pid = pid
+            logger.info("Created Mongo client (pid %s, maxPoolSize=%s)", pid, _client.options.pool_options.max_pool_size)
+        return _client
+
+
+def get_db(name: Optional[str] = None):
+    return get_client()[name or os.getenv("MONGO_DB", DEFAULT_DB)]
+
+
+def get_collection(name: str, db: Optional[str] = None):
+    return get_db(db).get_collection(name)
+
+
+def ping() -> bool:
+    """Round-trip to the server; False (with a logged reason) when unreachable."""
+    try:
+        get_client().admin.command("ping")
+        return True
+    except Exception as e:
+        logger.error("MongoDB ping failed: %s", e)
+        return False
+
+
+def close_client() -> None:
+    """Close this process's client; the next call to get_client() opens a new one."""
+    global _client, _client_pid
+    with _lock:
+        client, _client, _client_pid = _client, None, None
+    if client is not None:
+        client.close()
+
+
+def _forget_client_after_fork() -> None:
+    # never close the parent's client from the child: its sockets are shared
+    global _client, _client_pid, _lock
+    _client, _client_pid = None, None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_client_after_fork)
+
+
+class LazyCollection:
+    """Collection handle that connects on first use; attribute access is forwarded."""
+
+    def __init__(self, name: str, db: Optional[str] = None):
+        self.name = name
+        self.db = db
+
+    def resolve(self):
+        return get_collection(self.name, self.db)
+
+    def __getattr__(self, attr: str) -> Any:
+        if attr.startswith("__"):
+            # keep copy/pickle protocol lookups from connecting (or recursing before __init__)
+            raise AttributeError(attr)
+        return getattr(self.resolve(), attr)
+
+    def __getitem__(self, key: str):
+        return self.resolve()[key]
+
+    def __repr__(self) -> str:
+        return f"LazyCollection({self.name!r})"
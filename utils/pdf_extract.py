@@ -0,0 +1,233 @@
+# utils/pdf_extract.py
+"""
+Parallel PDF Text Extraction
+----------------------------
+- Splits a PDF's page range into contiguous chunks and extracts them in a process
+  pool; every worker opens the document itself (no parser objects cross processes)
+- Per range, PyMuPDF (fitz) is tried first and pdfplumber is the fallback when fitz is
+  missing, fails, or finds no text in that range
+- Pages come back in document order as one string per page ("" for image-only pages),
+  so callers keep page numbers; small documents are extracted inline
+- Extracted pages are cached as gzipped NDJSON keyed by the PDF's SHA-256 plus the
+  available backends and EXTRACTOR_VERSION, so re-parsing an unchanged PDF (e.g. after
+  a classifier change) skips extraction entirely; entries are written to a uniquely
+  named temp file and renamed only once every page is in (safe across threads and
+  processes); callers that already hashed the PDF pass sha256= to skip re-reading it
+
+Environment variables:
+- PDF_EXTRACT_WORKERS         : pool size (default: CPU count)
+- PDF_EXTRACT_PAGES_PER_RANGE : minimum pages per chunk (default: 16)
+- PDF_EXTRACT_CACHE_DIR       : extraction cache directory (default: outputs/extract_cache;
+                                empty or "off" disables the cache)
+
+Usage:
+  from utils.pdf_extract import extract_pages, iter_pages, join_pages
+
+  pages = extract_pages("data/DCPR_2034.pdf", workers=8)   # ["page 1 text", ...]
+  text = join_pages(pages, markers=True)                     # "--- PAGE 1 ---\\n..."
+  for page_no, text in iter_pages("data/DCPR_2034.pdf"):     # streaming, bounded look-ahead
+      ...
+"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+from datetime import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import fitz  # PyMuPDF
+except Exception:
+    fitz = None
+try:
+    import pdfplumber
+except Exception:
+    pdfplumber = None
+
+logger = logging.getLogger("PdfExtract")
+
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_EXTRACT_PAGES_PER_RANGE = int(os.getenv("PDF_EXTRACT_PAGES_PER_RANGE", "16"))
+PDF_EXTRACT_CACHE_DIR = os.getenv("PDF_EXTRACT_CACHE_DIR", os.path.join("outputs", "extract_cache"))
+
+EXTRACTOR_VERSION = "1"  # bump when extraction output changes for the same backends
+
+PageRange = Tuple[int, int]  # [start, stop) zero-based
+
+
+def page_count(pdf_path: str) -> int:
+    if fitz:
+        try:
+            with fitz.open(pdf_path) as doc:
+                return doc.page_count
+        except Exception as e:
+            logger.warning("fitz could not open %s: %s", pdf_path, e)
+    if pdfplumber:
+        with pdfplumber.open(pdf_path) as pdf:
+            return len(pdf.pages)
+    raise RuntimeError("No PDF backend available (install PyMuPDF or pdfplumber)")
+
+
+def split_ranges(pages: int, workers: int, min_pages: Optional[int] = None) -> List[PageRange]:
+    """Contiguous [start, stop) ranges, about two per worker so a slow range does not stall the pool."""
+    if pages <= 0:
+        return []
+    min_pages = PDF_EXTRACT_PAGES_PER_RANGE if min_pages is None else min_pages
+    n = max(1, min(2 * max(1, workers), -(-pages // max(1, min_pages))))
+    size = -(-pages // n)
+    return [(start, min(start + size, pages)) for start in range(0, pages, size)]
+
+
+def _fitz_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    with fitz.open(pdf_path) as doc:
+        return [doc.load_page(pno).get_text("text") or "" for pno in range(start, stop)]
+
+
+def _pdfplumber_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    with pdfplumber.open(pdf_path, pages=list(range(start + 1, stop + 1))) as pdf:
+        return [p.extract_text() or "" for p in pdf.pages]
+
+
+def extract_range(pdf_path: str, start: int, stop: int) -> Tuple[List[str], Optional[str]]:
+    """Worker: page texts for [start, stop) and the backend that produced them (None if neither did)."""
+    for name, backend, fn in (("fitz", fitz, _fitz_range), ("pdfplumber", pdfplumber, _pdfplumber_range)):
+        if not backend:
+            continue
+        try:
+            texts = fn(pdf_path, start, stop)
+        except Exception as e:
+            logger.warning("%s failed on pages %d-%d of %s: %s", name, start + 1, stop, pdf_path, e)
+            continue
+        if any(t.strip() for t in texts):
+            return texts, name
+    return [""] * (stop - start), None
+
+
+def _iter_ranges(pdf_path: str, workers: int) -> Iterator[Tuple[int, List[str], Optional[str]]]:
+    """(start, page texts, backend) per range, in order; at most 2 * workers ranges ahead."""
+    ranges = split_ranges(page_count(pdf_path), workers)
+    if workers == 1 or len(ranges) <= 1:
+        for start, stop in ranges:
+            yield (start, *extract_range(pdf_path, start, stop))
+        return
+
+    pending = deque(ranges)
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        in_flight = deque()
+        while pending or in_flight:
+            while pending and len(in_flight) < 2 * workers:
+                start, stop = pending.popleft()
+                in_flight.append((start, pool.submit(extract_range, pdf_path, start, stop)))
+            start, future = in_flight.popleft()
+            yield (start, *future.result())
+
+
+def _extract(pdf_path: str, workers: int) -> Iterator[Tuple[int, str]]:
+    pages = ranges = 0
+    backends = set()
+    for start, texts, backend in _iter_ranges(pdf_path, workers):
+        ranges += 1
+        pages += len(texts)
+        if backend:
+            backends.add(backend)
+        yield from enumerate(texts, start=start + 1)
+    logger.info("Extracted %d pages from %s in %d ranges (%s)",
+                pages, os.path.basename(pdf_path), ranges, ", ".join(sorted(backends)) or "no text")
+
+
+# ----------------- EXTRACTION CACHE -----------------
+def extractor_id() -> str:
+    """Backends available here plus EXTRACTOR_VERSION; part of every cache key."""
+    names = [name for name, mod in (("fitz", fitz), ("pdfplumber", pdfplumber)) if mod]
+    return f"{'+'.join(names) or 'none'}-v{EXTRACTOR_VERSION}"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_path(pdf_path: str, cache_dir: Optional[str] = None, sha256: Optional[str] = None) -> Optional[str]:
+    """
+    <cache_dir>/<sha[:2]>/<sha256>-<extractor>.ndjson.gz, or None when caching is off.
+    sha256: the file's content hash when the caller already has it.
+    """
+    cache_dir = PDF_EXTRACT_CACHE_DIR if cache_dir is None else cache_dir
+    if cache_dir.strip().lower() in ("", "off", "0", "none"):
+        return None
+    sha = sha256 or file_sha256(pdf_path)
+    return os.path.join(cache_dir, sha[:2], f"{sha}-{extractor_id()}.ndjson.gz")
+
+
+def _read_cached(path: str) -> Iterator[Tuple[int, str]]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()  # header
+        for line in f:
+            record = json.loads(line)
+            yield record["page"], record["text"]
+
+
+def _write_through(pages: Iterator[Tuple[int, str]], path: str, source: str) -> Iterator[Tuple[int, str]]:
+    """Yield pages while writing them to a temp file; it becomes the cache entry only when complete."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # unique per writer: two threads of one process may extract the same PDF at once
+    raw = tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".",
+                                      suffix=".tmp", delete=False)
+    tmp = raw.name
+    complete = False
+    try:
+        with raw, gzip.open(raw, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"source": source, "extractor": extractor_id(),
+                                "created_at": datetime.utcnow().isoformat() + "Z"}) + "\n")
+            for page_no, text in pages:
+                f.write(json.dumps({"page": page_no, "text": text}, ensure_ascii=False) + "\n")
+                yield page_no, text
+        os.replace(tmp, path)
+        complete = True
+    finally:
+        if not complete and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# ----------------- PUBLIC API -----------------
+def iter_pages(pdf_path: str, workers: Optional[int] = None, use_cache: bool = True,
+               sha256: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_no, text) in order (page_no is 1-based) as ranges finish. At most
+    2 * workers ranges are extracted ahead of the consumer, so memory stays bounded.
+    An unchanged PDF (same content hash and extractor) is read back from the cache;
+    pass sha256 when the file has already been hashed.
+    """
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(pdf_path)
+    workers = PDF_EXTRACT_WORKERS if workers is None else max(1, workers)
+    cached = cache_path(pdf_path, sha256=sha256) if use_cache else None
+
+    if cached and os.path.exists(cached):
+        logger.info("Using cached extraction for %s (%s)", os.path.basename(pdf_path), os.path.basename(cached))
+        yield from _read_cached(cached)
+        return
+
+    pages_iter = _extract(pdf_path, workers)
+    if cached:
+        pages_iter = _write_through(pages_iter, cached, os.path.basename(pdf_path))
+    yield from pages_iter
+
+
+def extract_pages(pdf_path: str, workers: Optional[int] = None, use_cache: bool = True) -> List[str]:
+    """Text of every page in order. Ranges run in a process pool when there is more than one."""
+    return [text for _, text in iter_pages(pdf_path, workers=workers, use_cache=use_cache)]
+
+
+def join_pages(pages: List[str], markers: bool = False) -> str:
+    """Join non-empty pages with blank lines, optionally prefixed by '--- PAGE n ---'."""
+    if markers:
+        return "\n\n".join(f"--- PAGE {i} ---\n" + t for i, t in enumerate(pages, start=1) if t.strip())
+    return "\n\n".join(t for t in pages if t.strip())
@@ -0,0 +1,113 @@
+# utils/profiling.py
+"""
+Phase Profiler
+--------------
+- Opt-in timing of named phases (e.g. load_projects / load_rules / evaluate / write)
+  plus free-form counters (e.g. comparisons per rule category)
+- summary() gives a structured dict; write_trace() dumps Chrome trace-event JSON
+  (open in chrome://tracing or https://ui.perfetto.dev)
+- Disabled profiling uses NULL_PROFILER, whose methods are empty and whose phase()
+  returns one shared no-op context, so instrumented code costs nothing when off
+
+Usage:
+  from utils.profiling import make_profiler
+
+  profiler = make_profiler(enabled=True, trace=True)
+  with profiler.phase("load_rules", city="Mumbai"):
+      rules = load(...)
+  profiler.count("comparisons.height", 1200)
+  profiler.summary()
+  profiler.write_trace("outputs/eval_trace.json")
+"""
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, List, Optional
+
+_NULL_CONTEXT = nullcontext()
+
+
+class NullProfiler:
+    """Stand-in used when profiling is disabled."""
+    enabled = False
+
+    def phase(self, name: str, **args: Any):
+        return _NULL_CONTEXT
+
+    def count(self, key: str, n: int = 1) -> None:
+        pass
+
+    def summary(self) -> Dict[str, Any]:
+        return {}
+
+    def write_trace(self, path: str) -> None:
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler:
+    """Accumulates phase durations and counters; optionally keeps every phase as a trace event."""
+    enabled = True
+
+    def __init__(self, trace: bool = False):
+        self._started = time.perf_counter()
+        self._phases: Dict[str, Dict[str, float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._events: Optional[List[Dict[str, Any]]] = [] if trace else None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str, **args: Any) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                stat = self._phases.setdefault(name, {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+                stat["calls"] += 1
+                stat["total_s"] += duration
+                stat["max_s"] = max(stat["max_s"], duration)
+                if self._events is not None:
+                    self._events.append({
+                        "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                        "ts": round((start - self._started) * 1e6, 1), "dur": round(duration * 1e6, 1),
+                        "args": {k: str(v) for k, v in args.items()},
+                    })
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + n
+
+    def summary(self) -> Dict[str, Any]:
+        wall = time.perf_counter() - self._started
+        with self._lock:
+            phases = {
+                name: {
+                    "calls": int(stat["calls"]),
+                    "total_s": round(stat["total_s"], 6),
+                    "max_s": round(stat["max_s"], 6),
+                    "share": round(stat["total_s"] / wall, 4) if wall > 0 else None,
+                }
+                for name, stat in self._phases.items()
+            }
+            counters = dict(sorted(self._counters.items()))
+        return {"wall_s": round(wall, 6), "phases": phases, "counters": counters}
+
+    def write_trace(self, path: str) -> None:
+        if self._events is None:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "summary": self.summary()}, f, indent=2)
+
+
+def make_profiler(enabled: bool = False, trace: bool = False):
+    """Profiler when enabled (or tracing), else the shared NULL_PROFILER."""
+    return Profiler(trace=trace) if (enabled or trace) else NULL_PROFILER
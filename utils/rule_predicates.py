@@ -0,0 +1,335 @@
+# utils/rule_predicates.py
+"""
+Rule Predicate Compiler
+-----------------------
+- Parses the free-text constraints carried by MCP rules (`conditions`, `entitlements`),
+  e.g. "Height <= 24m", "FAR <= 1.5", "Max 7 floors", "Setback >= 4m", "Ground+6"
+- Produces typed Predicate objects (metric, op, value, unit) once per rule version
+- Evaluating a compiled rule is then a dict lookup and a comparison per predicate
+
+Metric names match the subject keys used by calculator_agent / main.py
+(height_m, fsi, setback_m, floors, ...), so a subject dict can be checked directly.
+
+Usage:
+  from utils.rule_predicates import compile_rule
+
+  compiled = compile_rule({"id": "ea97ece6", "conditions": "Height <= 24m", "entitlements": "Max 7 floors"})
+  compiled.evaluate({"height_m": 21, "floors": 8})   # {"height_m": True, "floors": False}
+"""
+import re
+import hashlib
+import operator
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+# ----------------- VOCABULARY -----------------
+OPS: Dict[str, Callable[[float, float], bool]] = {
+    "<=": operator.le,
+    "<": operator.lt,
+    ">=": operator.ge,
+    ">": operator.gt,
+    "=": operator.eq,
+}
+_OP_SPELLINGS = {"<=": "<=", "≤": "<=", "=<": "<=", "<": "<", ">=": ">=", "≥": ">=", "=>": ">=", ">": ">", "==": "=", "=": "="}
+_WORD_OPS = {"max": "<=", "maximum": "<=", "up to": "<=", "upto": "<=", "not exceeding": "<=",
+             "min": ">=", "minimum": ">=", "at least": ">="}
+
+# metric spelling -> (canonical metric, default unit)
+METRIC_ALIASES: Dict[str, Tuple[str, Optional[str]]] = {
+    "height": ("height_m", "m"), "building height": ("height_m", "m"),
+    "fsi": ("fsi", None), "far": ("fsi", None), "f.s.i": ("fsi", None), "floor space index": ("fsi", None),
+    "floor area ratio": ("fsi", None),
+    "setback": ("setback_m", "m"), "setbacks": ("setback_m", "m"), "set back": ("setback_m", "m"),
+    "front setback": ("setback_m", "m"), "front margin": ("setback_m", "m"),
+    "side margin": ("side_margin_m", "m"), "side setback": ("side_margin_m", "m"),
+    "rear margin": ("rear_margin_m", "m"), "rear setback": ("rear_margin_m", "m"),
+    "floors": ("floors", None), "floor": ("floors", None), "storeys": ("floors", None),
+    "storey": ("floors", None), "stories": ("floors", None), "floor height": ("floor_height_m", "m"),
+    "coverage": ("coverage", "%"), "ground coverage": ("coverage", "%"), "site coverage": ("coverage", "%"),
+    "parking": ("parking", None), "parking spaces": ("parking", None),
+    "plot": ("plot_area_sqm", "sqm"), "plots": ("plot_area_sqm", "sqm"), "plot area": ("plot_area_sqm", "sqm"),
+    "plot size": ("plot_area_sqm", "sqm"),
+    "road width": ("road_width_m", "m"),
+}
+# unit spelling -> (canonical unit, factor to canonical)
+UNIT_ALIASES: Dict[str, Tuple[str, float]] = {
+    "m": ("m", 1.0), "mt": ("m", 1.0), "mtr": ("m", 1.0), "mtrs": ("m", 1.0),
+    "meter": ("m", 1.0), "meters": ("m", 1.0), "metre": ("m", 1.0), "metres": ("m", 1.0),
+    "ft": ("m", 0.3048), "feet": ("m", 0.3048),
+    "sq.m": ("sqm", 1.0), "sq.m.": ("sqm", 1.0), "sqm": ("sqm", 1.0), "sq m": ("sqm", 1.0),
+    "sq.mt": ("sqm", 1.0), "sq.mt.": ("sqm", 1.0), "m2": ("sqm", 1.0), "sq.ft": ("sqm", 0.09290304),
+    "%": ("%", 1.0), "percent": ("%", 1.0),
+}
+
+_METRIC_RE = re.compile(
+    r"(?<![\w.])(" + "|".join(re.escape(a) for a in sorted(METRIC_ALIASES, key=len, reverse=True)) + r")(?![\w])",
+    re.IGNORECASE,
+)
+_NUM = r"(?P<value>\d+(?:\.\d+)?)"
+_SYMBOL_OP = r"(?P<op><=|>=|=<|=>|==|≤|≥|<|>|=)"
+_WORD_OP = r"(?P<word>" + "|".join(sorted(_WORD_OPS, key=len, reverse=True)) + r")"
+
+# "Height <= 24m", "plots < 250 sq.m"
+_COMPARISON_RE = re.compile(r"^(?P<metric>[^\d<>=≤≥]+?)\s*" + _SYMBOL_OP + r"\s*" + _NUM + r"\s*(?P<rest>.*)$")
+# "Max 7 floors", "Min 3 m setback"
+_LIMIT_VALUE_FIRST_RE = re.compile(r"^" + _WORD_OP + r"\.?\s+" + _NUM + r"\s*(?P<rest>.*)$", re.IGNORECASE)
+# "Maximum height 24 m", "Min setback of 3m"
+_LIMIT_METRIC_FIRST_RE = re.compile(
+    r"^" + _WORD_OP + r"\.?\s+(?P<metric>[^\d]+?)\s*(?:of|is|:|-)?\s*" + _NUM + r"\s*(?P<rest>.*)$", re.IGNORECASE)
+# "Ground+6", "G + 3"
+_GROUND_PLUS_RE = re.compile(r"^(?:ground|g)\s*\+\s*(?P<value>\d+)$", re.IGNORECASE)
+# trailing qualifier: "Max 4 floors for plots < 250 sq.m"
+_GUARD_RE = re.compile(r"\s+\b(?:for|if|when|where)\b\s+(?P<guard>.+)$", re.IGNORECASE)
+_SPLIT_RE = re.compile(r"\s*(?:[,;\n]|\band\b)\s*", re.IGNORECASE)
+
+
+# ----------------- PREDICATES -----------------
+class Predicate(NamedTuple):
+    """One parsed constraint: `<metric> <op> <value> [unit]`, optionally guarded."""
+    metric: str
+    op: str
+    value: float
+    unit: Optional[str] = None
+    guard: Optional["Predicate"] = None
+    text: str = ""
+
+    def holds(self, subject_value: float) -> bool:
+        return OPS[self.op](subject_value, self.value)
+
+    def check(self, subject: Mapping[str, Any]) -> Optional[bool]:
+        """True/False for the subject, None when the subject lacks the metric or the guard rules it out."""
+        v = subject.get(self.metric)
+        if v is None:
+            return None
+        guard = self.guard
+        if guard is not None:
+            gv = subject.get(guard.metric)
+            if gv is not None and not guard.holds(float(gv)):
+                return None
+        return OPS[self.op](float(v), self.value)
+
+
+class CompiledRule(NamedTuple):
+    rule_id: Any
+    version: Any
+    predicates: Tuple[Predicate, ...]
+    by_metric: Dict[str, Tuple[Predicate, ...]]
+    unparsed: Tuple[str, ...]
+
+    def first(self, metric: str, ops: Optional[Tuple[str, ...]] = None) -> Optional[Predicate]:
+        for p in self.by_metric.get(metric, ()):
+            if ops is None or p.op in ops:
+                return p
+        return None
+
+    def applicable(self, metric: str, subject: Optional[Mapping[str, Any]] = None,
+                   ops: Optional[Tuple[str, ...]] = None) -> Optional[Predicate]:
+        """
+        First predicate on metric that applies to the subject: unguarded, or guarded by a
+        condition the subject is known to meet. A guarded limit ("for plots above 500 sqm")
+        is never applied when the subject lacks the guard's metric (or no subject is given).
+        """
+        for p in self.by_metric.get(metric, ()):
+            if ops is not None and p.op not in ops:
+                continue
+            guard = p.guard
+            if guard is None:
+                return p
+            gv = subject.get(guard.metric) if subject else None
+            if gv is not None and guard.holds(float(gv)):
+                return p
+        return None
+
+    def evaluate(self, subject: Mapping[str, Any]) -> Dict[str, Optional[bool]]:
+        """Per-metric result; a metric passes only if all of its predicates pass."""
+        out: Dict[str, Optional[bool]] = {}
+        for metric, preds in self.by_metric.items():
+            result = None
+            for p in preds:
+                ok = p.check(subject)
+                if ok is False:
+                    result = False
+                    break
+                if ok is True:
+                    result = True
+            out[metric] = result
+        return out
+
+
+# ----------------- PARSING -----------------
+def _resolve_metric(text: str) -> Optional[Tuple[str, Optional[str]]]:
+    m = _METRIC_RE.search(text)
+    return METRIC_ALIASES[m.group(1).lower()] if m else None
+
+
+def _resolve_unit(text: str) -> Optional[Tuple[str, float]]:
+    token = text.strip().lower()
+    if not token:
+        return None
+    if token in UNIT_ALIASES:
+        return UNIT_ALIASES[token]
+    head = token.split()[0]
+    if head in UNIT_ALIASES:
+        return UNIT_ALIASES[head]
+    if token.startswith("sq"):
+        return UNIT_ALIASES["sq.m"]
+    return None
+
+
+def _make(metric_text: str, op: str, value: str, rest: str, text: str) -> Optional[Predicate]:
+    """Build a predicate from the pieces of a match; `rest` may hold a unit and/or the metric."""
+    resolved = _resolve_metric(metric_text) or _resolve_metric(rest)
+    if resolved is None:
+        return None
+    metric, default_unit = resolved
+    num = float(value)
+    unit = default_unit
+    conv = _resolve_unit(rest)
+    if conv is not None:
+        unit, factor = conv
+        num *= factor
+    return Predicate(metric, op, num, unit, None, text)
+
+
+def parse_predicate(segment: str) -> Optional[Predicate]:
+    """Parse a single constraint segment; returns None if it is not understood."""
+    text = segment.strip().rstrip(".")
+    if not text:
+        return None
+
+    guard = None
+    gm = _GUARD_RE.search(text)
+    if gm:
+        guard = parse_predicate(gm.group("guard"))
+        text = text[:gm.start()].strip()
+
+    pred = None
+    m = _GROUND_PLUS_RE.match(text)
+    if m:
+        pred = Predicate("floors", "<=", float(int(m.group("value")) + 1), None, None, text)
+    if pred is None:
+        m = _COMPARISON_RE.match(text)
+        if m:
+            pred = _make(m.group("metric"), _OP_SPELLINGS[m.group("op")], m.group("value"), m.group("rest"), text)
+    if pred is None:
+        m = _LIMIT_VALUE_FIRST_RE.match(text)
+        if m:
+            pred = _make("", _WORD_OPS[m.group("word").lower()], m.group("value"), m.group("rest"), text)
+    if pred is None:
+        m = _LIMIT_METRIC_FIRST_RE.match(text)
+        if m:
+            pred = _make(m.group("metric"), _WORD_OPS[m.group("word").lower()], m.group("value"), m.group("rest"), text)
+
+    if pred is None:
+        return None
+    return pred._replace(guard=guard, text=segment.strip())
+
+
+@lru_cache(maxsize=4096)
+def parse_constraints(text: str) -> Tuple[Tuple[Predicate, ...], Tuple[str, ...]]:
+    """Split a conditions/entitlements string into predicates; returns (predicates, unparsed segments)."""
+    predicates: List[Predicate] = []
+    unparsed: List[str] = []
+    for segment in _SPLIT_RE.split(text or ""):
+        if not segment.strip():
+            continue
+        pred = parse_predicate(segment)
+        if pred is None:
+            unparsed.append(segment.strip())
+        else:
+            predicates.append(pred)
+    return tuple(predicates), tuple(unparsed)
+
+
+# ----------------- COMPILED RULE CACHE -----------------
+_CACHE_MAX = 8192
+_compiled_cache: "OrderedDict[Tuple, CompiledRule]" = OrderedDict()
+
+CONSTRAINT_FIELDS = ("conditions", "entitlements")
+
+
+def _constraint_texts(rule_obj: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(rule_obj.get(f) or "") for f in CONSTRAINT_FIELDS)
+
+
+def rule_version(rule: Dict[str, Any]) -> str:
+    """Version marker of a rule record: explicit version/timestamps, else a hash of its constraint text."""
+    rule_obj = rule.get("rule", rule)
+    for src in (rule, rule_obj):
+        for key in ("version", "updated_at", "time", "created_at", "inserted_at"):
+            if src.get(key):
+                return str(src[key])
+    return hashlib.sha1("\x1f".join(_constraint_texts(rule_obj)).encode("utf-8")).hexdigest()[:16]
+
+
+def compile_rule(rule: Dict[str, Any]) -> CompiledRule:
+    """
+    Compile a rule record (flat MCP rule or {"id", "rule": {...}} wrapper) into predicates.
+    Results are cached per (rule id, rule version); an uncached rule is parsed once.
+    """
+    rule_obj = rule.get("rule", rule)  # some endpoints return wrapped
+    rule_id = rule.get("id") or rule.get("_id") or rule_obj.get("clause_no")
+    texts = _constraint_texts(rule_obj)
+    key = (str(rule_id), rule_version(rule)) if rule_id is not None else texts
+
+    hit = _compiled_cache.get(key)
+    if hit is not None:
+        _compiled_cache.move_to_end(key)
+        return hit
+
+    predicates: List[Predicate] = []
+    unparsed: List[str] = []
+    for text in texts:
+        p, u = parse_constraints(text)
+        predicates.extend(p)
+        unparsed.extend(u)
+    by_metric: Dict[str, List[Predicate]] = {}
+    for p in predicates:
+        by_metric.setdefault(p.metric, []).append(p)
+
+    compiled = CompiledRule(
+        rule_id=rule_id,
+        version=key[1] if rule_id is not None else None,
+        predicates=tuple(predicates),
+        by_metric={k: tuple(v) for k, v in by_metric.items()},
+        unparsed=tuple(unparsed),
+    )
+    _compiled_cache[key] = compiled
+    if len(_compiled_cache) > _CACHE_MAX:
+        _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def clear_cache() -> None:
+    _compiled_cache.clear()
+    parse_constraints.cache_clear()
+
+
+# ----------------- CALCULATOR BRIDGE -----------------
+def height_fsi_constraints(rule: Dict[str, Any],
+                           subject: Optional[Mapping[str, Any]] = None) -> Tuple[Optional[Dict[str, Any]], Any]:
+    """
+    Return calculator_agent's (height_rule, fsi_rule) for a rule record.
+    Pre-parsed `parsed_fields.height` / `parsed_fields.fsi` win; otherwise they are
+    derived from the compiled conditions/entitlements predicates, using only predicates
+    that apply to the subject (see CompiledRule.applicable; without a subject, only
+    unguarded ones).
+    """
+    rule_obj = rule.get("rule", rule)
+    parsed = rule_obj.get("parsed_fields") or rule_obj.get("parsed") or {}
+    height_rule = parsed.get("height")
+    fsi_rule = parsed.get("fsi")
+    if height_rule and fsi_rule:
+        return height_rule, fsi_rule
+
+    compiled = compile_rule(rule)
+    if not height_rule:
+        p = compiled.applicable("height_m", subject)
+        if p is not None:
+            height_rule = {"op": p.op, "value_m": p.value}
+    if not fsi_rule:
+        p = compiled.applicable("fsi", subject, ops=("<=",))
+        if p is not None:
+            fsi_rule = p.value
+    return height_rule, fsi_rule